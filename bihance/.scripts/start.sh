@@ -0,0 +1,10 @@
+#!/usr/bin/env bash
+
+# Exit on error
+set -o errexit
+
+
+# Web service start command
+# On the deployed side, we are running from the bihance directory!!
+# ASGI, so that event streams and long polls do not hold a worker each (see bihance/asgi.py)
+gunicorn -k uvicorn_worker.UvicornWorker bihance.asgi:application --bind "0.0.0.0:${PORT:-8000}"
@@ -0,0 +1,19 @@
+#!/usr/bin/env bash
+
+# Exit on error
+set -o errexit
+
+
+# Background worker start command (a separate service from the web one)
+# On the deployed side, we are running from the bihance directory!!
+# Stops every job when the script exits, so that the service restarts them all
+trap 'kill 0' EXIT
+
+# Sends the emails queued by the web service, retrying failures
+python manage.py send-queued-emails &
+
+# Decays the trending scores of suggestions (sortBy=trending), every 5 minutes
+python manage.py refresh-trending-scores &
+
+# Exits (with errexit) as soon as one of them stops
+wait -n
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from utils.dataset import DEFAULT_COUNTS, generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Generates a synthetic dataset of users, jobs, applications, messages, groups and suggestions"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scale",
+            type=float,
+            default=1,
+            help="Multiplies the default number of rows of every table.",
+        )
+        for name, count in DEFAULT_COUNTS.items():
+            parser.add_argument(
+                f"--{name}",
+                type=int,
+                help=f"Number of {name} (defaults to {count} times the scale).",
+            )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        counts = {}
+        for name, count in DEFAULT_COUNTS.items():
+            if options[name] is not None:
+                counts[name] = options[name]
+            else:
+                counts[name] = int(count * options["scale"])
+
+        created = generate_dataset(
+            counts, seed=options["seed"], batch_size=options["batch_size"]
+        )
+
+        for name, count in created.items():
+            self.stdout.write(f"Created {count} {name}.")
+        self.stdout.write(self.style.SUCCESS("Dataset generated."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from suggestions.utils import reconcile_counts, reconcile_leaderboard
+
+
+class Command(BaseCommand):
+    help = "Recounts the votes and comments of every suggestion, and the leaderboard"
+
+    def handle(self, *args, **options):
+        fixed_count = reconcile_counts()
+        self.stdout.write(f"Fixed {fixed_count} suggestion(s).")
+
+        fixed_count = reconcile_leaderboard()
+        self.stdout.write(
+            self.style.SUCCESS(f"Fixed {fixed_count} leaderboard entry(s).")
+        )
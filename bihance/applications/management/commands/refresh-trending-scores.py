@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from suggestions.utils import refresh_trending_scores
+
+
+class Command(BaseCommand):
+    help = "Recomputes the trending scores of suggestions, periodically"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5 * 60,
+            help="Seconds between refreshes.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Refresh once, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            updated_count = refresh_trending_scores()
+            self.stdout.write(f"Updated {updated_count} trending score(s).")
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Trending scores refreshed."))
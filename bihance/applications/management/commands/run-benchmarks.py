@@ -0,0 +1,65 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from utils.benchmark import (
+    format_encoding_results,
+    format_results,
+    run_benchmarks,
+    run_encoding_benchmark,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmarks the /api/ endpoints against the current database (see generate-dataset)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=5)
+        parser.add_argument(
+            "--endpoint",
+            action="append",
+            dest="endpoints",
+            help="Only benchmark this endpoint (eg: jobs-list), can be repeated.",
+        )
+        parser.add_argument(
+            "--output", help="Save the results as JSON, to compare later runs with."
+        )
+        parser.add_argument(
+            "--baseline", help="Show changes from the results of a previous run."
+        )
+        parser.add_argument(
+            "--encoders",
+            action="store_true",
+            help="Compare the JSON encoders on realistic payloads instead.",
+        )
+
+    def handle(self, *args, **options):
+        if options["iterations"] < 1:
+            raise CommandError("--iterations must be at least 1.")
+
+        if options["encoders"]:
+            results = run_encoding_benchmark(options["iterations"])
+            self.stdout.write(format_encoding_results(results))
+            return
+
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        try:
+            results = run_benchmarks(
+                options["iterations"], options["warmup"], options["endpoints"]
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(format_results(results, baseline))
+
+        if options["output"]:
+            with open(options["output"], "w") as output_file:
+                json.dump(results, output_file, indent=2)
+            self.stdout.write(
+                self.style.SUCCESS(f"Saved results to {options['output']}.")
+            )
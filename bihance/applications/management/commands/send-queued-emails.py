@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from applications.utils import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Sends queued emails from the outbox, retrying and dead-lettering failures"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to sleep when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the outbox once, then exit.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        while True:
+            # Keep draining full batches before going back to sleep
+            while True:
+                sent_count, failed_count = send_queued_emails(batch_size)
+                if sent_count or failed_count:
+                    self.stdout.write(
+                        f"Sent {sent_count} email(s), {failed_count} failed."
+                    )
+                if sent_count + failed_count < batch_size:
+                    break
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(self.style.SUCCESS("Outbox drained."))
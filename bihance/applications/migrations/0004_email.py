@@ -0,0 +1,35 @@
+# Generated by Django 5.2 on 2026-10-18 09:45
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_job_category'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Email',
+            fields=[
+                ('email_id', models.UUIDField(db_column='emailId', default=uuid.uuid4, primary_key=True, serialize=False)),
+                ('recipients', models.JSONField()),
+                ('subject', models.TextField()),
+                ('body', models.TextField()),
+                ('from_email', models.TextField(blank=True, db_column='fromEmail', null=True)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Sent', 'Sent'), ('Dead', 'Dead')], default='Pending', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True, db_column='lastError', null=True)),
+                ('next_attempt_at', models.DateTimeField(db_column='nextAttemptAt', default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(db_column='createdAt', default=django.utils.timezone.now)),
+                ('sent_at', models.DateTimeField(blank=True, db_column='sentAt', null=True)),
+            ],
+            options={
+                'db_table': 'Email',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='Email_status_2abf91_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 09:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0004_email'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['-posted_date', '-job_id'], name='Job_postedD_803a9a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['employer_id', '-posted_date', '-job_id'], name='Job_employe_5aae3c_idx'),
+        ),
+    ]
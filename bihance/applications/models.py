@@ -1,6 +1,8 @@
 import uuid
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils import timezone
 
@@ -36,6 +38,12 @@ class PayType(models.TextChoices):
     NEGOTIABLE = "Negotiable"
 
 
+class EmailStatus(models.TextChoices):
+    PENDING = "Pending"
+    SENT = "Sent"
+    DEAD = "Dead"
+
+
 class User(AbstractUser):
     # Updating some defaults from AbstractUser
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, db_column="userId")
@@ -72,6 +80,8 @@ class User(AbstractUser):
         db_table = "User"
         indexes = [
             models.Index(fields=["email"]),
+            # User search, keyset pagination
+            models.Index(fields=["-created_at", "-id"]),
         ]
 
     def __str__(self):
@@ -112,12 +122,20 @@ class Job(models.Model):
         choices=PayType.choices, null=True, blank=True, db_column="payType"
     )
 
+    # Full text search document (name, requirement names, requirements, description)
+    # Kept up to date by database triggers, see jobs/migrations/0003_job_search_triggers
+    search_vector = SearchVectorField(null=True, blank=True, db_column="searchVector")
+
     class Meta:
         db_table = "Job"
         # Note, Django automatically creates index for FK
         indexes = [
             models.Index(fields=["job_type"]),
             models.Index(fields=["location_name"]),
+            # Keyset pagination of job listings (see jobs.models.JOB_ORDERING)
+            models.Index(fields=["-posted_date", "-job_id"]),
+            models.Index(fields=["employer_id", "-posted_date", "-job_id"]),
+            GinIndex(fields=["search_vector"]),
         ]
         unique_together = ("name", "employer_id", "start_date")
 
@@ -158,3 +176,36 @@ class Application(models.Model):
 
     def __str__(self):
         return str(self.application_id)
+
+
+# Outbox of emails, sent by the `send-queued-emails` worker
+# So that requests never wait on the mail provider
+class Email(models.Model):
+    email_id = models.UUIDField(
+        primary_key=True, default=uuid.uuid4, db_column="emailId"
+    )
+    recipients = models.JSONField()
+    subject = models.TextField()
+    body = models.TextField()
+    from_email = models.TextField(null=True, blank=True, db_column="fromEmail")
+
+    status = models.CharField(
+        max_length=20, choices=EmailStatus.choices, default=EmailStatus.PENDING
+    )
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True, db_column="lastError")
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now, db_column="nextAttemptAt"
+    )
+    created_at = models.DateTimeField(default=timezone.now, db_column="createdAt")
+    sent_at = models.DateTimeField(null=True, blank=True, db_column="sentAt")
+
+    class Meta:
+        db_table = "Email"
+        indexes = [
+            # Worker looks up due, pending emails
+            models.Index(fields=["status", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return str(self.email_id)
@@ -1,8 +1,15 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
-from django.test import TestCase
+from io import StringIO
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from rest_framework.test import APIClient
+from utils.benchmark import format_results, run_benchmarks
 from utils.tests.objects import get_application, get_employee, get_employer, get_job
 from utils.tests.utils import (
     verify_application_shape,
@@ -12,7 +19,8 @@ from utils.tests.utils import (
 )
 from utils.utils import terminate_current_connections
 
-from .models import Application
+from .models import Application, Email, EmailStatus, Job, User
+from .utils import claim_queued_emails, send_email, send_queued_emails
 
 terminate_current_connections()
 
@@ -81,6 +89,10 @@ class ApplicationsAPITest(TestCase):
         response = self.client.post(self.base_url, data, format="json")
         self.assertEqual(response.status_code, 200)
 
+        # Emails are queued, not sent during the request
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(Email.objects.filter(status=EmailStatus.PENDING).count(), 2)
+
     # PATCH
     def test_update_application_status(self):
         self.auth_employer()
@@ -99,3 +111,77 @@ class ApplicationsAPITest(TestCase):
         applicationId = Application.objects.first().application_id
         response = self.client.delete(f"{self.base_url}{applicationId}/")
         self.assertEqual(response.status_code, 200)
+
+
+# Fails every send, like an unreachable mail provider
+class FailingEmailBackend(EmailBackend):
+    def send_messages(self, messages):
+        raise ConnectionRefusedError("Mail provider is down.")
+
+
+class EmailOutboxTest(TestCase):
+    def test_worker_sends_queued_emails(self):
+        for i in range(3):
+            send_email(["employee@gmail.com"], f"Subject {i}", "Body")
+
+        call_command(
+            "send-queued-emails", "--once", "--batch-size", "2", stdout=StringIO()
+        )
+
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(Email.objects.filter(status=EmailStatus.SENT).count(), 3)
+
+    @override_settings(EMAIL_MAX_ATTEMPTS=2, EMAIL_RETRY_BASE_DELAY=0)
+    def test_worker_retries_then_dead_letters(self):
+        send_email(["employee@gmail.com"], "Subject", "Body")
+
+        sent_count, failed_count = send_queued_emails(10, FailingEmailBackend())
+        self.assertEqual((sent_count, failed_count), (0, 1))
+        email = Email.objects.get()
+        self.assertEqual(email.status, EmailStatus.PENDING)
+        self.assertEqual(email.attempts, 1)
+
+        send_queued_emails(10, FailingEmailBackend())
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatus.DEAD)
+        self.assertEqual(email.last_error, "Mail provider is down.")
+
+        # Dead letters are never picked up again
+        self.assertEqual(send_queued_emails(10), (0, 0))
+        self.assertEqual(len(mail.outbox), 0)
+
+
+    # Claimed emails wait for the lease to end, eg: when their worker crashed
+    def test_worker_lease(self):
+        send_email(["employee@gmail.com"], "Subject", "Body")
+        self.assertEqual(len(claim_queued_emails(10)), 1)
+        self.assertEqual(send_queued_emails(10), (0, 0))
+
+        # Lease over
+        Email.objects.update(next_attempt_at=timezone.now())
+        self.assertEqual(send_queued_emails(10), (1, 0))
+
+        email = Email.objects.get()
+        self.assertEqual(email.status, EmailStatus.SENT)
+        self.assertEqual(email.attempts, 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class BenchmarkTest(TestCase):
+    def test_generate_and_benchmark(self):
+        call_command("generate-dataset", "--scale", "0.05", stdout=StringIO())
+        self.assertEqual(User.objects.count(), 10)
+        self.assertEqual(Job.objects.count(), 5)
+        self.assertEqual(Application.objects.count(), 20)
+
+        # Every endpoint responds, with its numbers filled in
+        results = run_benchmarks(iterations=2, warmup=0)
+        self.assertEqual(len(results), len({result["name"] for result in results}))
+        for result in results:
+            self.assertEqual(result["status"], 200, result["name"])
+            self.assertGreater(result["queries"], 0, result["name"])
+            self.assertLessEqual(result["p50_ms"], result["p95_ms"])
+
+        # Requests were rolled back
+        self.assertEqual(Application.objects.count(), 20)
+        self.assertIn("jobs-list", format_results(results, baseline=results))
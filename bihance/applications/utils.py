@@ -1,9 +1,12 @@
 import os
+from datetime import timedelta
 
 from django.conf import settings
 from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
 
-from .models import Application
+from .models import Application, Email, EmailStatus
 
 base_queryset = Application.objects.select_related(
     "job_id", "employee_id"
@@ -32,20 +35,107 @@ def get_all_applications(user, application_status: int | None):
     return queryset
 
 
+# Queue the email, it is sent by the `send-queued-emails` worker
 def send_email(recipient_list, subject, message):
-    from_email = os.getenv("RESEND_FROM_EMAIL")
+    Email.objects.create(
+        recipients=list(recipient_list),
+        subject=subject,
+        body=message,
+        from_email=os.getenv("RESEND_FROM_EMAIL"),
+    )
 
-    with get_connection(
+
+def get_email_connection():
+    return get_connection(
         host=settings.RESEND_SMTP_HOST,
         port=settings.RESEND_SMTP_PORT,
         username=settings.RESEND_SMTP_USERNAME,
         password=os.getenv("RESEND_API_KEY"),
         use_tls=True,
-    ) as connection:
-        EmailMessage(
-            subject=subject,
-            body=message,
-            to=recipient_list,
-            from_email=from_email,
-            connection=connection,
-        ).send()
+    )
+
+
+# Seconds to wait before retrying an email that failed `attempts` times
+def get_retry_delay(attempts):
+    return settings.EMAIL_RETRY_BASE_DELAY * (2 ** (attempts - 1))
+
+
+# Claims one batch of due emails, in a short transaction
+# Claimed emails are pushed back by EMAIL_SEND_LEASE, so that other workers skip them
+# They are due again once the lease is over, eg: if this worker crashes before sending them
+def claim_queued_emails(batch_size):
+    with transaction.atomic():
+        # Skip rows locked by other workers, so that workers never claim the same email
+        emails = list(
+            Email.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatus.PENDING, next_attempt_at__lte=timezone.now())
+            .order_by("next_attempt_at")[:batch_size]
+        )
+
+        lease_end = timezone.now() + timedelta(seconds=settings.EMAIL_SEND_LEASE)
+        for email in emails:
+            # Counted when claimed, so that emails crashing the worker are dead-lettered too
+            email.attempts += 1
+            email.next_attempt_at = lease_end
+        Email.objects.bulk_update(emails, ["attempts", "next_attempt_at"])
+
+    return emails
+
+
+# Send one batch of due emails, over a single SMTP connection
+# Sent outside of any transaction, every email is marked as soon as it is sent
+# Returns a tuple of (sent count, failed count)
+def send_queued_emails(batch_size, connection=None):
+    sent_count = 0
+    failed_count = 0
+
+    emails = claim_queued_emails(batch_size)
+    if not emails:
+        return sent_count, failed_count
+
+    connection = connection or get_email_connection()
+    try:
+        connection.open()
+        connection_error = None
+    except Exception as e:
+        # Nothing can be sent, counts as a failed attempt for every email
+        connection_error = e
+
+    try:
+        for email in emails:
+            try:
+                if connection_error:
+                    raise connection_error
+
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    to=email.recipients,
+                    from_email=email.from_email,
+                    connection=connection,
+                ).send()
+
+                email.status = EmailStatus.SENT
+                email.sent_at = timezone.now()
+                email.last_error = None
+                sent_count += 1
+
+            except Exception as e:
+                email.last_error = str(e)
+                if email.attempts >= settings.EMAIL_MAX_ATTEMPTS:
+                    # Dead letter, kept around for inspection
+                    email.status = EmailStatus.DEAD
+                else:
+                    email.next_attempt_at = timezone.now() + timedelta(
+                        seconds=get_retry_delay(email.attempts)
+                    )
+                failed_count += 1
+
+            email.save(
+                update_fields=["status", "last_error", "next_attempt_at", "sent_at"]
+            )
+    finally:
+        if not connection_error:
+            connection.close()
+
+    return sent_count, failed_count
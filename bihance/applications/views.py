@@ -1,6 +1,7 @@
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse
 from message.serializers import MessageSerializer
 from rest_framework import permissions, viewsets
+from utils.renderers import JsonResponse
 from utils.utils import (
     is_employee,
     is_employee_in_application,
@@ -228,7 +229,9 @@ class ApplicationsViewSet(viewsets.ModelViewSet):
     def destroy(self, request, pk=None):
         # Try to retrieve the application record
         try:
-            application = Application.objects.get(application_id=pk)
+            application = Application.objects.select_related(
+                "employee_id", "job_id"
+            ).get(application_id=pk)
         except Application.DoesNotExist:
             return HttpResponse(f"Application with {pk} not found.", status=404)
 
@@ -242,8 +245,7 @@ class ApplicationsViewSet(viewsets.ModelViewSet):
             )
 
         # Perform delete
-        job_id = application.job_id.job_id
-        job_name = Job.objects.get(job_id=job_id).name
+        job_name = application.job_id.name
         application.delete()
 
         # Send confirmation email to EMPLOYEE
@@ -0,0 +1,113 @@
+# Generated by Django 5.2 on 2026-10-18 10:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Rejects availabilities that overlap another one of the same employee
+# Both ends are inclusive, so that back to back availabilities overlap too
+# The employee row is locked first, so that concurrent writers take turns
+# Since existing availabilities never overlap, only the last one starting before
+# NEW ends can overlap it (an index lookup, however many availabilities there are)
+# Existing availabilities are checked for that, before the trigger is installed
+CREATE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION timing_overlap_check() RETURNS trigger AS $$
+DECLARE
+    other RECORD;
+BEGIN
+    PERFORM 1 FROM "User"
+    WHERE "userId" = NEW."employeeId"
+    FOR NO KEY UPDATE;
+
+    SELECT "startTime", "endTime" INTO other
+    FROM "Timing"
+    WHERE "employeeId" = NEW."employeeId"
+        AND "timeId" <> NEW."timeId"
+        AND "startTime" <= NEW."endTime"
+    ORDER BY "startTime" DESC
+    LIMIT 1;
+
+    IF FOUND AND other."endTime" >= NEW."startTime" THEN
+        RAISE EXCEPTION 'Availability overlaps with % to %.',
+            other."startTime", other."endTime"
+            USING ERRCODE = 'exclusion_violation';
+    END IF;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER timing_overlap_trigger
+    BEFORE INSERT OR UPDATE ON "Timing"
+    FOR EACH ROW EXECUTE FUNCTION timing_overlap_check();
+"""
+
+# Pairs of existing availabilities that overlap (same rule as the trigger)
+# Each one against the latest end of the availabilities starting before it
+OVERLAPPING_TIMINGS_SQL = """
+SELECT "employeeId", "timeId", "startTime", "previousEndTime"
+FROM (
+    SELECT "employeeId", "timeId", "startTime",
+        MAX("endTime") OVER (
+            PARTITION BY "employeeId" ORDER BY "startTime", "endTime", "timeId"
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        ) AS "previousEndTime"
+    FROM "Timing"
+) AS "Ordered"
+WHERE "startTime" <= "previousEndTime"
+ORDER BY "employeeId", "startTime"
+LIMIT 10
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS timing_overlap_trigger ON "Timing";
+DROP FUNCTION IF EXISTS timing_overlap_check();
+"""
+
+
+def find_overlapping_timings(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(OVERLAPPING_TIMINGS_SQL)
+        return cursor.fetchall()
+
+
+# The trigger (and get_overlapping_timing) assume that existing availabilities never
+# Overlap, so availabilities created before it (eg: through the admin) are checked first
+def check_existing_timings(connection):
+    overlapping_timings = find_overlapping_timings(connection)
+    if overlapping_timings:
+        details = "\n".join(
+            f"employee {employee_id}: availability {time_id} starts at {start_time}, "
+            f"before an earlier one ends at {previous_end_time}"
+            for employee_id, time_id, start_time, previous_end_time in overlapping_timings
+        )
+        raise RuntimeError(
+            "Existing availabilities overlap, merge or delete them before migrating "
+            f"(first {len(overlapping_timings)} shown):\n{details}"
+        )
+
+
+# Other databases (eg: SQLite) rely on the check in AvailabilitiesViewSet alone
+def create_triggers(apps, schema_editor):
+    check_existing_timings(schema_editor.connection)
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(CREATE_TRIGGERS_SQL, params=None)
+
+
+def drop_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(DROP_TRIGGERS_SQL, params=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('availabilities', '0002_alter_timing_employee_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='timing',
+            index=models.Index(fields=['employee_id', 'start_time'], name='Timing_employe_8e44aa_idx'),
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
@@ -3,6 +3,9 @@ import uuid
 from applications.models import User
 from django.db import models
 
+# RRULE weekday names, in the order of datetime.weekday()
+WEEKDAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
 
 class Timing(models.Model):
     time_id = models.UUIDField(primary_key=True, default=uuid.uuid4, db_column="timeId")
@@ -16,6 +19,10 @@ class Timing(models.Model):
     class Meta:
         db_table = "Timing"
         unique_together = ("start_time", "end_time", "employee_id")
+        indexes = [
+            # Overlap checks (see availabilities/utils.py)
+            models.Index(fields=["employee_id", "start_time"]),
+        ]
 
     def __str__(self):
         return str(self.time_id)
@@ -1,7 +1,10 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
 from rest_framework import serializers
 from utils.utils import detect_extra_fields
 
-from .models import Timing
+from .models import WEEKDAYS, Timing
 
 
 class AvailabilitySerializer(serializers.ModelSerializer):
@@ -22,3 +25,91 @@ class AvailabilityCreateInputSerializer(serializers.Serializer):
         if data["startTime"] > data["endTime"]:
             raise serializers.ValidationError("Start time cannot exceed end time.")
         return data
+
+
+# Same as AvailabilityCreateInputSerializer, as an item of a list
+# Extra fields are detected by the parent (nested serializers have no initial_data)
+class AvailabilitySlotInputSerializer(serializers.Serializer):
+    startTime = serializers.DateTimeField()
+    endTime = serializers.DateTimeField()
+    title = serializers.CharField(required=False)
+
+    def validate(self, data):
+        if data["startTime"] > data["endTime"]:
+            raise serializers.ValidationError("Start time cannot exceed end time.")
+        return data
+
+
+# Keeps the UTC offset that the client sent, instead of converting to UTC
+class OffsetDateTimeField(serializers.DateTimeField):
+    def enforce_timezone(self, value):
+        if value.tzinfo is not None:
+            return value
+        return super().enforce_timezone(value)
+
+
+# RRULE-style recurrence, eg: weekly on MO and WE, 12 times
+# startTime/endTime is the first occurrence, its duration is used for the others
+# Expanded in timezone (an IANA name, eg: "Asia/Singapore"), or the offset of startTime
+class AvailabilityRecurrenceInputSerializer(AvailabilitySlotInputSerializer):
+    startTime = OffsetDateTimeField()
+    endTime = OffsetDateTimeField()
+    timezone = serializers.CharField(required=False)
+    frequency = serializers.ChoiceField(choices=["daily", "weekly"])
+    interval = serializers.IntegerField(required=False, min_value=1, default=1)
+    byWeekday = serializers.ListField(
+        required=False,
+        allow_empty=False,
+        child=serializers.ChoiceField(choices=WEEKDAYS),
+    )
+    count = serializers.IntegerField(required=False, min_value=1)
+    until = serializers.DateTimeField(required=False)
+
+    def validate_timezone(self, value):
+        try:
+            return ZoneInfo(value)
+        except (ZoneInfoNotFoundError, ValueError):
+            raise serializers.ValidationError("Unknown timezone.")
+
+    def validate(self, data):
+        data = super().validate(data)
+
+        if "count" not in data and "until" not in data:
+            raise serializers.ValidationError("Must provide either count or until.")
+        if "byWeekday" in data and data["frequency"] != "weekly":
+            raise serializers.ValidationError("byWeekday requires a weekly frequency.")
+        return data
+
+
+# ListField only checks max_length once every item is validated, this checks it first
+class BoundedListField(serializers.ListField):
+    def to_internal_value(self, data):
+        if (
+            self.max_length is not None
+            and isinstance(data, list)
+            and len(data) > self.max_length
+        ):
+            self.fail("max_length", max_length=self.max_length)
+        return super().to_internal_value(data)
+
+
+class AvailabilityBulkCreateInputSerializer(serializers.Serializer):
+    slots = BoundedListField(
+        required=False,
+        max_length=settings.MAX_BULK_AVAILABILITIES,
+        child=AvailabilitySlotInputSerializer(),
+    )
+    recurrence = AvailabilityRecurrenceInputSerializer(required=False)
+
+    def validate(self, data):
+        detect_extra_fields(self.initial_data, self.fields)
+        for slot in self.initial_data.get("slots", []):
+            detect_extra_fields(slot, self.fields["slots"].child.fields)
+        if "recurrence" in data:
+            detect_extra_fields(
+                self.initial_data["recurrence"], self.fields["recurrence"].fields
+            )
+
+        if not data.get("slots") and "recurrence" not in data:
+            raise serializers.ValidationError("Must provide slots or a recurrence.")
+        return data
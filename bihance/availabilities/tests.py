@@ -1,8 +1,13 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
-from datetime import timedelta
+from datetime import UTC, datetime, timedelta
+from importlib import import_module
+from unittest.mock import patch
+from zoneinfo import ZoneInfo
 
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
 from django.test import TestCase
 from django.utils import timezone
 from rest_framework.test import APIClient
@@ -11,6 +16,7 @@ from utils.tests.utils import verify_availability_shape
 from utils.utils import terminate_current_connections
 
 from .models import Timing
+from .serializers import AvailabilitySlotInputSerializer
 
 terminate_current_connections()
 
@@ -50,6 +56,226 @@ class AvailabilitiesAPITest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(Timing.objects.count(), 2)
 
+    def test_create_overlapping_availability(self):
+        start_time = self.employee_availability.start_time
+        end_time = self.employee_availability.end_time
+
+        # Same availability, overlapping and back to back (both ends are inclusive)
+        for data, message in [
+            ({"startTime": start_time, "endTime": end_time}, "already exists"),
+            (
+                {"startTime": start_time - timedelta(days=1), "endTime": start_time},
+                "overlaps",
+            ),
+            (
+                {"startTime": end_time, "endTime": end_time + timedelta(days=1)},
+                "overlaps",
+            ),
+            (
+                {
+                    "startTime": start_time + timedelta(days=1),
+                    "endTime": start_time + timedelta(days=2),
+                },
+                "overlaps",
+            ),
+        ]:
+            response = self.client.post(self.base_url, data, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(message, response.content.decode())
+        self.assertEqual(Timing.objects.count(), 1)
+
+        # Overlaps are rejected by the database too, eg: for concurrent requests
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Timing.objects.create(
+                employee_id=self.employee,
+                start_time=start_time + timedelta(days=1),
+                end_time=end_time + timedelta(days=1),
+            )
+
+    def test_create_availability_queries(self):
+        # Same queries, however many availabilities the employee has
+        start_time = self.employee_availability.end_time
+        for i in range(1, 21):
+            Timing.objects.create(
+                employee_id=self.employee,
+                start_time=start_time + timedelta(days=i * 2),
+                end_time=start_time + timedelta(days=i * 2 + 1),
+            )
+
+        data = {
+            "startTime": start_time + timedelta(days=100),
+            "endTime": start_time + timedelta(days=101),
+        }
+        with self.assertNumQueries(4):
+            response = self.client.post(self.base_url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_create_availabilities(self):
+        # A Monday, after the existing availability
+        start_time = datetime(2100, 1, 4, 9, tzinfo=UTC)
+        data = {
+            "slots": [
+                {"startTime": start_time, "endTime": start_time + timedelta(hours=1)},
+            ],
+            # Mondays and Wednesdays of every other week, 6 times
+            "recurrence": {
+                "startTime": start_time + timedelta(days=7),
+                "endTime": start_time + timedelta(days=7, hours=2),
+                "frequency": "weekly",
+                "interval": 2,
+                "byWeekday": ["MO", "WE"],
+                "count": 6,
+                "title": "shift",
+            },
+        }
+        with self.assertNumQueries(4):
+            response = self.client.post(f"{self.base_url}bulk/", data, format="json")
+        self.assertEqual(response.status_code, 200)
+
+        availabilities = response.json()
+        self.assertEqual(len(availabilities), 7)
+        for availability in availabilities:
+            verify_availability_shape(availability)
+        self.assertEqual(Timing.objects.count(), 8)
+
+        occurrences = Timing.objects.filter(title="shift").order_by("start_time")
+        self.assertEqual(
+            [(o.start_time - start_time).days for o in occurrences],
+            [7, 9, 21, 23, 35, 37],
+        )
+        for occurrence in occurrences:
+            self.assertEqual(
+                occurrence.end_time - occurrence.start_time, timedelta(hours=2)
+            )
+
+    # Weekdays and times are those of the client, not UTC
+    def test_bulk_create_recurrence_timezone(self):
+        url = f"{self.base_url}bulk/"
+
+        # Monday 07:00 at UTC+8, a Sunday in UTC
+        data = {
+            "recurrence": {
+                "startTime": "2100-01-04T07:00:00+08:00",
+                "endTime": "2100-01-04T08:00:00+08:00",
+                "frequency": "weekly",
+                "byWeekday": ["MO"],
+                "count": 2,
+            }
+        }
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [availability["start_time"] for availability in response.json()],
+            ["2100-01-03T23:00:00Z", "2100-01-10T23:00:00Z"],
+        )
+
+        # Same local time on either side of a DST change
+        new_york = ZoneInfo("America/New_York")
+        data = {
+            "recurrence": {
+                "startTime": "2100-03-01T09:00:00-05:00",
+                "endTime": "2100-03-01T10:00:00-05:00",
+                "timezone": "America/New_York",
+                "frequency": "weekly",
+                "count": 4,
+            }
+        }
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 200)
+        start_times = [
+            datetime.fromisoformat(availability["start_time"]).astimezone(new_york)
+            for availability in response.json()
+        ]
+        self.assertEqual([start.hour for start in start_times], [9, 9, 9, 9])
+        self.assertEqual([start.weekday() for start in start_times], [0, 0, 0, 0])
+        self.assertEqual(
+            len({start.utcoffset() for start in start_times}), 2, start_times
+        )
+
+        data["recurrence"]["timezone"] = "Mars/Olympus_Mons"
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_create_overlapping_availabilities(self):
+        start_time = self.employee_availability.end_time + timedelta(days=1)
+        url = f"{self.base_url}bulk/"
+
+        # Overlapping with each other, and with an existing availability
+        for slots in [
+            [
+                {"startTime": start_time, "endTime": start_time + timedelta(days=2)},
+                {
+                    "startTime": start_time + timedelta(days=1),
+                    "endTime": start_time + timedelta(days=3),
+                },
+            ],
+            [
+                {
+                    "startTime": self.employee_availability.end_time,
+                    "endTime": start_time,
+                },
+            ],
+        ]:
+            response = self.client.post(url, {"slots": slots}, format="json")
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("overlaps", response.content.decode())
+
+        # Daily, until far away, is cut off at the limit
+        data = {
+            "recurrence": {
+                "startTime": start_time,
+                "endTime": start_time + timedelta(hours=1),
+                "frequency": "daily",
+                "until": start_time + timedelta(days=365 * 100),
+            }
+        }
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Cannot create more than", response.content.decode())
+
+        # Too many slots, rejected before any of them is validated
+        slots = [
+            {
+                "startTime": start_time + timedelta(days=i),
+                "endTime": start_time + timedelta(days=i, hours=1),
+            }
+            for i in range(settings.MAX_BULK_AVAILABILITIES + 1)
+        ]
+        with patch.object(AvailabilitySlotInputSerializer, "validate") as validate:
+            response = self.client.post(url, {"slots": slots}, format="json")
+        self.assertEqual(response.status_code, 400)
+        validate.assert_not_called()
+
+        # Neither count nor until
+        del data["recurrence"]["until"]
+        response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Timing.objects.count(), 1)
+
+    # Existing overlaps are reported before the trigger is installed
+    def test_migration_checks_existing_timings(self):
+        migration = import_module("availabilities.migrations.0003_timing_no_overlap")
+        migration.check_existing_timings(connection)
+
+        # Eg: created before the trigger existed
+        # (deferred constraints are checked first, tables with pending checks cannot be altered)
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute(
+                'ALTER TABLE "Timing" DISABLE TRIGGER timing_overlap_trigger'
+            )
+        overlapping_timing = Timing.objects.create(
+            start_time=self.employee_availability.end_time,
+            end_time=self.employee_availability.end_time + timedelta(days=1),
+            employee_id=self.employee,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+            cursor.execute('ALTER TABLE "Timing" ENABLE TRIGGER timing_overlap_trigger')
+
+        with self.assertRaisesMessage(RuntimeError, str(overlapping_timing.time_id)):
+            migration.check_existing_timings(connection)
+
     # GET
     def test_get_availabilities(self):
         response = self.client.get(self.base_url)
@@ -1,2 +1,138 @@
+from datetime import UTC, timedelta
+
+from utils.serialization import FieldExtractor
+
+from .models import WEEKDAYS, Timing
+from .serializers import AvailabilitySerializer
+
+
 def is_employee_in_timing(employee, timing):
     return timing.employee_id == employee
+
+
+# Returns an availability of the employee that overlaps start_time to end_time, if any
+# Both ends are inclusive, so that back to back availabilities overlap too
+# Availabilities never overlap each other, so only the last one starting before
+# end_time can overlap (one index lookup, however many availabilities there are)
+def get_overlapping_timing(employee, start_time, end_time):
+    timing = (
+        Timing.objects.filter(employee_id=employee, start_time__lte=end_time)
+        .order_by("-start_time")
+        .first()
+    )
+    if timing is not None and timing.end_time >= start_time:
+        return timing
+    return None
+
+
+# Yields the (start_time, end_time) of every occurrence of a recurring availability
+# Every interval days (daily), or every interval weeks on by_weekday (weekly)
+# Up to count occurrences, or those starting at or before until (whichever comes first)
+# Lazily, so that callers can stop early (eg: once over a limit)
+# Days, weekdays and times are those of tz (default: the timezone of start_time)
+# So occurrences keep their local time across DST changes, and are yielded in UTC
+def expand_recurrence(
+    start_time,
+    end_time,
+    frequency,
+    interval=1,
+    by_weekday=None,
+    count=None,
+    until=None,
+    tz=None,
+):
+    duration = end_time - start_time
+    tz = tz or start_time.tzinfo
+    local_start_time = start_time.astimezone(tz).replace(tzinfo=None)
+    if frequency == "daily":
+        step = timedelta(days=interval)
+        offsets = [timedelta()]
+    else:
+        # Weeks start on Monday, occurrences before start_time (in its week) are skipped
+        step = timedelta(weeks=interval)
+        start_weekday = local_start_time.weekday()
+        weekdays = sorted({WEEKDAYS.index(day) for day in by_weekday or []})
+        weekdays = weekdays or [start_weekday]
+        offsets = [timedelta(days=day - start_weekday) for day in weekdays]
+
+    occurrence_count = 0
+    period_start = local_start_time
+    while True:
+        for offset in offsets:
+            # Wall clock arithmetic, then back to an absolute time
+            occurrence = (period_start + offset).replace(tzinfo=tz).astimezone(UTC)
+            if occurrence < start_time:
+                continue
+            if until is not None and occurrence > until:
+                return
+            if count is not None and occurrence_count >= count:
+                return
+
+            yield occurrence, occurrence + duration
+            occurrence_count += 1
+        period_start += step
+
+
+# Returns the (start_time, end_time, title) of the employee's availabilities
+# That could overlap one of the slots, ie: within the slots' overall range
+def get_timing_slots(employee, slots):
+    start_time = min(slot[0] for slot in slots)
+    end_time = max(slot[1] for slot in slots)
+    return list(
+        Timing.objects.filter(
+            employee_id=employee, start_time__lte=end_time, end_time__gte=start_time
+        ).values_list("start_time", "end_time", "title")
+    )
+
+
+# Returns a pair of overlapping (start_time, end_time, ...) slots, or None
+# Sorted by start time, a slot overlaps an earlier one iff it starts before
+# the latest end so far (both ends are inclusive, like get_overlapping_timing)
+def find_overlap(slots):
+    latest = None
+    for slot in sorted(slots, key=lambda slot: (slot[0], slot[1])):
+        if latest is not None and slot[0] <= latest[1]:
+            return latest, slot
+        if latest is None or slot[1] > latest[1]:
+            latest = slot
+    return None
+
+
+availability_extractor = FieldExtractor(AvailabilitySerializer)
+
+
+def to_json_objects(availabilities):
+    return [availability_extractor.from_instance(a) for a in availabilities]
+
+
+# Returns {employee_id: seconds of start_time to end_time that their availabilities cover}
+# One query for every employee, sorted so that a single sweep adds up the availabilities
+# Of each employee in turn, clipped to the window (overlapping parts are counted once)
+def get_covered_seconds(employee_ids, start_time, end_time):
+    covered_seconds = dict.fromkeys(employee_ids, 0.0)
+    rows = (
+        Timing.objects.filter(
+            employee_id__in=employee_ids,
+            start_time__lte=end_time,
+            end_time__gte=start_time,
+        )
+        .order_by("employee_id", "start_time")
+        .values_list("employee_id", "start_time", "end_time")
+    )
+
+    current_employee_id = None
+    covered_until = None
+    for employee_id, slot_start_time, slot_end_time in rows:
+        if employee_id != current_employee_id:
+            current_employee_id = employee_id
+            covered_until = start_time
+
+        slot_start_time = max(slot_start_time, covered_until)
+        slot_end_time = min(slot_end_time, end_time)
+        if slot_end_time > slot_start_time:
+            covered_seconds[employee_id] += (
+                slot_end_time - slot_start_time
+            ).total_seconds()
+            covered_until = slot_end_time
+
+    return covered_seconds
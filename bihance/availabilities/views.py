@@ -1,13 +1,27 @@
-from django.http import HttpResponse, JsonResponse
+from itertools import islice
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
 from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from utils.renderers import JsonResponse
 from utils.utils import is_employee
 
 from .models import Timing
 from .serializers import (
+    AvailabilityBulkCreateInputSerializer,
     AvailabilityCreateInputSerializer,
     AvailabilitySerializer,
 )
-from .utils import is_employee_in_timing
+from .utils import (
+    expand_recurrence,
+    find_overlap,
+    get_overlapping_timing,
+    get_timing_slots,
+    is_employee_in_timing,
+    to_json_objects,
+)
 
 
 class AvailabilitiesViewSet(viewsets.ModelViewSet):
@@ -42,46 +56,32 @@ class AvailabilitiesViewSet(viewsets.ModelViewSet):
         end_time = validated_data["endTime"]
         title = validated_data.get("title")
 
-        # Check if the availability exists already
-        try:
-            # UNIQUE constraint
-            Timing.objects.get(
-                employee_id=request.user, start_time=start_time, end_time=end_time
-            )
-            # No exception raised, availability exists
-            return HttpResponse("Availability already exists.", status=400)
+        # Check if the availability overlaps with (or is the same as) existing ones
+        other = get_overlapping_timing(request.user, start_time, end_time)
+        if other is not None:
+            if other.start_time == start_time and other.end_time == end_time:
+                return HttpResponse("Availability already exists.", status=400)
 
-        except Timing.DoesNotExist:
-            pass
-
-        # Check if the availability start-end time overlaps with existing ones
-        current_availabilities = Timing.objects.filter(employee_id=request.user)
-        has_overlap = False
-        other_start_time = None
-        other_end_time = None
-
-        for availability in current_availabilities:
-            if availability.start_time > end_time or availability.end_time < start_time:
-                continue
-            else:
-                has_overlap = True
-                other_start_time = availability.start_time
-                other_end_time = availability.end_time
-                break
-
-        if has_overlap:
             return HttpResponse(
-                f"New availability from {start_time} to {end_time} overlaps with current availability from {other_start_time} to {other_end_time}.",
+                f"New availability from {start_time} to {end_time} overlaps with current availability from {other.start_time} to {other.end_time}.",
                 status=400,
             )
 
         # Create the availability
-        new_availability = Timing.objects.create(
-            employee_id=request.user,
-            start_time=start_time,
-            end_time=end_time,
-            title=title if title else None,
-        )
+        # The database rejects overlaps created concurrently (see migrations)
+        try:
+            with transaction.atomic():
+                new_availability = Timing.objects.create(
+                    employee_id=request.user,
+                    start_time=start_time,
+                    end_time=end_time,
+                    title=title if title else None,
+                )
+        except IntegrityError:
+            return HttpResponse(
+                f"New availability from {start_time} to {end_time} overlaps with a current availability.",
+                status=400,
+            )
         new_availability_id = new_availability.time_id
 
         return HttpResponse(
@@ -89,6 +89,84 @@ class AvailabilitiesViewSet(viewsets.ModelViewSet):
             status=200,
         )
 
+    # POST -> availabilities/bulk/
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        # User verification
+        if not is_employee(request.user):
+            return HttpResponse("User must be an employee.", status=400)
+
+        # Input validation
+        input_serializer = AvailabilityBulkCreateInputSerializer(data=request.data)
+        if not input_serializer.is_valid():
+            return HttpResponse(input_serializer.errors, status=400)
+
+        validated_data = input_serializer.validated_data
+        max_count = settings.MAX_BULK_AVAILABILITIES
+
+        # (start_time, end_time, title) of every new availability
+        slots = [
+            (slot["startTime"], slot["endTime"], slot.get("title"))
+            for slot in validated_data.get("slots", [])
+        ]
+        recurrence = validated_data.get("recurrence")
+        if recurrence:
+            occurrences = expand_recurrence(
+                recurrence["startTime"],
+                recurrence["endTime"],
+                recurrence["frequency"],
+                interval=recurrence["interval"],
+                by_weekday=recurrence.get("byWeekday"),
+                count=recurrence.get("count"),
+                until=recurrence.get("until"),
+                tz=recurrence.get("timezone"),
+            )
+            # Expansion stops once over the limit (eg: a far away until)
+            slots += [
+                (start_time, end_time, recurrence.get("title"))
+                for start_time, end_time in islice(occurrences, max_count + 1)
+            ]
+
+        if not slots:
+            return HttpResponse("Recurrence has no occurrences.", status=400)
+        if len(slots) > max_count:
+            return HttpResponse(
+                f"Cannot create more than {max_count} availabilities at once.",
+                status=400,
+            )
+
+        # Check if the availabilities overlap with each other, or with existing ones
+        overlap = find_overlap(slots + get_timing_slots(request.user, slots))
+        if overlap:
+            (start_time, end_time, _), (other_start_time, other_end_time, _) = overlap
+            return HttpResponse(
+                f"Availability from {other_start_time} to {other_end_time} overlaps with availability from {start_time} to {end_time}.",
+                status=400,
+            )
+
+        # Create the availabilities
+        # The database rejects overlaps created concurrently (see migrations)
+        try:
+            with transaction.atomic():
+                new_availabilities = Timing.objects.bulk_create(
+                    [
+                        Timing(
+                            employee_id=request.user,
+                            start_time=start_time,
+                            end_time=end_time,
+                            title=title if title else None,
+                        )
+                        for start_time, end_time, title in slots
+                    ]
+                )
+        except IntegrityError:
+            return HttpResponse(
+                "New availabilities overlap with a current availability.", status=400
+            )
+
+        new_availabilities.sort(key=lambda timing: timing.start_time)
+        return JsonResponse(to_json_objects(new_availabilities), safe=False)
+
     # DELETE -> availability/:availability_id
     def destroy(self, request, pk=None):
         # Try to retrieve the timings record
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+
+Event streams (api/events/) and long polls (messages/poll/, group-messages/poll/)
+are only held cheaply when served through this module, eg:
+gunicorn -k uvicorn_worker.UvicornWorker bihance.asgi. Under WSGI, polls are
+answered at once, and event streams are refused.
 """
 
 import os
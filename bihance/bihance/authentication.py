@@ -1,23 +1,108 @@
-import os
-import uuid
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
 
 import jwt
-import requests
 from applications.models import User
-from django.core.cache import cache
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from dotenv import load_dotenv
-from jwt.algorithms import RSAAlgorithm
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 
+from .clerk import clerk_id_to_uuid, jwks_key_ring
+from .profiles import sync_user_profile
+
 load_dotenv()
-CLERK_API_URL = "https://api.clerk.com/v1"
-CACHE_KEY = "jwks_data"
 
-# Seed string
-# Use it to generate a seed UUID
-SEED_STRING = "7b2fe1c3-bed0-4869-b547-bffc17e36471"
-SEED_UUID = uuid.UUID(SEED_STRING)
+
+# Bounded LRU of already verified tokens, keyed by the token's digest
+# Polling clients re-send the same token, so they skip the RS256 check and user lookup
+# Entries are evicted once the token expires (exp claim)
+class VerifiedTokenCache:
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_digest(self, token):
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    # Returns (user, clerk_user_id, session_id), or None on a miss
+    def get(self, token):
+        digest = self.get_digest(token)
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is not None and entry["exp"] <= time.time():
+                del self.entries[digest]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(digest)
+            self.hits += 1
+
+        # Each request gets its own copy, so changes made during it never leak
+        return copy.copy(entry["user"]), entry["clerk_user_id"], entry["session_id"]
+
+    def set(self, token, user, payload):
+        # Tokens without an expiry are never cached
+        exp = payload.get("exp")
+        if exp is None:
+            return
+
+        entry = {
+            "user": copy.copy(user),
+            "clerk_user_id": payload["sub"],
+            "session_id": payload.get("sid"),
+            "exp": exp,
+        }
+        digest = self.get_digest(token)
+        with self.lock:
+            self.entries[digest] = entry
+            self.entries.move_to_end(digest)
+            while len(self.entries) > settings.CLERK_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    # Drop every cached token of this user, eg: after their row changed
+    def invalidate_user(self, user_id):
+        with self.lock:
+            for digest, entry in list(self.entries.items()):
+                if entry["user"].id == user_id:
+                    del self.entries[digest]
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+verified_tokens = VerifiedTokenCache()
+
+
+# Cached users must not outlive changes to their row (eg: role toggles)
+# Only covers this process, other workers catch up when the token expires
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_verified_tokens(sender, instance, **kwargs):
+    verified_tokens.invalidate_user(instance.id)
 
 
 class JWTAuthenticationMiddleware(BaseAuthentication):
@@ -32,28 +117,45 @@ class JWTAuthenticationMiddleware(BaseAuthentication):
         except IndexError:
             raise AuthenticationFailed("Bearer token not provided.")
 
-        user = self.decode_jwt(token)
-        if not user:
-            return None
+        return self.authenticate_credentials(token)
+
+    def authenticate_credentials(self, token):
+        cached = verified_tokens.get(token)
+        if cached:
+            user, clerk_user_id, session_id = cached
+        else:
+            payload = self.decode_jwt(token)
+
+            # Extract unique (Clerk) user_id
+            clerk_user_id: str = payload.get("sub")
+            if not clerk_user_id:
+                return None
 
-        clerk = ClerkSDK()
-        info, found = clerk.fetch_user_info(user.id)
-        if found:
-            user.email = info["email"]
-            user.first_name = info["first_name"]
-            user.last_name = info["last_name"]
-            user.save()
+            session_id = payload.get("sid")
+            user = self.get_user(clerk_user_id)
+
+        # Profile info is cached, Clerk is only called when the refresh policy says so
+        sync_user_profile(user, clerk_user_id, session_id=session_id)
+
+        # Cached after the sync, so that the cached user is already up to date
+        if not cached:
+            verified_tokens.set(token, user, payload)
 
         # Returns the authenticated user
         # Along with the credentials used for authentication (None, cuz not needed anymore)
         return user, None
 
     def decode_jwt(self, token):
-        clerk = ClerkSDK()
-        jwks_data = clerk.get_jwks()
+        try:
+            header = jwt.get_unverified_header(token)
+        except jwt.DecodeError:
+            raise AuthenticationFailed("Token decode error.")
 
         # Public key used to verify the JWT token
-        public_key = RSAAlgorithm.from_jwk(jwks_data["keys"][0])
+        # Picked by the key id the token was signed with
+        public_key = jwks_key_ring.get_key(header.get("kid"))
+        if public_key is None:
+            raise AuthenticationFailed("Token signing key not found.")
 
         try:
             payload = jwt.decode(
@@ -69,56 +171,11 @@ class JWTAuthenticationMiddleware(BaseAuthentication):
         except jwt.InvalidTokenError:
             raise AuthenticationFailed("Invalid token.")
 
-        # Extract unique user_id
-        # Convert it to unique associated uuid
-        user_id: str = payload.get("sub")
-        user_uuid: uuid = uuid.uuid5(SEED_UUID, user_id)
-        if user_id:
-            # Even if user was created
-            # Other compulsory fields will be set later
-            user, created = User.objects.get_or_create(id=user_uuid)
-            return user
-
-        return None
-
-
-class ClerkSDK:
-    # Returns a tuple
-    # First element -> user info, as an dictionary
-    # Second element -> boolean found, if user info was found or not
-    def fetch_user_info(self, user_id: str):
-        api_endpoint = f"{CLERK_API_URL}/users/{user_id}"
-        headers = {"Authorization": f"Bearer {os.getenv('CLERK_SECRET_KEY')}"}
-        response = requests.get(api_endpoint, headers=headers)
-
-        # 200 OK
-        if response.status_code == 200:
-            data = response.json()
-            return {
-                "email": data["email_addresses"][0]["email_address"],
-                "first_name": data["first_name"],
-                "last_name": data["last_name"],
-            }, True
-        else:
-            return {
-                "email": "",
-                "first_name": "",
-                "last_name": "",
-            }, False
-
-    def get_jwks(self):
-        jwks_data = cache.get(CACHE_KEY)
-        if not jwks_data:
-            api_endpoint = (
-                f"{os.getenv('CLERK_FRONTEND_API_URL')}/.well-known/jwks.json"
-            )
-            response = requests.get(api_endpoint)
-
-            # 200 OK
-            if response.status_code == 200:
-                jwks_data = response.json()
-                cache.set(CACHE_KEY, jwks_data)
-            else:
-                raise AuthenticationFailed("Failed to fetch JWKS.")
+        return payload
 
-        return jwks_data
+    def get_user(self, clerk_user_id):
+        # Convert it to unique associated uuid
+        # Even if user was created
+        # Other compulsory fields will be set later
+        user, created = User.objects.get_or_create(id=clerk_id_to_uuid(clerk_user_id))
+        return user
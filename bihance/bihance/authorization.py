@@ -0,0 +1,142 @@
+# Cached authorization checks, for the chat endpoints
+# Who is involved in an application, and which users are members of a group
+# So that chat writes and polls skip the Application/Group/GroupMember lookups
+# Entries live in the cache (see CACHES), shared by every worker when it is Redis
+# They are dropped as soon as their rows change (see the receivers below)
+# And expire after AUTHORIZATION_CACHE_TTL, in case an invalidation is missed
+
+import uuid
+
+from applications.models import Application
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from groups.models import GroupMember
+
+APPLICATION_CACHE_KEY_PREFIX = "application_participants"
+GROUP_MEMBER_CACHE_KEY_PREFIX = "group_member"
+
+
+def get_application_cache_key(application_id):
+    return f"{APPLICATION_CACHE_KEY_PREFIX}:{application_id}"
+
+
+def get_group_member_cache_key(user_id, group_id):
+    return f"{GROUP_MEMBER_CACHE_KEY_PREFIX}:{user_id}:{group_id}"
+
+
+def to_uuids(ids):
+    return [
+        value if isinstance(value, uuid.UUID) else uuid.UUID(value) for value in ids
+    ]
+
+
+# Returns {application_id: (employee_id, employer_id)}
+# Applications that do not exist are left out
+# One cache round trip, and one query for the applications not cached yet
+def get_application_participants(application_ids):
+    application_ids = to_uuids(application_ids)
+    cached = cache.get_many([get_application_cache_key(i) for i in application_ids])
+
+    participants = {}
+    missing_ids = []
+    for application_id in application_ids:
+        entry = cached.get(get_application_cache_key(application_id))
+        if entry is None:
+            missing_ids.append(application_id)
+        else:
+            participants[application_id] = entry
+
+    if missing_ids:
+        rows = Application.objects.filter(application_id__in=missing_ids).values_list(
+            "application_id", "employee_id", "employer_id"
+        )
+        fetched = {
+            application_id: (employee_id, employer_id)
+            for application_id, employee_id, employer_id in rows
+        }
+        cache.set_many(
+            {get_application_cache_key(i): entry for i, entry in fetched.items()},
+            settings.AUTHORIZATION_CACHE_TTL,
+        )
+        participants.update(fetched)
+
+    return participants
+
+
+# Returns (employee_id, employer_id), or None if the application does not exist
+def get_participants(application_id):
+    return get_application_participants([application_id]).get(
+        to_uuids([application_id])[0]
+    )
+
+
+# Returns {group_id: member_id}, for the groups that the user is a member of
+# Only memberships are cached, so that adding members needs no invalidation
+def get_group_member_ids(user, group_ids):
+    group_ids = to_uuids(group_ids)
+    cached = cache.get_many([get_group_member_cache_key(user.id, i) for i in group_ids])
+
+    member_ids = {}
+    missing_ids = []
+    for group_id in group_ids:
+        member_id = cached.get(get_group_member_cache_key(user.id, group_id))
+        if member_id is None:
+            missing_ids.append(group_id)
+        else:
+            member_ids[group_id] = member_id
+
+    if missing_ids:
+        fetched = dict(
+            GroupMember.objects.filter(
+                user_id=user, group_id__in=missing_ids
+            ).values_list("group_id", "member_id")
+        )
+        cache.set_many(
+            {
+                get_group_member_cache_key(user.id, i): member_id
+                for i, member_id in fetched.items()
+            },
+            settings.AUTHORIZATION_CACHE_TTL,
+        )
+        member_ids.update(fetched)
+
+    return member_ids
+
+
+# Returns the user's member_id in the group, or None if they are not a member
+def get_member_id(user, group_id):
+    return get_group_member_ids(user, [group_id]).get(to_uuids([group_id])[0])
+
+
+def invalidate_application(application_id):
+    cache.delete(get_application_cache_key(application_id))
+
+
+def invalidate_group_member(user_id, group_id):
+    cache.delete(get_group_member_cache_key(user_id, group_id))
+
+
+# Dropped at once (for the rest of the transaction), and again once committed
+# Since a concurrent request may cache the old row before the change commits
+def invalidate_on_commit(invalidate, *args):
+    invalidate(*args)
+    transaction.on_commit(lambda: invalidate(*args))
+
+
+# Queryset deletes send these too, and so do cascades (eg: deleting a group)
+# Role changes (queryset updates) do not, but roles are not cached
+@receiver(post_save, sender=Application)
+@receiver(post_delete, sender=Application)
+def invalidate_application_on_change(sender, instance, **kwargs):
+    invalidate_on_commit(invalidate_application, instance.application_id)
+
+
+@receiver(post_save, sender=GroupMember)
+@receiver(post_delete, sender=GroupMember)
+def invalidate_group_member_on_change(sender, instance, **kwargs):
+    invalidate_on_commit(
+        invalidate_group_member, instance.user_id_id, instance.group_id_id
+    )
@@ -0,0 +1,184 @@
+import os
+import threading
+import time
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from jwt.algorithms import RSAAlgorithm
+from rest_framework.exceptions import AuthenticationFailed
+
+from .http_client import HTTPClient
+
+CLERK_API_URL = "https://api.clerk.com/v1"
+CACHE_KEY = "jwks_data"
+
+# Seed string
+# Use it to generate a seed UUID
+SEED_STRING = "7b2fe1c3-bed0-4869-b547-bffc17e36471"
+SEED_UUID = uuid.UUID(SEED_STRING)
+
+# Shared by every call to Clerk in this process
+# Built on first use, so that it picks up the settings
+clerk_client = None
+clerk_client_lock = threading.Lock()
+
+
+def get_clerk_client():
+    global clerk_client
+    with clerk_client_lock:
+        if clerk_client is None:
+            clerk_client = HTTPClient(
+                timeout=settings.CLERK_HTTP_TIMEOUT,
+                retries=settings.CLERK_HTTP_RETRIES,
+                backoff_factor=settings.CLERK_HTTP_BACKOFF_FACTOR,
+                pool_size=settings.CLERK_HTTP_POOL_SIZE,
+                failure_threshold=settings.CLERK_CIRCUIT_FAILURE_THRESHOLD,
+                reset_timeout=settings.CLERK_CIRCUIT_RESET_TIMEOUT,
+            )
+    return clerk_client
+
+
+# Clerk user ids (eg: user_2abc...) are not UUIDs
+# Convert them to their unique associated uuid, which is our User PK
+def clerk_id_to_uuid(clerk_user_id: str):
+    return uuid.uuid5(SEED_UUID, clerk_user_id)
+
+
+# Parse a Clerk user object (from the API or a webhook) into our profile fields
+def parse_user_info(data):
+    email_addresses = data.get("email_addresses") or []
+    return {
+        "email": email_addresses[0]["email_address"] if email_addresses else "",
+        "first_name": data.get("first_name"),
+        "last_name": data.get("last_name"),
+    }
+
+
+class ClerkSDK:
+    # Returns a tuple
+    # First element -> user info, as an dictionary
+    # Second element -> boolean found, if user info was found or not
+    def fetch_user_info(self, user_id: str):
+        api_endpoint = f"{CLERK_API_URL}/users/{user_id}"
+        headers = {"Authorization": f"Bearer {os.getenv('CLERK_SECRET_KEY')}"}
+
+        # Clerk being down or slow should not fail the request
+        # Callers keep using the profile they already have
+        try:
+            response = get_clerk_client().get(api_endpoint, headers=headers)
+        except requests.RequestException:
+            response = None
+
+        # 200 OK
+        if response is not None and response.status_code == 200:
+            return parse_user_info(response.json()), True
+        else:
+            return {
+                "email": "",
+                "first_name": "",
+                "last_name": "",
+            }, False
+
+    # Refresh skips the (possibly stale) cached JWKS
+    def get_jwks(self, refresh=False):
+        jwks_data = None if refresh else cache.get(CACHE_KEY)
+        if not jwks_data:
+            api_endpoint = (
+                f"{os.getenv('CLERK_FRONTEND_API_URL')}/.well-known/jwks.json"
+            )
+            try:
+                response = get_clerk_client().get(api_endpoint)
+            except requests.RequestException:
+                raise AuthenticationFailed("Failed to fetch JWKS.")
+
+            # 200 OK
+            if response.status_code == 200:
+                jwks_data = response.json()
+                cache.set(CACHE_KEY, jwks_data, settings.CLERK_JWKS_TTL)
+            else:
+                raise AuthenticationFailed("Failed to fetch JWKS.")
+
+        return jwks_data
+
+
+# Process-local set of parsed public keys, indexed by their key id (kid)
+# So that RSA keys are only parsed when the JWKS is (re)fetched, not per request
+class JWKSKeyRing:
+    # Minimum seconds between refreshes triggered by unknown kids
+    # Stops tokens with made-up kids from hammering the JWKS endpoint
+    MIN_REFRESH_INTERVAL = 30
+
+    def __init__(self):
+        self.keys = {}
+        self.fetched_at = None
+        self.forced_at = None
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def is_expired(self):
+        return (
+            self.fetched_at is None
+            or time.monotonic() - self.fetched_at > settings.CLERK_JWKS_TTL
+        )
+
+    def load(self, jwks_data):
+        keys = {}
+        for jwk in jwks_data["keys"]:
+            keys[jwk.get("kid")] = RSAAlgorithm.from_jwk(jwk)
+
+        # Swap in a whole new dict, so readers never see a half-built ring
+        self.keys = keys
+        self.fetched_at = time.monotonic()
+        self.generation += 1
+
+    # Force skips the shared cache and goes straight to Clerk
+    def refresh(self, seen_generation, force):
+        # Single flight, only one thread fetches while the others wait
+        with self.lock:
+            # Another thread refreshed the ring while we were waiting
+            if self.generation != seen_generation:
+                return
+
+            if force:
+                now = time.monotonic()
+                if (
+                    self.forced_at is not None
+                    and now - self.forced_at < self.MIN_REFRESH_INTERVAL
+                ):
+                    return
+                self.forced_at = now
+
+            self.load(ClerkSDK().get_jwks(refresh=force))
+
+    def lookup(self, kid):
+        # Tokens without a kid can only be verified against a lone key
+        if kid is None and len(self.keys) == 1:
+            return next(iter(self.keys.values()))
+        return self.keys.get(kid)
+
+    # Returns the public key for kid, or None if Clerk does not know of it
+    def get_key(self, kid):
+        seen_generation = self.generation
+        if self.is_expired():
+            self.refresh(seen_generation, force=False)
+            seen_generation = self.generation
+
+        key = self.lookup(kid)
+        if key is None:
+            # Keys may have been rotated since our last fetch
+            self.refresh(seen_generation, force=True)
+            key = self.lookup(kid)
+
+        return key
+
+    def clear(self):
+        with self.lock:
+            self.keys = {}
+            self.fetched_at = None
+            self.forced_at = None
+            self.generation += 1
+
+
+jwks_key_ring = JWKSKeyRing()
@@ -0,0 +1,120 @@
+# Shared outbound HTTP client
+# Pools keep-alive connections, retries with backoff, and stops calling a failing upstream
+
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Upstream responses that count as (retryable) failures
+RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+# closed -> requests flow normally, failures are counted
+# open -> requests fail fast, until reset_timeout has passed
+# half-open -> a single trial request decides between closed and open
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half-open"
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.lock = threading.Lock()
+
+    def allow_request(self):
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                return True
+
+            # Half-open, a trial request is already in flight
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class HTTPClient:
+    def __init__(
+        self,
+        timeout=(3.05, 5),
+        retries=2,
+        backoff_factor=0.2,
+        pool_size=10,
+        failure_threshold=5,
+        reset_timeout=30,
+    ):
+        # (connect, read) timeouts in seconds
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+
+        # Only idempotent requests are retried
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=["GET", "HEAD"],
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+        )
+
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    # Raises CircuitOpenError while the upstream is considered down
+    # And requests.RequestException for connection errors or timeouts
+    def request(self, method, url, **kwargs):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"Circuit open, not calling {url}.")
+
+        kwargs.setdefault("timeout", self.timeout)
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except BaseException:
+            # Any error counts, so that a half-open trial always ends
+            self.breaker.record_failure()
+            raise
+
+        # Upstream errors and rate limits count against the upstream
+        # Other 4xx responses are the caller's problem
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,306 @@
+# Per-route request instrumentation
+# Records query count, DB time, serialization time and total time of every request
+# Exposed in the Prometheus text format (see `metrics` view), optionally as Server-Timing headers
+
+import contextvars
+import functools
+import hmac
+import logging
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (in seconds) of the request duration histogram
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# Stats of the request currently being handled (None outside of requests)
+current_request = contextvars.ContextVar("current_request", default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.serialization_depth = 0
+
+
+class RouteStats:
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialization_time = 0.0
+        self.total_time = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def record(self, method, route, stats, total_time):
+        with self.lock:
+            route_stats = self.routes.setdefault((method, route), RouteStats())
+            route_stats.requests += 1
+            route_stats.queries += stats.queries
+            route_stats.db_time += stats.db_time
+            route_stats.serialization_time += stats.serialization_time
+            route_stats.total_time += total_time
+            for i, bucket in enumerate(DURATION_BUCKETS):
+                if total_time <= bucket:
+                    route_stats.buckets[i] += 1
+
+    def clear(self):
+        with self.lock:
+            self.routes = {}
+
+    # Prometheus text exposition format, version 0.0.4
+    def render(self):
+        with self.lock:
+            routes = sorted(self.routes.items())
+
+        lines = []
+
+        def add_metric(name, metric_type, help_text, get_value):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for (method, route), route_stats in routes:
+                labels = f'method="{method}",route="{route}"'
+                lines.append(f"{name}{{{labels}}} {get_value(route_stats)}")
+
+        add_metric(
+            "bihance_requests_total",
+            "counter",
+            "Requests handled.",
+            lambda route_stats: route_stats.requests,
+        )
+        add_metric(
+            "bihance_db_queries_total",
+            "counter",
+            "SQL queries executed.",
+            lambda route_stats: route_stats.queries,
+        )
+        add_metric(
+            "bihance_db_seconds_total",
+            "counter",
+            "Time spent executing SQL queries.",
+            lambda route_stats: route_stats.db_time,
+        )
+        add_metric(
+            "bihance_serialization_seconds_total",
+            "counter",
+            "Time spent serializing responses, including lazily loaded relations.",
+            lambda route_stats: route_stats.serialization_time,
+        )
+
+        name = "bihance_request_duration_seconds"
+        lines.append(f"# HELP {name} Total time spent handling requests.")
+        lines.append(f"# TYPE {name} histogram")
+        for (method, route), route_stats in routes:
+            labels = f'method="{method}",route="{route}"'
+            for bucket, count in zip(DURATION_BUCKETS, route_stats.buckets):
+                lines.append(f'{name}_bucket{{{labels},le="{bucket}"}} {count}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {route_stats.requests}')
+            lines.append(f"{name}_sum{{{labels}}} {route_stats.total_time}")
+            lines.append(f"{name}_count{{{labels}}} {route_stats.requests}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+# Counts time spent in the decorated function as serialization time
+# Nested calls (eg: to_json_object calling another serializer) are only counted once
+def serialization_timer(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = current_request.get()
+        if stats is None:
+            return func(*args, **kwargs)
+
+        stats.serialization_depth += 1
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.serialization_depth -= 1
+            if stats.serialization_depth == 0:
+                stats.serialization_time += time.perf_counter() - start
+
+    return wrapper
+
+
+def get_query_counter(stats):
+    def count_query(execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats.queries += 1
+            stats.db_time += time.perf_counter() - start
+
+    return count_query
+
+
+def add_execute_wrapper(wrapper):
+    connection.execute_wrappers.append(wrapper)
+
+
+def remove_execute_wrapper(wrapper):
+    connection.execute_wrappers.remove(wrapper)
+
+
+# Views are labelled by their url name, eg: "jobs-list"
+def get_route(request):
+    resolver_match = getattr(request, "resolver_match", None)
+    if resolver_match is None:
+        return "unmatched"
+    return resolver_match.view_name or resolver_match.route
+
+
+# Runs in the same mode as the rest of the stack, so that async views (eg: polls) are
+# held by the event loop under ASGI, instead of a thread of their own
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        count_query = get_query_counter(stats)
+
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(count_query):
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+        return self.process_stats(request, response, stats, count_query, start)
+
+    # Connections are per thread, and views reach the db through sync_to_async
+    # So the counter is installed on the connection of that (thread sensitive) thread
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        count_query = get_query_counter(stats)
+
+        start = time.perf_counter()
+        await sync_to_async(add_execute_wrapper)(count_query)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(remove_execute_wrapper)(count_query)
+            current_request.reset(token)
+
+        return self.process_stats(request, response, stats, count_query, start)
+
+    def process_stats(self, request, response, stats, count_query, start):
+        route = get_route(request)
+        if response.streaming:
+            # Budgets cover the view only, streamed bodies grow with their number of chunks
+            self.check_query_budget(request.method, route, stats.queries)
+            response.streaming_content = self.count_streaming(
+                request.method, route, response, stats, count_query, start
+            )
+            return response
+
+        total_time = time.perf_counter() - start
+        registry.record(request.method, route, stats, total_time)
+
+        if settings.SERVER_TIMING:
+            response["Server-Timing"] = ", ".join(
+                [
+                    f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+                    f"serialize;dur={stats.serialization_time * 1000:.1f}",
+                    f"total;dur={total_time * 1000:.1f}",
+                ]
+            )
+
+        self.check_query_budget(request.method, route, stats.queries)
+        return response
+
+    # Streamed bodies are read after the view returned (eg: StreamingJsonResponse)
+    # So their queries are counted too, and the request is recorded once the stream ends
+    def count_streaming(self, method, route, response, stats, count_query, start):
+        streaming_content = response.streaming_content
+
+        def record():
+            registry.record(method, route, stats, time.perf_counter() - start)
+
+        if response.is_async:
+
+            async def counted_content():
+                current_request.set(stats)
+                await sync_to_async(add_execute_wrapper)(count_query)
+                try:
+                    async for part in streaming_content:
+                        yield part
+                finally:
+                    await sync_to_async(remove_execute_wrapper)(count_query)
+                    current_request.set(None)
+                    record()
+
+        else:
+
+            def counted_content():
+                current_request.set(stats)
+                try:
+                    with connection.execute_wrapper(count_query):
+                        yield from streaming_content
+                finally:
+                    current_request.set(None)
+                    record()
+
+        return counted_content()
+
+    def check_query_budget(self, method, route, queries):
+        budget = settings.QUERY_BUDGETS.get(f"{method} {route}")
+        if budget is None or queries <= budget:
+            return
+
+        message = (
+            f"{method} {route} ran {queries} queries, over its budget of {budget}."
+        )
+        if settings.ENFORCE_QUERY_BUDGETS:
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+# GET -> api/metrics/
+@require_GET
+def metrics(request):
+    # Scrapers authenticate with a static token
+    # Metrics are not exposed at all, unless one is configured
+    if not settings.METRICS_TOKEN:
+        return HttpResponse("Not found.", status=404)
+
+    auth_header = request.headers.get("Authorization", "")
+    if not hmac.compare_digest(auth_header, f"Bearer {settings.METRICS_TOKEN}"):
+        return HttpResponse("Invalid metrics token.", status=401)
+
+    return HttpResponse(
+        registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,99 @@
+# Keeps our User rows in sync with their Clerk profiles
+# Without calling the Clerk API (and writing to the db) on every request
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .clerk import ClerkSDK
+
+PROFILE_CACHE_KEY_PREFIX = "clerk_profile"
+PROFILE_FIELDS = ["email", "first_name", "last_name"]
+
+# When to re-fetch a profile from Clerk
+# login -> once per Clerk session (ie: the `sid` claim changes)
+# ttl -> once the cached profile has expired
+# webhook -> never during a request, Clerk pushes updates to us instead
+REFRESH_ON_LOGIN = "login"
+REFRESH_ON_TTL = "ttl"
+REFRESH_ON_WEBHOOK = "webhook"
+
+
+def get_profile_cache_key(clerk_user_id):
+    return f"{PROFILE_CACHE_KEY_PREFIX}:{clerk_user_id}"
+
+
+def get_refresh_policy():
+    policy = settings.CLERK_PROFILE_REFRESH_POLICY
+    if policy not in [REFRESH_ON_LOGIN, REFRESH_ON_TTL, REFRESH_ON_WEBHOOK]:
+        raise ValueError(f"Unknown Clerk profile refresh policy: {policy}.")
+    return policy
+
+
+def store_profile(clerk_user_id, info, session_id=None):
+    # Only the TTL policy needs the cached profile to expire by itself
+    if get_refresh_policy() == REFRESH_ON_TTL:
+        timeout = settings.CLERK_PROFILE_CACHE_TTL
+    else:
+        timeout = None
+
+    entry = {field: info[field] for field in PROFILE_FIELDS}
+    entry["session_id"] = session_id
+    cache.set(get_profile_cache_key(clerk_user_id), entry, timeout)
+
+
+def invalidate_profile(clerk_user_id):
+    cache.delete(get_profile_cache_key(clerk_user_id))
+
+
+# Copy profile info onto the user
+# Only issues an UPDATE (for the changed columns) if something actually changed
+# Returns the list of changed fields
+def apply_profile(user, info):
+    changed_fields = [
+        field for field in PROFILE_FIELDS if getattr(user, field) != info[field]
+    ]
+    if changed_fields:
+        for field in changed_fields:
+            setattr(user, field, info[field])
+        user.save(update_fields=changed_fields)
+
+    return changed_fields
+
+
+def is_stale(entry, session_id, policy):
+    if entry is None:
+        return True
+
+    # New Clerk session, means the user has just logged in (again)
+    if policy == REFRESH_ON_LOGIN:
+        return session_id is not None and entry["session_id"] != session_id
+
+    # Expired entries are evicted by the cache itself
+    return False
+
+
+def sync_user_profile(user, clerk_user_id, session_id=None):
+    policy = get_refresh_policy()
+    entry = cache.get(get_profile_cache_key(clerk_user_id))
+
+    if not is_stale(entry, session_id, policy):
+        apply_profile(user, entry)
+        return user
+
+    # Webhooks keep existing profiles up to date
+    # Only users we have never synced before need a fetch
+    if policy == REFRESH_ON_WEBHOOK and user.email:
+        store_profile(
+            clerk_user_id,
+            {field: getattr(user, field) for field in PROFILE_FIELDS},
+            session_id,
+        )
+        return user
+
+    clerk = ClerkSDK()
+    info, found = clerk.fetch_user_info(clerk_user_id)
+    if found:
+        apply_profile(user, info)
+        store_profile(clerk_user_id, info, session_id)
+
+    return user
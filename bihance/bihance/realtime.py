@@ -0,0 +1,415 @@
+# Real-time push of application and group messages, as Server-Sent Events
+# Clients subscribe with GET api/events/?applicationId=<id>&groupId=<id> (both repeatable)
+# And receive the same change objects as messages/sync and group-messages/sync
+# EventSource cannot send headers, so it opens the stream with a token from POST api/events/token/
+# Clients that cannot hold a stream long poll instead (see wait_for_changes)
+# Fan-out goes through a pluggable broker (settings.REALTIME_BROKER)
+# Streams and polls are held open by the event loop, not a worker thread, so serve them over ASGI
+# (see bihance/asgi.py), under WSGI every open one takes up a whole worker
+# Streams end once the user is no longer part of every conversation (checked every heartbeat)
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+import psycopg
+from applications.models import User
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.db import connection, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from files.models import File
+from groups.models import GroupMessage
+from groups.utils import to_change_json_objects as to_group_change_json_objects
+from message.models import Message
+from message.utils import to_change_json_objects as to_message_change_json_objects
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from utils.renderers import JsonResponse, dumps
+from utils.utils import detect_extra_fields, is_asgi
+
+from .authentication import JWTAuthenticationMiddleware
+from .authorization import get_application_participants, get_group_member_ids
+
+logger = logging.getLogger(__name__)
+
+
+def get_channel(kind, conversation_id):
+    return f"{kind}:{conversation_id}"
+
+
+# Events received by one client, from the channels it subscribed to
+class Subscription:
+    # Must be created within the event loop that reads it
+    def __init__(self, channels):
+        self.channels = channels
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=settings.REALTIME_QUEUE_SIZE)
+        self.overflowed = False
+
+    # Safe to call from any thread, eg: a view publishing a new message
+    def put(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self.put_nowait, event)
+        except RuntimeError:
+            # Event loop already closed, the client is gone
+            pass
+
+    def put_nowait(self, event):
+        # Clients that fall behind lose their events, and are told to resync instead
+        if self.queue.full():
+            self.overflowed = True
+            return
+        self.queue.put_nowait(event)
+
+    # Returns the next (name, data) event, or None once timeout seconds have passed
+    async def get(self, timeout=None):
+        if self.overflowed:
+            self.overflowed = False
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            return "resync", {}
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except TimeoutError:
+            return None
+
+
+# Fans events out to the subscriptions of this process only
+# Brokers implement subscribe, unsubscribe, publish and has_subscribers
+class InProcessBroker:
+    def __init__(self):
+        self.subscriptions = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = Subscription(channels)
+        with self.lock:
+            for channel in channels:
+                self.subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                channel_subscriptions = self.subscriptions.get(channel, set())
+                channel_subscriptions.discard(subscription)
+                if not channel_subscriptions:
+                    self.subscriptions.pop(channel, None)
+
+    def has_subscribers(self, channel):
+        with self.lock:
+            return channel in self.subscriptions
+
+    def publish(self, channel, event):
+        with self.lock:
+            channel_subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in channel_subscriptions:
+            subscription.put(event)
+
+
+# Shares events between processes (eg: server workers) through PostgreSQL LISTEN/NOTIFY
+# Every process listens on one dedicated connection, and fans out to its own subscriptions
+# NOTIFY payloads are limited to 8000 bytes, so larger events become a resync
+class PostgresBroker(InProcessBroker):
+    pg_channel = "bihance_events"
+    max_payload_size = 7900
+
+    def __init__(self):
+        super().__init__()
+        self.listening = threading.Event()
+        self.stopped = threading.Event()
+        self.listener = threading.Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+    # Subscribers of other processes are unknown
+    def has_subscribers(self, channel):
+        return True
+
+    def publish(self, channel, event):
+        payload = dumps([channel, event])
+        if len(payload) > self.max_payload_size:
+            payload = dumps([channel, ("resync", {})])
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT pg_notify(%s, %s)", [self.pg_channel, payload.decode()]
+            )
+
+    def listen(self):
+        while not self.stopped.is_set():
+            try:
+                with psycopg.connect(
+                    **connection.get_connection_params(), autocommit=True
+                ) as pg_connection:
+                    pg_connection.execute(f"LISTEN {self.pg_channel}")
+                    self.listening.set()
+
+                    # Wakes up every second, to notice when stopped
+                    while not self.stopped.is_set():
+                        for notify in pg_connection.notifies(timeout=1):
+                            channel, event = json.loads(notify.payload)
+                            super().publish(channel, tuple(event))
+            except psycopg.Error:
+                logger.exception("Lost the LISTEN connection, reconnecting.")
+                self.listening.clear()
+                self.stopped.wait(1)
+
+    def close(self):
+        self.stopped.set()
+        self.listener.join()
+
+
+brokers = {}
+brokers_lock = threading.Lock()
+
+
+# One broker per configured class, shared by the whole process
+def get_broker():
+    path = settings.REALTIME_BROKER
+    with brokers_lock:
+        if path not in brokers:
+            brokers[path] = import_string(path)()
+        return brokers[path]
+
+
+# Messages are re-read for the seq (and file) assigned by the database
+def publish_change(channel, model, message_id):
+    broker = get_broker()
+    if not broker.has_subscribers(channel):
+        return
+
+    if model is Message:
+        messages = list(Message.objects.filter(message_id=message_id))
+        changes = to_message_change_json_objects(messages)
+    else:
+        messages = list(
+            GroupMessage.objects.select_related("sender_id").filter(
+                message_id=message_id
+            )
+        )
+        changes = to_group_change_json_objects(messages)
+
+    for change in changes:
+        broker.publish(channel, ("change", {"channel": channel, **change}))
+
+
+# Published once committed, so that subscribers never see rolled back changes
+def publish_change_on_commit(channel, model, message_id):
+    transaction.on_commit(lambda: publish_change(channel, model, message_id))
+
+
+@receiver(post_save, sender=Message)
+def publish_message(sender, instance, **kwargs):
+    channel = get_channel("application", instance.application_id_id)
+    publish_change_on_commit(channel, Message, instance.message_id)
+
+
+@receiver(post_save, sender=GroupMessage)
+def publish_group_message(sender, instance, **kwargs):
+    channel = get_channel("group", instance.group_id_id)
+    publish_change_on_commit(channel, GroupMessage, instance.message_id)
+
+
+# Attaching a file changes its message (the message is usually cached, see files.views)
+# Removing one is not pushed, clients see it on their next messages/sync
+@receiver(post_save, sender=File)
+def publish_file_message(sender, instance, **kwargs):
+    if instance.associated_message_id:
+        message = instance.associated_message
+        channel = get_channel("application", message.application_id_id)
+        publish_change_on_commit(channel, Message, message.message_id)
+
+    if instance.associated_group_message_id:
+        message = instance.associated_group_message
+        channel = get_channel("group", message.group_id_id)
+        publish_change_on_commit(channel, GroupMessage, message.message_id)
+
+
+class EventsInputSerializer(serializers.Serializer):
+    applicationId = serializers.ListField(required=False, child=serializers.UUIDField())
+    groupId = serializers.ListField(required=False, child=serializers.UUIDField())
+
+    # EventSource cannot send headers, so it sends a stream token instead (see get_stream_token)
+    token = serializers.CharField(required=False)
+
+    def validate(self, data):
+        detect_extra_fields(self.initial_data, self.fields)
+        if not data.get("applicationId") and not data.get("groupId"):
+            raise serializers.ValidationError(
+                "Must subscribe to at least one application or group."
+            )
+        return data
+
+
+# Same checks as the REST endpoints, through JWTAuthenticationMiddleware
+# Returns the user, or raises AuthenticationFailed
+def authenticate(request):
+    result = JWTAuthenticationMiddleware().authenticate(request)
+    if not result:
+        raise AuthenticationFailed("Authentication credentials were not provided.")
+    return result[0]
+
+
+# Query params end up in access logs, so they never carry the Clerk JWT
+# Stream tokens can only open event streams, within REALTIME_TOKEN_TTL seconds
+stream_token_signer = signing.TimestampSigner(salt="bihance.realtime.events")
+
+
+def get_stream_token(user):
+    return stream_token_signer.sign(str(user.id))
+
+
+# Returns the user, or raises AuthenticationFailed
+def authenticate_stream_token(token):
+    try:
+        user_id = stream_token_signer.unsign(token, max_age=settings.REALTIME_TOKEN_TTL)
+    except signing.SignatureExpired:
+        raise AuthenticationFailed("Stream token has expired.")
+    except signing.BadSignature:
+        raise AuthenticationFailed("Invalid stream token.")
+
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        raise AuthenticationFailed("Invalid stream token.")
+    return user
+
+
+# Returns the channels to subscribe to, or None if the user is not part of them all
+# Employees and employers of an application, members of a group
+# Checked through the authorization cache, so repeated polls usually skip the db
+def get_channels(user, application_ids, group_ids):
+    participants = get_application_participants(application_ids)
+    allowed_application_ids = {
+        application_id
+        for application_id, participant_ids in participants.items()
+        if user.id in participant_ids
+    }
+    allowed_group_ids = set(get_group_member_ids(user, group_ids))
+    if allowed_application_ids != set(application_ids):
+        return None
+    if allowed_group_ids != set(group_ids):
+        return None
+
+    return [
+        *(get_channel("application", i) for i in application_ids),
+        *(get_channel("group", i) for i in group_ids),
+    ]
+
+
+def format_event(name, data):
+    return b"event: " + name.encode() + b"\ndata: " + dumps(data) + b"\n\n"
+
+
+async def stream_events(user, application_ids, group_ids, channels):
+    broker = get_broker()
+    subscription = broker.subscribe(channels)
+    try:
+        # Sent at once, so that clients know the subscription is live
+        # Changes made before this point are fetched with messages/sync
+        yield b": connected\n\n"
+        checked_at = time.monotonic()
+        while True:
+            event = await subscription.get(timeout=settings.REALTIME_HEARTBEAT)
+
+            # Access is re-checked every heartbeat, eg: for members removed from a group
+            if event is None or (
+                time.monotonic() - checked_at >= settings.REALTIME_HEARTBEAT
+            ):
+                get_allowed_channels = sync_to_async(get_channels)
+                if await get_allowed_channels(user, application_ids, group_ids) is None:
+                    return
+                checked_at = time.monotonic()
+
+            if event is None:
+                # Keeps proxies from closing idle streams
+                yield b": keepalive\n\n"
+            else:
+                yield format_event(*event)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# Long polling: returns get_data() once it has changes, or timeout seconds have passed
+# The request is held by the event loop, and woken by the broker
+async def wait_for_changes(channels, get_data, timeout):
+    broker = get_broker()
+    # Subscribed before looking, so that a change committed in between is not missed
+    subscription = broker.subscribe(channels)
+    try:
+        data = await sync_to_async(get_data)()
+        if data["changes"] or not timeout:
+            return data
+
+        await subscription.get(timeout=timeout)
+        return await sync_to_async(get_data)()
+    finally:
+        broker.unsubscribe(subscription)
+
+
+# POST -> api/events/token/
+# Authenticated by header only, so it is exempt from CSRF checks (like the REST endpoints)
+@csrf_exempt
+@require_POST
+def events_token(request):
+    # User verification
+    try:
+        user = authenticate(request)
+    except AuthenticationFailed as e:
+        return HttpResponse(e.detail, status=401)
+
+    return JsonResponse(
+        {"token": get_stream_token(user), "expiresIn": settings.REALTIME_TOKEN_TTL}
+    )
+
+
+# GET -> api/events/
+@require_GET
+async def events(request):
+    # Under WSGI, the stream would never end, and hold a worker (and its memory) forever
+    if not is_asgi(request):
+        return HttpResponse("Event streams need an ASGI server.", status=501)
+
+    # Input validation
+    input_serializer = EventsInputSerializer(data=request.GET)
+    if not input_serializer.is_valid():
+        return HttpResponse(input_serializer.errors, status=400)
+
+    validated_data = input_serializer.validated_data
+    application_ids = validated_data.get("applicationId", [])
+    group_ids = validated_data.get("groupId", [])
+
+    # User verification
+    try:
+        if "token" in validated_data:
+            user = await sync_to_async(authenticate_stream_token)(
+                validated_data["token"]
+            )
+        else:
+            user = await sync_to_async(authenticate)(request)
+    except AuthenticationFailed as e:
+        return HttpResponse(e.detail, status=401)
+
+    channels = await sync_to_async(get_channels)(user, application_ids, group_ids)
+    if channels is None:
+        return HttpResponse(
+            "User is not involved in every application and group.", status=403
+        )
+
+    response = StreamingHttpResponse(
+        stream_events(user, application_ids, group_ids, channels),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # Disables response buffering in nginx
+    response["X-Accel-Buffering"] = "no"
+    return response
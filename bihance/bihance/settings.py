@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Outermost, so that it measures the whole request
+    "bihance.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -146,11 +148,166 @@ REST_FRAMEWORK = {
         "rest_framework.authentication.BasicAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
+    "DEFAULT_RENDERER_CLASSES": (
+        "utils.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
 }
 
+# Encoder of JSON responses, "orjson" or "stdlib" (see utils/renderers.py)
+JSON_ENCODER = os.getenv("JSON_ENCODER", "orjson")
+
+# Rows fetched (and encoded) at a time by streamed list endpoints
+STREAM_CHUNK_SIZE = 500
+
+# Cursor pagination of list endpoints
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Max number of availabilities created by one availabilities/bulk request
+MAX_BULK_AVAILABILITIES = 500
+
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 RESEND_SMTP_PORT = 587
 RESEND_SMTP_USERNAME = "resend"
 RESEND_SMTP_HOST = "smtp.resend.com"
 
+# Email outbox (see `python manage.py send-queued-emails`)
+# Failed emails are retried after 1, 2, 4, ... times the base delay, then dead-lettered
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_DELAY = 60
+# Seconds a worker has to send the emails it claimed, before other workers retry them
+EMAIL_SEND_LEASE = 60 * 5
+
+# Outbound calls to Clerk (see bihance/http_client.py)
+# Timeout is (connect, read) in seconds
+CLERK_HTTP_TIMEOUT = (3.05, 5)
+CLERK_HTTP_RETRIES = 2
+CLERK_HTTP_BACKOFF_FACTOR = 0.2
+CLERK_HTTP_POOL_SIZE = 10
+CLERK_CIRCUIT_FAILURE_THRESHOLD = 5
+CLERK_CIRCUIT_RESET_TIMEOUT = 30
+
+# Seconds before Clerk's signing keys (JWKS) are re-fetched
+CLERK_JWKS_TTL = 60 * 60
+
+# Max number of verified tokens kept in memory (per process)
+CLERK_TOKEN_CACHE_SIZE = 10_000
+
+# Clerk profile sync
+# Refresh policy is one of "login", "ttl" or "webhook" (see bihance/profiles.py)
+CLERK_PROFILE_REFRESH_POLICY = os.getenv("CLERK_PROFILE_REFRESH_POLICY", "ttl")
+CLERK_PROFILE_CACHE_TTL = 60 * 15
+
+# Cache of authorization checks, profile syncs and Clerk signing keys
+# Redis if REDIS_URL is set, shared by every worker
+# Otherwise in memory, per process: cache reads never become queries
+# But changes made through one worker only reach the others once their entries expire
+# So deployments with several workers (or processes) should set REDIS_URL
+REDIS_URL = os.getenv("REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Seconds that application participants and group memberships stay cached
+# (see bihance/authorization.py), changes are also invalidated as they commit
+AUTHORIZATION_CACHE_TTL = 60 * 5
+
+# Request instrumentation (see bihance/metrics.py)
+# Metrics are scraped from api/metrics/, with the token as a bearer token
+# api/metrics/ is not found (404) unless a token is set
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0").lower() in ["true", "t", "1"]
+
+# Real-time push of messages (see bihance/realtime.py)
+# The in-process broker only reaches clients connected to the same process
+# "bihance.realtime.PostgresBroker" reaches every process, through LISTEN/NOTIFY
+REALTIME_BROKER = os.getenv("REALTIME_BROKER", "bihance.realtime.InProcessBroker")
+# Seconds between keepalive comments on idle streams
+REALTIME_HEARTBEAT = 15
+# Seconds a stream token (POST api/events/token/) can open an event stream for
+REALTIME_TOKEN_TTL = 60
+# Events buffered per client, a client that falls behind is asked to resync
+REALTIME_QUEUE_SIZE = 100
+# Max seconds a messages/poll (or group-messages/poll) request is held for
+LONG_POLL_TIMEOUT = 30
+
+# Trending suggestions (see suggestions/utils.py)
+# Votes and comments lose half their weight every TRENDING_HALF_LIFE seconds
+# And are ignored once older than TRENDING_WINDOW seconds
+TRENDING_HALF_LIFE = 60 * 60 * 24
+TRENDING_WINDOW = 60 * 60 * 24 * 14
+TRENDING_VOTE_WEIGHT = 1.0
+TRENDING_COMMENT_WEIGHT = 0.5
+
+# Max number of SQL queries per request, by method and url name
+# Exceeding a budget logs a warning, and fails the test suite
+ENFORCE_QUERY_BUDGETS = False
+QUERY_BUDGETS = {
+    "DELETE applications-detail": 7,
+    "PATCH applications-detail": 8,
+    "GET applications-list": 2,
+    "POST applications-list": 8,
+    "POST availabilities-bulk": 4,
+    "DELETE availabilities-detail": 4,
+    "GET availabilities-list": 1,
+    "POST availabilities-list": 4,
+    "GET companies-detail": 4,
+    "POST companies-follow": 5,
+    "GET companies-followers": 2,
+    "GET companies-is-following": 2,
+    "GET companies-list": 4,
+    "PATCH employer-detail": 3,
+    "POST employer-list": 2,
+    "DELETE files-detail": 2,
+    "GET files-list": 2,
+    "POST files-list": 3,
+    "DELETE group-messages-detail": 6,
+    "PATCH group-messages-detail": 5,
+    "GET group-messages-list": 5,
+    "POST group-messages-list": 3,
+    "GET group-messages-sync": 4,
+    "GET groups-available-members": 4,
+    "PATCH groups-detail": 9,
+    "POST groups-list": 7,
+    # Cascades, one query per kind of related row (eg: applications, groups, messages)
+    "DELETE jobs-detail": 20,
+    "GET jobs-detail": 4,
+    "PATCH jobs-detail": 3,
+    "GET jobs-employer-jobs": 4,
+    "GET jobs-filtered": 4,
+    "GET jobs-list": 4,
+    "POST jobs-list": 5,
+    "GET jobs-matched-applicants": 4,
+    "DELETE messages-detail": 7,
+    "PATCH messages-detail": 5,
+    "GET messages-list": 3,
+    "POST messages-list": 4,
+    "GET messages-sync": 3,
+    "PATCH reviews-detail": 3,
+    "POST suggestions-comment": 5,
+    "GET suggestions-detail": 3,
+    "GET suggestions-leaderboards": 1,
+    "GET suggestions-list": 2,
+    "POST suggestions-list": 1,
+    "POST suggestions-mark-implemented": 5,
+    "POST suggestions-vote": 7,
+    "GET users-detail": 3,
+    "PATCH users-detail": 5,
+    "GET users-search": 4,
+    "GET users-skills": 1,
+}
+
+TEST_RUNNER = "bihance.test_runner.QueryBudgetTestRunner"
+
 FIXTURE_DIRS = [os.path.join(BASE_DIR, ".initial-data")]
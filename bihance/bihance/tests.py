@@ -0,0 +1,829 @@
+# Integration testing (authentication, authorization, profile sync, webhooks, metrics, renderers, realtime)
+# Clerk itself is never called, its responses are patched in
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+import jwt
+import requests
+from asgiref.sync import sync_to_async
+from cryptography.hazmat.primitives.asymmetric import rsa
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from groups.models import Group, GroupMember
+from jwt.algorithms import RSAAlgorithm
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIClient
+from utils import renderers
+from utils.renderers import ENCODERS
+from message.models import Message
+from utils.tests.objects import get_application, get_employee, get_employer
+from utils.utils import terminate_current_connections
+
+from .authentication import JWTAuthenticationMiddleware, verified_tokens
+from .authorization import (
+    get_group_member_cache_key,
+    get_group_member_ids,
+    get_member_id,
+    get_participants,
+)
+from .clerk import ClerkSDK, jwks_key_ring
+from .http_client import CircuitBreaker, CircuitOpenError, HTTPClient
+from .metrics import QueryBudgetExceeded, registry
+from .profiles import sync_user_profile
+from .realtime import InProcessBroker, PostgresBroker, get_stream_token
+
+terminate_current_connections()
+
+CLERK_USER_ID = "user_2abcdefghijklmnop"
+CLERK_INFO = {
+    "email": "clerk@gmail.com",
+    "first_name": "Clerk",
+    "last_name": "Kent",
+}
+WEBHOOK_SECRET = "whsec_" + base64.b64encode(b"super-secret").decode()
+
+# Stand-ins for Clerk's signing keys
+SIGNING_KEYS = {
+    kid: rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    for kid in ["key_1", "key_2"]
+}
+
+
+def get_jwks(*kids):
+    keys = []
+    for kid in kids:
+        jwk = RSAAlgorithm.to_jwk(SIGNING_KEYS[kid].public_key(), as_dict=True)
+        jwk["kid"] = kid
+        keys.append(jwk)
+    return {"keys": keys}
+
+
+def get_token(kid, sub=CLERK_USER_ID, expires_in=60):
+    payload = {"sub": sub, "sid": "sess_1", "exp": int(time.time()) + expires_in}
+    return jwt.encode(
+        payload, SIGNING_KEYS[kid], algorithm="RS256", headers={"kid": kid}
+    )
+
+
+class ProfileSyncTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Performed once before all tests
+        # Create test objects
+        cls.employee = get_employee()
+
+    def setUp(self):
+        # Called before each test
+        cache.clear()
+
+    def fetch_patch(self):
+        return patch.object(
+            ClerkSDK, "fetch_user_info", return_value=(CLERK_INFO, True)
+        )
+
+    @override_settings(CLERK_PROFILE_REFRESH_POLICY="ttl")
+    def test_ttl_policy(self):
+        with self.fetch_patch() as fetch_user_info:
+            sync_user_profile(self.employee, CLERK_USER_ID)
+            sync_user_profile(self.employee, CLERK_USER_ID)
+
+            # Second sync is served from the cache
+            self.assertEqual(fetch_user_info.call_count, 1)
+
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.email, CLERK_INFO["email"])
+        self.assertEqual(self.employee.last_name, CLERK_INFO["last_name"])
+
+    @override_settings(CLERK_PROFILE_REFRESH_POLICY="ttl")
+    def test_unchanged_profile_skips_update(self):
+        with self.fetch_patch():
+            sync_user_profile(self.employee, CLERK_USER_ID)
+
+        # Cached profile matches the user, so no UPDATE is issued
+        with self.assertNumQueries(0):
+            sync_user_profile(self.employee, CLERK_USER_ID)
+
+    @override_settings(CLERK_PROFILE_REFRESH_POLICY="login")
+    def test_login_policy(self):
+        with self.fetch_patch() as fetch_user_info:
+            sync_user_profile(self.employee, CLERK_USER_ID, session_id="sess_1")
+            sync_user_profile(self.employee, CLERK_USER_ID, session_id="sess_1")
+            self.assertEqual(fetch_user_info.call_count, 1)
+
+            # New session, means the user logged in again
+            sync_user_profile(self.employee, CLERK_USER_ID, session_id="sess_2")
+            self.assertEqual(fetch_user_info.call_count, 2)
+
+    @override_settings(CLERK_PROFILE_REFRESH_POLICY="webhook")
+    def test_webhook_policy(self):
+        # Employee already has a profile, so Clerk is never called
+        with self.fetch_patch() as fetch_user_info:
+            sync_user_profile(self.employee, CLERK_USER_ID)
+            self.assertEqual(fetch_user_info.call_count, 0)
+
+    def post_webhook(self, event, secret=WEBHOOK_SECRET):
+        body = json.dumps(event).encode()
+        svix_id = "msg_1"
+        svix_timestamp = str(int(time.time()))
+        secret_bytes = base64.b64decode(secret.removeprefix("whsec_"))
+        signature = base64.b64encode(
+            hmac.new(
+                secret_bytes,
+                f"{svix_id}.{svix_timestamp}.".encode() + body,
+                hashlib.sha256,
+            ).digest()
+        ).decode()
+
+        return self.client.post(
+            "/api/webhooks/clerk/",
+            body,
+            content_type="application/json",
+            headers={
+                "svix-id": svix_id,
+                "svix-timestamp": svix_timestamp,
+                "svix-signature": f"v1,{signature}",
+            },
+        )
+
+    @override_settings(CLERK_PROFILE_REFRESH_POLICY="webhook")
+    @patch.dict(os.environ, {"CLERK_WEBHOOK_SECRET": WEBHOOK_SECRET})
+    def test_webhook(self):
+        event = {
+            "type": "user.updated",
+            "data": {
+                "id": CLERK_USER_ID,
+                "email_addresses": [{"email_address": "updated@gmail.com"}],
+                "first_name": "Updated",
+                "last_name": "User",
+            },
+        }
+
+        # Wrongly signed webhooks are rejected
+        response = self.post_webhook(
+            event, secret="whsec_" + base64.b64encode(b"wrong").decode()
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.post_webhook(event)
+        self.assertEqual(response.status_code, 200)
+
+        # Pushed profile is picked up without calling Clerk
+        with self.fetch_patch() as fetch_user_info:
+            sync_user_profile(self.employee, CLERK_USER_ID)
+            self.assertEqual(fetch_user_info.call_count, 0)
+
+        self.employee.refresh_from_db()
+        self.assertEqual(self.employee.email, "updated@gmail.com")
+
+
+class JWTKeyRingTest(TestCase):
+    def setUp(self):
+        # Called before each test
+        cache.clear()
+        jwks_key_ring.clear()
+        self.authentication = JWTAuthenticationMiddleware()
+
+    def test_keys_parsed_once(self):
+        with (
+            patch.object(
+                ClerkSDK, "get_jwks", return_value=get_jwks("key_1")
+            ) as get_jwks_mock,
+            patch.object(
+                RSAAlgorithm, "from_jwk", wraps=RSAAlgorithm.from_jwk
+            ) as from_jwk,
+        ):
+            for _ in range(3):
+                payload = self.authentication.decode_jwt(get_token("key_1"))
+                self.assertEqual(payload["sub"], CLERK_USER_ID)
+
+            self.assertEqual(get_jwks_mock.call_count, 1)
+            self.assertEqual(from_jwk.call_count, 1)
+
+    def test_rotated_key(self):
+        with patch.object(
+            ClerkSDK,
+            "get_jwks",
+            side_effect=[get_jwks("key_1"), get_jwks("key_1", "key_2")],
+        ) as get_jwks_mock:
+            self.authentication.decode_jwt(get_token("key_1"))
+
+            # Unknown kid triggers a (forced) refresh
+            payload = self.authentication.decode_jwt(get_token("key_2"))
+            self.assertEqual(payload["sub"], CLERK_USER_ID)
+            self.assertEqual(get_jwks_mock.call_count, 2)
+            self.assertEqual(get_jwks_mock.call_args.kwargs, {"refresh": True})
+
+    def test_unknown_key(self):
+        with patch.object(
+            ClerkSDK, "get_jwks", return_value=get_jwks("key_1")
+        ) as get_jwks_mock:
+            for _ in range(3):
+                with self.assertRaises(AuthenticationFailed):
+                    self.authentication.decode_jwt(get_token("key_2"))
+
+            # Initial load, then a single forced refresh (rate limited afterwards)
+            self.assertEqual(get_jwks_mock.call_count, 2)
+
+    def test_single_flight(self):
+        def slow_get_jwks(*args, **kwargs):
+            time.sleep(0.1)
+            return get_jwks("key_1")
+
+        token = get_token("key_1")
+        with patch.object(
+            ClerkSDK, "get_jwks", side_effect=slow_get_jwks
+        ) as get_jwks_mock:
+            threads = [
+                threading.Thread(target=self.authentication.decode_jwt, args=[token])
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(get_jwks_mock.call_count, 1)
+
+
+@override_settings(CLERK_PROFILE_REFRESH_POLICY="ttl")
+class VerifiedTokenCacheTest(TestCase):
+    def setUp(self):
+        # Called before each test
+        cache.clear()
+        jwks_key_ring.clear()
+        verified_tokens.clear()
+        self.authentication = JWTAuthenticationMiddleware()
+
+        patchers = [
+            patch.object(ClerkSDK, "get_jwks", return_value=get_jwks("key_1")),
+            patch.object(ClerkSDK, "fetch_user_info", return_value=(CLERK_INFO, True)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def authenticate(self, token):
+        request = RequestFactory().get("/", HTTP_AUTHORIZATION=f"Bearer {token}")
+        user, _ = self.authentication.authenticate(request)
+        return user
+
+    def test_cache_hit(self):
+        token = get_token("key_1")
+        user = self.authenticate(token)
+
+        # Neither the signature check nor any query runs on a hit
+        with (
+            patch.object(JWTAuthenticationMiddleware, "decode_jwt") as decode_jwt,
+            self.assertNumQueries(0),
+        ):
+            cached_user = self.authenticate(token)
+            self.assertEqual(decode_jwt.call_count, 0)
+
+        self.assertEqual(cached_user.id, user.id)
+        self.assertEqual(cached_user.email, CLERK_INFO["email"])
+        self.assertEqual(verified_tokens.stats()["hits"], 1)
+        self.assertEqual(verified_tokens.stats()["misses"], 1)
+
+    def test_expired_token_evicted(self):
+        token = get_token("key_1", expires_in=2)
+        self.authenticate(token)
+        time.sleep(2.1)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+        self.assertEqual(verified_tokens.stats()["size"], 0)
+
+    def test_user_change_invalidates(self):
+        token = get_token("key_1")
+        user = self.authenticate(token)
+
+        user.employee = True
+        user.save()
+        self.assertEqual(verified_tokens.stats()["size"], 0)
+        self.assertEqual(self.authenticate(token).employee, True)
+
+    @override_settings(CLERK_TOKEN_CACHE_SIZE=2)
+    def test_bounded(self):
+        for sub in ["user_1", "user_2", "user_3"]:
+            with patch.object(
+                ClerkSDK,
+                "fetch_user_info",
+                return_value=({**CLERK_INFO, "email": f"{sub}@gmail.com"}, True),
+            ):
+                self.authenticate(get_token("key_1", sub=sub))
+
+        self.assertEqual(verified_tokens.stats()["size"], 2)
+
+
+# Local stand-in for an upstream API
+# Replies with the queued statuses in order, then 200s
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        server.client_ports.add(self.client_address[1])
+        if server.delay:
+            time.sleep(server.delay)
+
+        status = server.statuses.pop(0) if server.statuses else 200
+        body = b'{"ok": true}'
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client gave up waiting (timeout tests)
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HTTPClientTest(SimpleTestCase):
+    def setUp(self):
+        # Called before each test
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.paths = []
+        self.server.client_ports = set()
+        self.server.statuses = []
+        self.server.delay = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def get_client(self, **kwargs):
+        client = HTTPClient(**{"backoff_factor": 0, **kwargs})
+        self.addCleanup(client.close)
+        return client
+
+    def test_keep_alive(self):
+        client = self.get_client()
+        for _ in range(5):
+            self.assertEqual(client.get(f"{self.url}/jwks").status_code, 200)
+
+        # All requests went over a single pooled connection
+        self.assertEqual(len(self.server.paths), 5)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_retry(self):
+        client = self.get_client(retries=2)
+        self.server.statuses = [503, 502]
+
+        response = client.get(f"{self.url}/users/user_1")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.server.paths), 3)
+
+    def test_timeout(self):
+        client = self.get_client(timeout=(1, 0.1), retries=0, failure_threshold=1)
+        self.server.delay = 0.3
+
+        # Surfaces as a RequestException, the breaker counts it as a failure
+        with self.assertRaises(requests.RequestException):
+            client.get(f"{self.url}/users/user_1")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+    def test_circuit_breaker(self):
+        client = self.get_client(retries=0, failure_threshold=2, reset_timeout=0.2)
+        self.server.statuses = [500, 500]
+
+        client.get(f"{self.url}/users/user_1")
+        client.get(f"{self.url}/users/user_1")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        # Open circuit fails fast, without calling the upstream
+        with self.assertRaises(CircuitOpenError):
+            client.get(f"{self.url}/users/user_1")
+        self.assertEqual(len(self.server.paths), 2)
+
+        # After the reset timeout, a successful trial closes the circuit
+        time.sleep(0.25)
+        self.assertEqual(client.get(f"{self.url}/users/user_1").status_code, 200)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_circuit_breaker_unexpected_error(self):
+        client = self.get_client(retries=0, failure_threshold=1, reset_timeout=0.2)
+        self.server.statuses = [500]
+        client.get(f"{self.url}/users/user_1")
+
+        # A trial failing with any error opens the circuit again
+        time.sleep(0.25)
+        with (
+            patch.object(client.session, "request", side_effect=ValueError),
+            self.assertRaises(ValueError),
+        ):
+            client.get(f"{self.url}/users/user_1")
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        # Instead of staying half-open (and failing fast) forever
+        time.sleep(0.25)
+        self.assertEqual(client.get(f"{self.url}/users/user_1").status_code, 200)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_clerk_sdk_degrades(self):
+        client = self.get_client(retries=0, failure_threshold=1)
+        self.server.statuses = [500]
+
+        with (
+            patch("bihance.clerk.get_clerk_client", return_value=client),
+            patch("bihance.clerk.CLERK_API_URL", self.url),
+        ):
+            clerk = ClerkSDK()
+
+            # Upstream failure, then an open circuit, both read as "not found"
+            self.assertEqual(clerk.fetch_user_info(CLERK_USER_ID)[1], False)
+            self.assertEqual(clerk.fetch_user_info(CLERK_USER_ID)[1], False)
+            self.assertEqual(len(self.server.paths), 1)
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.employee = get_employee()
+
+    def setUp(self):
+        registry.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.employee)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics(self):
+        response = self.client.get("/api/jobs/")
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Server-Timing", response)
+
+        response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+
+        body = response.content.decode()
+        self.assertIn('bihance_requests_total{method="GET",route="jobs-list"} 1', body)
+        self.assertIn('bihance_db_queries_total{method="GET",route="jobs-list"}', body)
+        self.assertIn(
+            'bihance_request_duration_seconds_count{method="GET",route="jobs-list"} 1',
+            body,
+        )
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_token(self):
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 401)
+
+        response = self.client.get("/api/metrics/", HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+    # Not exposed without a token
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_without_token(self):
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_server_timing(self):
+        response = self.client.get("/api/jobs/")
+        self.assertIn("db;dur=", response["Server-Timing"])
+        self.assertIn("serialize;dur=", response["Server-Timing"])
+        self.assertIn("total;dur=", response["Server-Timing"])
+
+    # Also counted under ASGI, where views reach the db from another thread
+    async def test_metrics_async(self):
+        with patch.object(
+            JWTAuthenticationMiddleware,
+            "authenticate_credentials",
+            return_value=(self.employee, None),
+        ):
+            response = await self.async_client.get(
+                "/api/jobs/", headers={"Authorization": "Bearer t"}
+            )
+        self.assertEqual(response.status_code, 200)
+
+        route_stats = registry.routes[("GET", "jobs-list")]
+        self.assertEqual(route_stats.requests, 1)
+        self.assertGreater(route_stats.queries, 0)
+
+    @override_settings(QUERY_BUDGETS={"GET users-skills": 0})
+    def test_query_budget(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get("/api/users/skills/")
+
+        # Only enforced in tests, otherwise just logged
+        with override_settings(ENFORCE_QUERY_BUDGETS=False):
+            with self.assertLogs("bihance.metrics", level="WARNING"):
+                response = self.client.get("/api/users/skills/")
+        self.assertEqual(response.status_code, 200)
+
+
+class JSONRendererTest(SimpleTestCase):
+    payload = {
+        "id": uuid.UUID("7b2fe1c3-bed0-4869-b547-bffc17e36471"),
+        "date": datetime(2025, 1, 2, 3, 4, 5, 600000, tzinfo=dt_timezone.utc),
+        "salary": Decimal("12.50"),
+        "location": {"lat": 1.35, "tags": ["a", None, True]},
+        "items": [1, 2.5, "three"],
+    }
+
+    def test_encoders(self):
+        # Every encoder produces the same JSON
+        expected = json.loads(json.dumps(self.payload, cls=DjangoJSONEncoder))
+        for name in ENCODERS:
+            with override_settings(JSON_ENCODER=name):
+                encoded = json.loads(renderers.dumps(self.payload))
+            self.assertEqual(encoded["id"], expected["id"], name)
+            self.assertEqual(encoded["salary"], expected["salary"], name)
+            self.assertEqual(encoded["location"], expected["location"], name)
+            self.assertEqual(encoded["items"], expected["items"], name)
+            self.assertEqual(
+                datetime.fromisoformat(encoded["date"]), self.payload["date"], name
+            )
+
+    def test_json_response(self):
+        response = renderers.JsonResponse([self.payload], safe=False)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(response.content)[0]["salary"], "12.50")
+
+        with self.assertRaises(TypeError):
+            renderers.JsonResponse([self.payload])
+
+
+class InProcessBrokerTest(SimpleTestCase):
+    async def test_publish(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(["application:1"])
+        self.assertTrue(broker.has_subscribers("application:1"))
+
+        # Published from another thread, like a view would
+        publish = sync_to_async(broker.publish, thread_sensitive=False)
+        await publish("application:1", ("change", {"seq": 1}))
+        await publish("application:2", ("change", {"seq": 2}))
+
+        self.assertEqual(await subscription.get(timeout=1), ("change", {"seq": 1}))
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+        broker.unsubscribe(subscription)
+        self.assertFalse(broker.has_subscribers("application:1"))
+
+    @override_settings(REALTIME_QUEUE_SIZE=2)
+    async def test_overflow(self):
+        broker = InProcessBroker()
+        subscription = broker.subscribe(["group:1"])
+        for seq in range(3):
+            broker.publish("group:1", ("change", {"seq": seq}))
+        await asyncio.sleep(0)
+
+        # Dropped events are replaced by a single resync
+        self.assertEqual(await subscription.get(timeout=1), ("resync", {}))
+        self.assertIsNone(await subscription.get(timeout=0.01))
+
+
+# Not a TestCase, since notifications are only sent once committed
+class PostgresBrokerTest(SimpleTestCase):
+    databases = {"default"}
+
+    def setUp(self):
+        # Called before each test
+        self.broker = PostgresBroker()
+        self.assertTrue(self.broker.listening.wait(5))
+
+    def tearDown(self):
+        # Called after each test
+        self.broker.close()
+
+    async def test_publish(self):
+        subscription = self.broker.subscribe(["group:1"])
+        publish = sync_to_async(self.broker.publish)
+        await publish("group:1", ("change", {"seq": 1}))
+
+        # Too large for a NOTIFY payload
+        await publish("group:1", ("change", {"content": "x" * 10_000}))
+
+        self.assertEqual(await subscription.get(timeout=5), ("change", {"seq": 1}))
+        self.assertEqual(await subscription.get(timeout=5), ("resync", {}))
+        self.broker.unsubscribe(subscription)
+
+
+class EventsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Performed once before all tests
+        # Create test objects
+        cls.employee = get_employee()
+        cls.employer = get_employer()
+        cls.application = get_application()
+
+    def setUp(self):
+        # Participants cached by another test may have been rolled back since
+        cache.clear()
+
+    def authenticate_patch(self):
+        return patch.object(
+            JWTAuthenticationMiddleware,
+            "authenticate_credentials",
+            return_value=(self.employee, None),
+        )
+
+    def create_message(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(
+                content="Pushed",
+                application_id=self.application,
+                sender_id=self.employer,
+            )
+
+    async def test_stream(self):
+        # EventSource clients send a stream token as a query param
+        with self.authenticate_patch():
+            response = await self.async_client.post(
+                "/api/events/token/", headers={"Authorization": "Bearer t"}
+            )
+        self.assertEqual(response.status_code, 200)
+        token = json.loads(response.content)["token"]
+
+        response = await self.async_client.get(
+            "/api/events/",
+            {"applicationId": self.application.application_id, "token": token},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b": connected\n\n")
+
+        # Sent by the other participant, pushed once committed
+        message = await sync_to_async(self.create_message)()
+        event = await asyncio.wait_for(anext(stream), 5)
+        name, data = event.decode().splitlines()[:2]
+        self.assertEqual(name, "event: change")
+
+        change = json.loads(data.removeprefix("data: "))
+        self.assertEqual(change["channel"], f"application:{message.application_id_id}")
+        self.assertEqual(change["change"], "insert")
+        self.assertEqual(change["message"]["message_id"], str(message.message_id))
+        self.assertGreater(change["seq"], 0)
+
+        await stream.aclose()
+
+    @override_settings(REALTIME_HEARTBEAT=0.01)
+    async def test_keepalive(self):
+        with self.authenticate_patch():
+            response = await self.async_client.get(
+                "/api/events/",
+                {"applicationId": self.application.application_id},
+                headers={"Authorization": "Bearer t"},
+            )
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b": connected\n\n")
+        self.assertEqual(await anext(stream), b": keepalive\n\n")
+        await stream.aclose()
+
+    async def test_stream_token(self):
+        params = {"applicationId": self.application.application_id}
+
+        # Never the Clerk JWT
+        with self.authenticate_patch():
+            response = await self.async_client.get(
+                "/api/events/", {**params, "token": "t"}
+            )
+        self.assertEqual(response.status_code, 401)
+
+        token = get_stream_token(self.employee)
+        with override_settings(REALTIME_TOKEN_TTL=-1):
+            response = await self.async_client.get(
+                "/api/events/", {**params, "token": token}
+            )
+        self.assertEqual(response.status_code, 401)
+
+        response = await self.async_client.post("/api/events/token/")
+        self.assertEqual(response.status_code, 401)
+
+    # Ends once the user is no longer a participant
+    @override_settings(REALTIME_HEARTBEAT=0.01)
+    async def test_access_revoked(self):
+        response = await self.async_client.get(
+            "/api/events/",
+            {
+                "applicationId": self.application.application_id,
+                "token": get_stream_token(self.employee),
+            },
+        )
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b": connected\n\n")
+
+        self.application.employee_id = self.employer
+        await self.application.asave()
+        with self.assertRaises(StopAsyncIteration):
+            for _ in range(10):
+                await asyncio.wait_for(anext(stream), 5)
+
+    # The stream would never end under WSGI (the sync test client)
+    def test_not_asgi(self):
+        response = self.client.get(
+            "/api/events/",
+            {
+                "applicationId": self.application.application_id,
+                "token": get_stream_token(self.employee),
+            },
+        )
+        self.assertEqual(response.status_code, 501)
+
+    async def test_not_authorized(self):
+        response = await self.async_client.get(
+            "/api/events/", {"applicationId": self.application.application_id}
+        )
+        self.assertEqual(response.status_code, 401)
+
+        # Not a participant of every conversation
+        with self.authenticate_patch():
+            response = await self.async_client.get(
+                "/api/events/?applicationId="
+                f"{self.application.application_id}&applicationId={uuid.uuid4()}",
+                headers={"Authorization": "Bearer t"},
+            )
+        self.assertEqual(response.status_code, 403)
+
+        with self.authenticate_patch():
+            response = await self.async_client.get(
+                "/api/events/", headers={"Authorization": "Bearer t"}
+            )
+        self.assertEqual(response.status_code, 400)
+
+
+class AuthorizationCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Performed once before all tests
+        # Create test objects
+        cls.employee = get_employee()
+        cls.employer = get_employer()
+        cls.application = get_application()
+        cls.group = Group.objects.create(
+            bio="Cached", creator_id=cls.employee, job_id=cls.application.job_id
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_application_participants(self):
+        application_id = self.application.application_id
+        with self.assertNumQueries(1):
+            participants = get_participants(application_id)
+        self.assertEqual(participants, (self.employee.id, self.employer.id))
+
+        # Served from the cache, until the application changes
+        with self.assertNumQueries(0):
+            self.assertEqual(get_participants(str(application_id)), participants)
+
+        self.application.save()
+        with self.assertNumQueries(1):
+            get_participants(application_id)
+
+        # Missing applications are never cached
+        missing_id = uuid.uuid4()
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertIsNone(get_participants(missing_id))
+
+    def test_group_member(self):
+        group_id = self.group.group_id
+        with self.assertNumQueries(1):
+            self.assertIsNone(get_member_id(self.employee, group_id))
+
+        # Not cached while the user was not a member
+        member = GroupMember.objects.create(
+            user_id=self.employee, group_id=self.group, role="Admin"
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(get_member_id(self.employee, group_id), member.member_id)
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                get_group_member_ids(self.employee, [group_id]),
+                {group_id: member.member_id},
+            )
+
+        # Removing the member (by queryset) drops the entry
+        # Also once committed, in case a concurrent request cached it in between
+        with self.captureOnCommitCallbacks(execute=True):
+            GroupMember.objects.filter(group_id=self.group).delete()
+            cache.set(
+                get_group_member_cache_key(self.employee.id, group_id),
+                member.member_id,
+            )
+        self.assertIsNone(get_member_id(self.employee, group_id))
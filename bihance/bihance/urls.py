@@ -5,14 +5,18 @@ from django.contrib import admin
 from django.urls import include, path
 from employer.views import EmployerViewSet
 from files.views import FilesViewSet
-from groups.views import GroupMessageViewSet, GroupViewSet
+from groups.views import GroupMessageViewSet, GroupViewSet, poll_group_messages
 from jobs.views import JobsViewSet
-from message.views import MessageViewSet
+from message.views import MessageViewSet, poll_messages
 from rest_framework import routers
 from reviews.views import ReviewsViewSet
 from suggestions.views import SuggestionsViewSet
 from users.views import UsersViewSet
 
+from .metrics import metrics
+from .realtime import events, events_token
+from .webhooks import clerk_webhook
+
 router = routers.DefaultRouter()
 router.register(r"applications", ApplicationsViewSet, "applications")
 router.register(r"availabilities", AvailabilitiesViewSet, "availabilities")
@@ -28,4 +32,15 @@ router.register(r"groups", GroupViewSet, "groups")
 router.register(r"group-messages", GroupMessageViewSet, "group-messages")
 
 
-urlpatterns = [path("admin/", admin.site.urls), path("api/", include(router.urls)), path('api/saved-jobs/', include('savedjobs.urls'))]
+urlpatterns = [
+    path("admin/", admin.site.urls),
+    # Before the router, which would match them as message ids
+    path("api/messages/poll/", poll_messages, name="messages-poll"),
+    path("api/group-messages/poll/", poll_group_messages, name="group-messages-poll"),
+    path("api/", include(router.urls)),
+    path("api/saved-jobs/", include("savedjobs.urls")),
+    path("api/webhooks/clerk/", clerk_webhook, name="clerk-webhook"),
+    path("api/metrics/", metrics, name="metrics"),
+    path("api/events/", events, name="events"),
+    path("api/events/token/", events_token, name="events-token"),
+]
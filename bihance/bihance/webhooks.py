@@ -0,0 +1,82 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+
+from applications.models import User
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+
+from .clerk import clerk_id_to_uuid, parse_user_info
+from .profiles import apply_profile, invalidate_profile, store_profile
+
+# Reject webhooks older (or newer) than this many seconds, to prevent replays
+WEBHOOK_TOLERANCE = 60 * 5
+
+
+# Clerk delivers webhooks through Svix
+# Reference: https://docs.svix.com/receiving/verifying-payloads/how-manual
+def verify_svix_signature(headers, body: bytes):
+    secret = os.getenv("CLERK_WEBHOOK_SECRET")
+    svix_id = headers.get("svix-id")
+    svix_timestamp = headers.get("svix-timestamp")
+    svix_signature = headers.get("svix-signature")
+    if not (secret and svix_id and svix_timestamp and svix_signature):
+        return False
+
+    try:
+        timestamp = int(svix_timestamp)
+    except ValueError:
+        return False
+    if abs(time.time() - timestamp) > WEBHOOK_TOLERANCE:
+        return False
+
+    # Secret is of the form whsec_<base64>
+    secret_bytes = base64.b64decode(secret.removeprefix("whsec_"))
+    signed_content = f"{svix_id}.{svix_timestamp}.".encode() + body
+    expected = base64.b64encode(
+        hmac.new(secret_bytes, signed_content, hashlib.sha256).digest()
+    ).decode()
+
+    # Signature header is a space separated list of <version>,<signature>
+    for versioned_signature in svix_signature.split(" "):
+        _, _, signature = versioned_signature.partition(",")
+        if hmac.compare_digest(signature, expected):
+            return True
+
+    return False
+
+
+# POST -> api/webhooks/clerk/
+@csrf_exempt
+@require_POST
+def clerk_webhook(request):
+    if not verify_svix_signature(request.headers, request.body):
+        return HttpResponse("Invalid webhook signature.", status=400)
+
+    try:
+        event = json.loads(request.body)
+        event_type = event["type"]
+        data = event["data"]
+        clerk_user_id = data["id"]
+    except (ValueError, KeyError, TypeError):
+        return HttpResponse("Malformed webhook payload.", status=400)
+
+    match event_type:
+        case "user.created" | "user.updated":
+            info = parse_user_info(data)
+            user = User.objects.filter(id=clerk_id_to_uuid(clerk_user_id)).first()
+
+            # Users are created on their first authenticated request
+            # Until then, caching the profile is enough
+            if user:
+                apply_profile(user, info)
+            store_profile(clerk_user_id, info)
+
+        case "user.deleted":
+            invalidate_profile(clerk_user_id)
+
+    return HttpResponse("Webhook processed.", status=200)
@@ -1,6 +1,8 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
+import json
+
 from django.test import TestCase
 from rest_framework.test import APIClient
 from utils.tests.objects import get_employee, get_employer, get_job
@@ -42,7 +44,7 @@ class CompaniesAPITest(TestCase):
         response = self.client.get(self.base_url)
         self.assertEqual(response.status_code, 200)
 
-        companies = response.json()
+        companies = json.loads(response.getvalue())
         for company_info in companies:
             # Top level fields
             self.assertIn("company", company_info)
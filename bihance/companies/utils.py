@@ -1,9 +1,11 @@
 from applications.serializers import JobSerializer, UserSerializer
+from bihance.metrics import serialization_timer
 from files.serializers import FileSerializer
 
 from .serializers import EmployerProfileSerializer
 
 
+@serialization_timer
 def to_json_object(company):
     company_serializer = EmployerProfileSerializer(company)
     employer_serializer = UserSerializer(company.employer_id)
@@ -17,7 +19,11 @@ def to_json_object(company):
     else:
         data["jobs"] = None
 
-    associated_file = company.file_set.first()
+    # Same file as company.file_set.first(), but from the prefetch cache
+    associated_files = company.file_set.all()
+    associated_file = min(
+        associated_files, key=lambda file: file.file_key, default=None
+    )
     if associated_file:
         file_serializer = FileSerializer(associated_file)
         data["file"] = file_serializer.data
@@ -1,8 +1,11 @@
+from applications.models import Job
 from django.db.models import Prefetch
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
+from utils.renderers import JsonResponse, StreamingJsonResponse, iter_chunks
+from utils.utils import is_asgi
 
 from .models import CompanyFollow, EmployerProfile
 from .utils import to_json_object
@@ -12,19 +15,22 @@ class CompanyViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     # GET multiple -> companies/
+    # Streamed, chunk by chunk
     def list(self, request):
         all_companies = (
             EmployerProfile.objects.select_related("employer_id")
-            .prefetch_related(Prefetch("employer_id__job_set"), "file_set")
-            .all()
+            .prefetch_related(
+                Prefetch("employer_id__job_set", Job.objects.defer("search_vector")),
+                "file_set",
+            )
+            .order_by("created_at", "company_id")
         )
-        result = []
 
-        for company in all_companies:
-            company_json = to_json_object(company)
-            result.append(company_json)
-
-        return JsonResponse(result, safe=False)
+        chunks = (
+            [to_json_object(company) for company in chunk]
+            for chunk in iter_chunks(all_companies)
+        )
+        return StreamingJsonResponse(chunks, asynchronous=is_asgi(request))
 
     # GET single -> companies/:company_id
     def retrieve(self, request, pk=None):
@@ -0,0 +1,52 @@
+from django.db import migrations
+
+# Attaching (or removing) a file changes its message
+# So the message is touched, which moves it to the end of its change log
+# Once per statement, not once per row
+CREATE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION file_message_seq_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE "Message" SET "seq" = "seq"
+        WHERE "messageId" IN (SELECT "associatedMessage" FROM new_rows);
+        UPDATE "Group_Message" SET "seq" = "seq"
+        WHERE "messageId" IN (SELECT "associatedGroupMessage" FROM new_rows);
+    ELSE
+        UPDATE "Message" SET "seq" = "seq"
+        WHERE "messageId" IN (SELECT "associatedMessage" FROM old_rows);
+        UPDATE "Group_Message" SET "seq" = "seq"
+        WHERE "messageId" IN (SELECT "associatedGroupMessage" FROM old_rows);
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER file_insert_message_seq_trigger
+    AFTER INSERT ON "File"
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION file_message_seq_update();
+
+CREATE TRIGGER file_delete_message_seq_trigger
+    AFTER DELETE ON "File"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION file_message_seq_update();
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS file_delete_message_seq_trigger ON "File";
+DROP TRIGGER IF EXISTS file_insert_message_seq_trigger ON "File";
+DROP FUNCTION IF EXISTS file_message_seq_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_alter_file_associated_company_and_more'),
+        ('groups', '0003_group_message_seq'),
+        ('message', '0003_message_seq'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
@@ -1,9 +1,10 @@
 from applications.models import Job, User
 from companies.models import EmployerProfile
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse
 from groups.models import GroupMessage
 from message.models import Message
 from rest_framework import permissions, viewsets
+from utils.renderers import JsonResponse
 from utils.utils import remap_keys
 
 from .models import File
@@ -0,0 +1,63 @@
+# Generated by Django 5.2 on 2026-10-18 10:04
+
+from django.db import migrations, models
+
+# Group_Message."seq" is assigned by the database itself, on every insert and update
+# The group row is locked first, so that writers of the same conversation
+# Take turns and commit their seqs in order (a client never skips a seq)
+CREATE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION group_message_seq_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM 1 FROM "Group"
+    WHERE "groupId" = NEW."groupId"
+    FOR NO KEY UPDATE;
+
+    SELECT coalesce(max("seq"), 0) + 1 INTO NEW."seq"
+    FROM "Group_Message"
+    WHERE "groupId" = NEW."groupId";
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER group_message_seq_trigger
+    BEFORE INSERT OR UPDATE ON "Group_Message"
+    FOR EACH ROW EXECUTE FUNCTION group_message_seq_update();
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS group_message_seq_trigger ON "Group_Message";
+DROP FUNCTION IF EXISTS group_message_seq_update();
+"""
+
+# Existing messages, in the order they were sent
+BACKFILL_SQL = """
+UPDATE "Group_Message" SET "seq" = numbered."seq"
+FROM (
+    SELECT "messageId", row_number() OVER (
+        PARTITION BY "groupId" ORDER BY "createdAt", "messageId"
+    ) AS "seq"
+    FROM "Group_Message"
+) AS numbered
+WHERE "Group_Message"."messageId" = numbered."messageId";
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('groups', '0002_alter_group_creator_id_alter_group_job_id_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmessage',
+            name='seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='groupmessage',
+            index=models.Index(fields=['group_id', 'seq'], name='Group_Messa_groupId_528151_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
@@ -66,9 +66,16 @@ class GroupMessage(models.Model):
         blank=True,
         null=True,
     )
+    # Position in the group's change log, bumped on every insert and update
+    # Assigned by a database trigger (see migrations), so every write path keeps it current
+    seq = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         db_table = "Group_Message"
+        indexes = [
+            # Incremental sync, see utils.utils.get_changes
+            models.Index(fields=["group_id", "seq"]),
+        ]
 
     def __str__(self):
         return str(self.message_id)
@@ -1,5 +1,6 @@
 from datetime import timedelta
 
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 
@@ -48,23 +49,22 @@ class GroupCreateInputSerializer(serializers.Serializer):
     # List of user_id strings for the members
     userIds = serializers.ListField(allow_empty=False, child=serializers.UUIDField())
 
+    # Returns the Job, not its id
     def validate_jobId(self, value):
         try:
-            Job.objects.get(job_id=value)
-            return value
+            return Job.objects.get(job_id=value)
         except Job.DoesNotExist:
             raise serializers.ValidationError("Provided Job ID does not exist.")
 
     def validate_userIds(self, value):
         return validate_no_duplicates(value, "userIds")
 
+    # Adds the User objects of userIds, as data["users"]
     def validate(self, data):
         detect_extra_fields(self.initial_data, self.fields)
 
-        associated_job = Job.objects.get(job_id=data["jobId"])
-        user_ids = data["userIds"]
         try:
-            check_new_ids(user_ids, associated_job)
+            data["users"] = check_new_ids(data["userIds"], data["jobId"])
         except Exception as e:
             raise serializers.ValidationError(f"Error validating userIds: {e}.")
         return data
@@ -153,3 +153,29 @@ class GroupMessageListInputSerializer(serializers.Serializer):
     def validate(self, data):
         detect_extra_fields(self.initial_data, self.fields)
         return data
+
+
+class GroupMessageSyncInputSerializer(serializers.Serializer):
+    groupId = serializers.UUIDField()
+    # Seq of the last change seen, 0 for a full sync
+    cursor = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.MAX_PAGE_SIZE,
+        default=settings.MAX_PAGE_SIZE,
+    )
+
+    def validate(self, data):
+        detect_extra_fields(self.initial_data, self.fields)
+        return data
+
+
+class GroupMessagePollInputSerializer(GroupMessageSyncInputSerializer):
+    # Max seconds to wait for, when there are no changes yet
+    timeout = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=settings.LONG_POLL_TIMEOUT,
+        default=settings.LONG_POLL_TIMEOUT,
+    )
@@ -1,10 +1,15 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
+import uuid
 from datetime import timedelta
+from unittest.mock import patch
 
+from applications.models import Application, User
+from bihance.authentication import JWTAuthenticationMiddleware
 from django.test import TestCase
 from django.utils import timezone
+from files.models import AssociatedType, File
 from rest_framework.test import APIClient
 
 from utils.tests.objects import (
@@ -54,9 +59,85 @@ class GroupsAPITest(TestCase):
 
         # Interacting with GroupMessage and Files
         self.create_message()
+        self.sync_messages("insert")
         self.update_message()
         self.get_messages()
         self.delete_message()
+        self.sync_messages("delete")
+        self.poll_messages()
+
+    def test_create_group_queries(self):
+        applicants = User.objects.bulk_create(
+            User(
+                first_name="Applicant",
+                last_name=str(i),
+                email=f"applicant-{i}@gmail.com",
+                employee=True,
+            )
+            for i in range(20)
+        )
+        Application.objects.bulk_create(
+            Application(
+                job_id=self.job,
+                accept=1,
+                employee_id=applicant,
+                employer_id=self.employer,
+            )
+            for applicant in applicants
+        )
+
+        # Same number of queries, however many members
+        self.auth_employer()
+        for member_count in [5, 20]:
+            data = {
+                "bio": "My Big Group",
+                "jobId": self.job.job_id,
+                "userIds": [
+                    self.employer.id,
+                    *(applicant.id for applicant in applicants[:member_count]),
+                ],
+            }
+            with self.assertNumQueries(7):
+                response = self.client.post(self.base_url_group, data, format="json")
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(GroupMember.objects.count(), 6 + 21)
+        self.assertEqual(GroupMember.objects.filter(role="Admin").count(), 2)
+
+    def test_list_messages_queries(self):
+        group = Group.objects.create(
+            bio="My Busy Group", creator_id=self.employee, job_id=self.job
+        )
+        member = GroupMember.objects.create(
+            user_id=self.employee, group_id=group, role="Admin"
+        )
+
+        # Same number of queries, however many messages (with files)
+        # Membership is cached after the first request
+        self.auth_employee()
+        self.client.get(self.base_url_group_message, {"groupId": group.group_id})
+        for message_count in [1, 10]:
+            while GroupMessage.objects.filter(group_id=group).count() < message_count:
+                message = GroupMessage.objects.create(
+                    content="Hello", group_id=group, sender_id=member
+                )
+                File.objects.create(
+                    file_key=f"file-{message.message_id}",
+                    file_url="https://files.example.com/file",
+                    file_name="file",
+                    file_type="pdf",
+                    file_size=100,
+                    associated_type=AssociatedType.GROUP_MESSAGE,
+                    associated_group_message=message,
+                )
+
+            with self.assertNumQueries(2):
+                response = self.client.get(
+                    self.base_url_group_message, {"groupId": group.group_id}
+                )
+            self.assertEqual(len(response.json()), message_count)
+            for message_info in response.json():
+                self.assertIsNotNone(message_info["file"])
 
     def create_group(self):
         self.auth_employee()
@@ -79,6 +160,15 @@ class GroupsAPITest(TestCase):
 
     def update_group(self):
         self.auth_employee()
+
+        # Invalid updates change nothing, not even the valid parts
+        data = {"bio": "Not Saved", "removeIds": [str(uuid.uuid4())]}
+        response = self.client.patch(
+            f"{self.base_url_group}{self.group_id}/", data, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertNotEqual(Group.objects.get().bio, "Not Saved")
+
         data = {
             "bio": "My Super Sexy Group",
             "makeAdminIds": [self.employer.id],
@@ -158,6 +248,53 @@ class GroupsAPITest(TestCase):
             if message_file:
                 verify_file_shape(message_file)
 
+    # Only the latest change of the message is returned, after the previous cursor
+    def sync_messages(self, change):
+        self.auth_employer()
+        query_params = {"groupId": self.group_id, "cursor": getattr(self, "cursor", 0)}
+        response = self.client.get(f"{self.base_url_group_message}sync/", query_params)
+        self.assertEqual(response.status_code, 200)
+
+        result = response.json()
+        self.assertFalse(result["has_more"])
+        self.assertEqual(len(result["changes"]), 1)
+        self.assertGreater(result["cursor"], getattr(self, "cursor", 0))
+        self.cursor = result["cursor"]
+
+        change_info = result["changes"][0]
+        self.assertEqual(change_info["change"], change)
+        self.assertEqual(change_info["seq"], self.cursor)
+        verify_group_message_shape(change_info["message"])
+        verify_group_member_shape(change_info["sender"])
+        self.assertEqual(change_info["message"]["message_id"], self.message_id)
+
+    # Long polling, not a DRF view
+    def poll_messages(self):
+        with patch.object(
+            JWTAuthenticationMiddleware,
+            "authenticate_credentials",
+            return_value=(self.employer, None),
+        ):
+            query_params = {"groupId": self.group_id, "timeout": 0}
+            response = self.client.get(
+                f"{self.base_url_group_message}poll/",
+                query_params,
+                headers={"Authorization": "Bearer t"},
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.json()["changes"]), 1)
+
+            # Nothing new after the last sync
+            # Not held under WSGI (the test client), even with a timeout
+            query_params["cursor"] = self.cursor
+            query_params["timeout"] = 30
+            response = self.client.get(
+                f"{self.base_url_group_message}poll/",
+                query_params,
+                headers={"Authorization": "Bearer t"},
+            )
+            self.assertEqual(response.json()["changes"], [])
+
     def delete_message(self):
         self.auth_employee()
 
@@ -1,21 +1,93 @@
 from applications.models import Application, User
+from bihance.metrics import serialization_timer
+from files.models import File
+from files.serializers import FileSerializer
 from rest_framework import serializers
+from utils.serialization import FieldExtractor
+from utils.utils import get_change_type, get_changes
 
+from .models import GroupMessage
 
+
+# Validates every id in two queries, one for the users and one for their applications
+# Returns the users, in the same order as new_ids
 def check_new_ids(new_ids, associated_job):
-    for user_id in new_ids:
-        user = User.objects.get(id=user_id)
-        if user.employee:
-            try:
-                Application.objects.get(job_id=associated_job, employee_id=user)
-            except Application.DoesNotExist:
-                raise Exception("Employee is not an applicant for the job.")
-        else:
-            if associated_job.employer_id != user:
-                raise Exception("Employer is not poster for the job.")
+    users = User.objects.in_bulk(new_ids)
+    if len(users) < len(set(new_ids)):
+        raise Exception("User does not exist.")
+
+    employee_ids = [user.id for user in users.values() if user.employee]
+    if employee_ids:
+        applicant_ids = set(
+            Application.objects.filter(
+                job_id=associated_job, employee_id__in=employee_ids
+            ).values_list("employee_id", flat=True)
+        )
+        if applicant_ids != set(employee_ids):
+            raise Exception("Employee is not an applicant for the job.")
+
+    if any(
+        not user.employee and user.id != associated_job.employer_id_id
+        for user in users.values()
+    ):
+        raise Exception("Employer is not poster for the job.")
+
+    return [users[user_id] for user_id in new_ids]
 
 
 def validate_no_duplicates(value, label):
     if len(set(value)) < len(value):
         raise serializers.ValidationError(f"Each user can only appear once in {label}.")
     return value
+
+
+file_extractor = FieldExtractor(FileSerializer)
+
+
+# Parse changed GroupMessage model objects into JSON objects, for group-messages/sync
+# Senders must be select_related, one query for the files of all messages
+@serialization_timer
+def to_change_json_objects(messages):
+    # Imported here, since the serializers import this module
+    from .serializers import GroupMemberSerializer, GroupMessageSerializer
+
+    group_message_extractor = FieldExtractor(GroupMessageSerializer)
+    group_member_extractor = FieldExtractor(GroupMemberSerializer)
+
+    files = (
+        File.objects.filter(
+            associated_group_message__in=[m.message_id for m in messages]
+        )
+        .order_by("associated_group_message", "file_key")
+        .distinct("associated_group_message")
+        .values(*file_extractor.attnames, "associated_group_message_id")
+    )
+    file_by_message = {
+        row["associated_group_message_id"]: file_extractor.from_values(row)
+        for row in files
+    }
+
+    return [
+        {
+            "change": get_change_type(message),
+            "seq": message.seq,
+            "message": group_message_extractor.from_instance(message),
+            "sender": group_member_extractor.from_instance(message.sender_id),
+            "file": file_by_message.get(message.message_id),
+        }
+        for message in messages
+    ]
+
+
+# Response body of group-messages/sync and group-messages/poll
+def get_sync_data(group_id, cursor, limit):
+    messages, cursor, has_more = get_changes(
+        GroupMessage.objects.select_related("sender_id").filter(group_id=group_id),
+        cursor,
+        limit,
+    )
+    return {
+        "changes": to_change_json_objects(messages),
+        "cursor": cursor,
+        "has_more": has_more,
+    }
@@ -1,11 +1,19 @@
-from django.http import HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.http import HttpResponse
 from django.utils import timezone
+from django.views.decorators.http import require_GET
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
 
-from applications.models import Application, Job, User
+from applications.models import Application
+from bihance.authorization import get_member_id
+from bihance.realtime import authenticate, get_channels, wait_for_changes
 from files.models import File
 from files.serializers import FileSerializer
+from utils.renderers import JsonResponse
+from utils.utils import is_asgi
 
 from .models import Group, GroupMember, GroupMessage
 from .serializers import (
@@ -14,10 +22,12 @@ from .serializers import (
     GroupMessageCreateInputSerializer,
     GroupMessageListInputSerializer,
     GroupMessagePartialUpdateInputSerializer,
+    GroupMessagePollInputSerializer,
     GroupMessageSerializer,
+    GroupMessageSyncInputSerializer,
     GroupPartialUpdateInputSerializer,
 )
-from .utils import check_new_ids
+from .utils import check_new_ids, get_sync_data
 
 
 # Handles interactions with Group and GroupMember
@@ -41,26 +51,23 @@ class GroupViewSet(viewsets.ModelViewSet):
                 "Group creator is not present in member list.", status=400
             )
 
-        # Create the group
+        # Create the group, and its members
+        # The creator is an admin member, the others are normal members
         bio = validated_data["bio"]
-        job_id = validated_data["jobId"]
-        job = Job.objects.get(job_id=job_id)
-        new_group = Group.objects.create(bio=bio, creator_id=request.user, job_id=job)
-
-        # Create the group members
-        # First, make the creator an admin member
-        GroupMember.objects.create(
-            user_id=request.user, group_id=new_group, role="Admin"
-        )
-
-        # Then, make the other members a normal member
-        user_ids.remove(request.user.id)
-        for user_id in user_ids:
-            associated_user = User.objects.get(id=user_id)
-            GroupMember.objects.create(
-                user_id=associated_user,
-                group_id=new_group,
-                role="Member",
+        job = validated_data["jobId"]
+        with transaction.atomic():
+            new_group = Group.objects.create(
+                bio=bio, creator_id=request.user, job_id=job
+            )
+            GroupMember.objects.bulk_create(
+                [
+                    GroupMember(
+                        user_id=user,
+                        group_id=new_group,
+                        role="Admin" if user.id == request.user.id else "Member",
+                    )
+                    for user in validated_data["users"]
+                ]
             )
 
         return HttpResponse(
@@ -72,20 +79,17 @@ class GroupViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, pk=None):
         # Try to retrieve the group record
         try:
-            group = Group.objects.get(group_id=pk)
+            group = Group.objects.select_related("job_id").get(group_id=pk)
         except Group.DoesNotExist:
             return HttpResponse("Group not found.", status=400)
 
-        # Check if user is a group admin
-        is_admin = False
-        try:
-            member = GroupMember.objects.get(user_id=request.user, group_id=group)
-            if member.role == "Admin":
-                is_admin = True
-        except GroupMember.DoesNotExist:
-            pass
+        # Useful information, the role of every existing member
+        roles = dict(
+            GroupMember.objects.filter(group_id=group).values_list("user_id", "role")
+        )
 
-        if not is_admin:
+        # Check if user is a group admin
+        if roles.get(request.user.id) != "Admin":
             return HttpResponse("User must be a group admin.", status=400)
 
         # Input validation
@@ -97,128 +101,124 @@ class GroupViewSet(viewsets.ModelViewSet):
 
         validated_data = input_serializer.validated_data
 
-        # Useful information
-        existing_user_ids = set(
-            GroupMember.objects.filter(group_id=group).values_list("user_id", flat=True)
-        )
-
-        # Update bio, if provided
+        # Every change is validated first, against the roles as they would be
+        # So that nothing is written unless the whole update is valid
         bio = validated_data.get("bio")
-        if bio:
-            group.bio = bio
-            group.save()
 
         # Add new members, if provided
         add_ids = validated_data.get("addIds")
+        new_users = []
         if add_ids:
             # Ensure no existence
-            for add_id in add_ids:
-                if add_id in existing_user_ids:
-                    return HttpResponse(
-                        "User to be added already exists in the group.", status=400
-                    )
+            if any(add_id in roles for add_id in add_ids):
+                return HttpResponse(
+                    "User to be added already exists in the group.", status=400
+                )
 
             # Ensure valid add_ids
             try:
-                check_new_ids(add_ids, group.job_id)
+                new_users = check_new_ids(add_ids, group.job_id)
             except Exception as e:
                 return HttpResponse(f"Failed to add new members: {e}.", status=400)
 
-            # Safe to add
-            for add_id in add_ids:
-                associated_user = User.objects.get(id=add_id)
-                GroupMember.objects.create(
-                    user_id=associated_user,
-                    group_id=group,
-                    role="Member",
-                )
+            roles.update((add_id, "Member") for add_id in add_ids)
 
         # Remove existing members, if provided
         remove_ids = validated_data.get("removeIds")
         if remove_ids:
             # Ensure existence
-            for remove_id in remove_ids:
-                if remove_id not in existing_user_ids:
-                    return HttpResponse(
-                        "User to be removed does not exist in the group.", status=400
-                    )
+            if any(remove_id not in roles for remove_id in remove_ids):
+                return HttpResponse(
+                    "User to be removed does not exist in the group.", status=400
+                )
 
             # Ensure that don't remove all members
-            remaining_members = existing_user_ids.difference(remove_ids)
-            if not remaining_members:
+            remaining_roles = {
+                user_id: role
+                for user_id, role in roles.items()
+                if user_id not in remove_ids
+            }
+            if not remaining_roles:
                 return HttpResponse(
                     "Cannot remove all members of this group.", status=400
                 )
 
             # Ensure that don't remove all admins
-            admin_count = GroupMember.objects.filter(
-                user_id__id__in=remaining_members, role="Admin"
-            ).count()
-            if admin_count < 1:
+            if "Admin" not in remaining_roles.values():
                 return HttpResponse(
                     "Cannot remove all admins of this group.", status=400
                 )
 
-            # Safe to remove
-            GroupMember.objects.filter(user_id__id__in=remove_ids).delete()
+            roles = remaining_roles
 
         # Make new admins, if provided
         make_admin_ids = validated_data.get("makeAdminIds")
-
         if make_admin_ids:
             for make_admin_id in make_admin_ids:
-                if make_admin_id not in existing_user_ids:
+                if make_admin_id not in roles:
                     return HttpResponse(
                         "User to be made admin does not exist in the group.",
                         status=400,
                     )
-                member = GroupMember.objects.get(user_id=make_admin_id)
-                if member.role == "Admin":
+                if roles[make_admin_id] == "Admin":
                     return HttpResponse(
                         "User to be made admin is already an admin.", status=400
                     )
 
-            # Safe to make admin
-            # Update mutates db directly, no need to save object back to db
-            GroupMember.objects.filter(user_id__id__in=make_admin_ids).update(
-                role="Admin"
-            )
+            roles.update((make_admin_id, "Admin") for make_admin_id in make_admin_ids)
 
         # Strip existing admins, if provided
         strip_admin_ids = validated_data.get("stripAdminIds")
         if strip_admin_ids:
             # Ensure existence and admin role
             for strip_admin_id in strip_admin_ids:
-                if strip_admin_id not in existing_user_ids:
+                if strip_admin_id not in roles:
                     return HttpResponse(
                         "User to be stripped from admin does not exist in the group.",
                         status=400,
                     )
-                member = GroupMember.objects.get(user_id=make_admin_id)
-                if member.role == "Member":
+                if roles[strip_admin_id] == "Member":
                     return HttpResponse(
                         "User to be stripped from admin is already not an admin.",
                         status=400,
                     )
 
             # Ensure that don't strip all admins
-            admin_count = GroupMember.objects.filter(
-                group_id=group, role="Admin"
-            ).count()
-
-            strip_count = GroupMember.objects.filter(
-                group_id=group, user_id__id__in=strip_admin_ids, role="Admin"
-            ).count()
-
-            if admin_count - strip_count < 1:
+            admin_count = list(roles.values()).count("Admin")
+            if admin_count - len(strip_admin_ids) < 1:
                 return HttpResponse(
                     "Cannot strip all admins of this group.", status=400
                 )
 
-            # Safe to strip admin
-            GroupMember.objects.filter(user_id__id__in=strip_admin_ids).update(
-                role="Member"
-            )
+        # Safe to update, all changes are written together, or not at all
+        # Update mutates db directly, no need to save objects back to db
+        with transaction.atomic():
+            if bio:
+                group.bio = bio
+                group.save()
+
+            if new_users:
+                GroupMember.objects.bulk_create(
+                    [
+                        GroupMember(user_id=user, group_id=group, role="Member")
+                        for user in new_users
+                    ]
+                )
+
+            if remove_ids:
+                GroupMember.objects.filter(
+                    group_id=group, user_id__id__in=remove_ids
+                ).delete()
+
+            if make_admin_ids:
+                GroupMember.objects.filter(
+                    group_id=group, user_id__id__in=make_admin_ids
+                ).update(role="Admin")
+
+            if strip_admin_ids:
+                GroupMember.objects.filter(
+                    group_id=group, user_id__id__in=strip_admin_ids
+                ).update(role="Member")
 
         return HttpResponse("Successfully updated group details.", status=200)
 
@@ -273,16 +273,12 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
         reply_to_id = validated_data.get("replyToId")
         group_id = validated_data["groupId"]
 
-        # Try to retrieve the group record
-        try:
-            group = Group.objects.get(group_id=group_id)
-        except Group.DoesNotExist:
-            return HttpResponse("Group not found.", status=400)
-
-        # Check that user is part of the group
-        try:
-            user_member = GroupMember.objects.get(user_id=request.user, group_id=group)
-        except GroupMember.DoesNotExist:
+        # Check that user is part of the group (cached)
+        # The group is only looked up to tell the two errors apart
+        member_id = get_member_id(request.user, group_id)
+        if member_id is None:
+            if not Group.objects.filter(group_id=group_id).exists():
+                return HttpResponse("Group not found.", status=400)
             return HttpResponse("User is not part of this group.", status=400)
 
         # Try to retrieve the reply to id (if any)
@@ -290,14 +286,14 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
         if reply_to_id:
             try:
                 reply_to_message = GroupMessage.objects.get(
-                    message_id=reply_to_id, group_id=group
+                    message_id=reply_to_id, group_id=group_id
                 )
             except GroupMessage.DoesNotExist:
                 return HttpResponse("Reply to message does not exist.", status=400)
 
         # Construct the message
         new_message = GroupMessage(
-            group_id=group, sender_id=user_member, content=content
+            group_id_id=group_id, sender_id_id=member_id, content=content
         )
 
         if reply_to_id:
@@ -317,28 +313,25 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
 
         validated_data = input_serializer.validated_data
         group_id = validated_data["groupId"]
-        since = validated_data["since"]
-
-        # Try to retrieve the group record
-        try:
-            group = Group.objects.get(group_id=group_id)
-        except Group.DoesNotExist:
-            return HttpResponse("Group not found.", status=400)
-
-        # Check that user is part of the group
-        try:
-            GroupMember.objects.get(user_id=request.user, group_id=group)
-        except GroupMember.DoesNotExist:
+        since = validated_data.get("since")
+
+        # Check that user is part of the group (cached)
+        # The group is only looked up to tell the two errors apart
+        member_id = get_member_id(request.user, group_id)
+        if member_id is None:
+            if not Group.objects.filter(group_id=group_id).exists():
+                return HttpResponse("Group not found.", status=400)
             return HttpResponse("User is not part of this group.", status=400)
 
         # Retrieve messages
         queryset = (
             GroupMessage.objects.prefetch_related("file_set")
             .select_related("sender_id", "reply_to_id")
-            .filter(group_id=group)
+            .filter(group_id=group_id)
             .order_by("created_at")
         )
 
+        messages = queryset
         if since:
             messages = queryset.filter(
                 created_at__gte=since,
@@ -363,8 +356,12 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
             else:
                 data["reply_to_message"] = None
 
-            if message.file_set.first():
-                file_serializer = FileSerializer(message.file_set.first())
+            # Same file as message.file_set.first(), but from the prefetch cache
+            associated_file = min(
+                message.file_set.all(), key=lambda file: file.file_key, default=None
+            )
+            if associated_file:
+                file_serializer = FileSerializer(associated_file)
                 data["file"] = file_serializer.data
             else:
                 data["file"] = None
@@ -373,6 +370,33 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
 
         return JsonResponse(result, safe=False)
 
+    # Inserts, edits and deletes after a cursor, oldest first
+    # Clients upsert the messages by message_id, then sync again from the returned cursor
+    # GET -> group-messages/sync
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        # Input validation
+        input_serializer = GroupMessageSyncInputSerializer(data=request.query_params)
+        if not input_serializer.is_valid():
+            return HttpResponse(input_serializer.errors, status=400)
+
+        validated_data = input_serializer.validated_data
+        group_id = validated_data["groupId"]
+
+        # Check that user is part of the group (cached)
+        # The group is only looked up to tell the two errors apart
+        member_id = get_member_id(request.user, group_id)
+        if member_id is None:
+            if not Group.objects.filter(group_id=group_id).exists():
+                return HttpResponse("Group not found.", status=400)
+            return HttpResponse("User is not part of this group.", status=400)
+
+        # Retrieve changes
+        data = get_sync_data(
+            group_id, validated_data["cursor"], validated_data["limit"]
+        )
+        return JsonResponse(data)
+
     # PATCH -> group-messages/:message_id
     def partial_update(self, request, pk=None):
         # Input validation
@@ -384,27 +408,23 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
         content = validated_data["content"]
         group_id = validated_data["groupId"]
 
-        # Try to retrieve the group record
-        try:
-            group = Group.objects.get(group_id=group_id)
-        except Group.DoesNotExist:
-            return HttpResponse("Group not found.", status=400)
-
-        # Check that user is part of the group
-        try:
-            user_member = GroupMember.objects.get(user_id=request.user, group_id=group)
-        except GroupMember.DoesNotExist:
+        # Check that user is part of the group (cached)
+        # The group is only looked up to tell the two errors apart
+        member_id = get_member_id(request.user, group_id)
+        if member_id is None:
+            if not Group.objects.filter(group_id=group_id).exists():
+                return HttpResponse("Group not found.", status=400)
             return HttpResponse("User is not part of this group.", status=400)
 
         # Try to retrieve the message record
         # Check that message is part of the group
         try:
-            message = GroupMessage.objects.get(message_id=pk, group_id=group)
+            message = GroupMessage.objects.get(message_id=pk, group_id=group_id)
         except GroupMessage.DoesNotExist:
             return HttpResponse("Message does not exist.", status=400)
 
         # Check that user is sender of message
-        if message.sender_id != user_member:
+        if message.sender_id_id != member_id:
             return HttpResponse("Message is not sent by user.", status=400)
 
         # Modify the message
@@ -421,27 +441,23 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
         message_id = pk.split(" || ")[0]
         group_id = pk.split(" || ")[1]
 
-        # Try to retrieve the group record
-        try:
-            group = Group.objects.get(group_id=group_id)
-        except Group.DoesNotExist:
-            return HttpResponse("Group not found.", status=400)
-
-        # Check that user is part of the group
-        try:
-            user_member = GroupMember.objects.get(user_id=request.user, group_id=group)
-        except GroupMember.DoesNotExist:
+        # Check that user is part of the group (cached)
+        # The group is only looked up to tell the two errors apart
+        member_id = get_member_id(request.user, group_id)
+        if member_id is None:
+            if not Group.objects.filter(group_id=group_id).exists():
+                return HttpResponse("Group not found.", status=400)
             return HttpResponse("User is not part of this group.", status=400)
 
         # Try to retrieve the message record
         # Check that message is part of the group
         try:
-            message = GroupMessage.objects.get(message_id=message_id, group_id=group)
+            message = GroupMessage.objects.get(message_id=message_id, group_id=group_id)
         except GroupMessage.DoesNotExist:
             return HttpResponse("Message does not exist.", status=400)
 
         # Check that user is sender of message
-        if message.sender_id != user_member:
+        if message.sender_id_id != member_id:
             return HttpResponse("Message is not sent by user.", status=400)
 
         # Soft delete the message
@@ -454,3 +470,39 @@ class GroupMessageViewSet(viewsets.ModelViewSet):
         associated_files.delete()
 
         return HttpResponse("Message successfully deleted.", status=200)
+
+
+# Long-poll variant of GroupMessageViewSet.sync, for clients that cannot hold an event stream
+# Held by the event loop until a change after the cursor is committed, or timeout seconds
+# Needs ASGI, under WSGI it is answered at once (like sync) rather than holding a worker
+# GET -> group-messages/poll
+@require_GET
+async def poll_group_messages(request):
+    # Input validation
+    input_serializer = GroupMessagePollInputSerializer(data=request.GET)
+    if not input_serializer.is_valid():
+        return HttpResponse(input_serializer.errors, status=400)
+
+    validated_data = input_serializer.validated_data
+    group_id = validated_data["groupId"]
+
+    # User verification
+    try:
+        user = await sync_to_async(authenticate)(request)
+    except AuthenticationFailed as e:
+        return HttpResponse(e.detail, status=401)
+
+    channels = await sync_to_async(get_channels)(user, [], [group_id])
+    if channels is None:
+        return HttpResponse("User is not part of this group.", status=400)
+
+    # Wait for changes
+    timeout = validated_data["timeout"] if is_asgi(request) else 0
+    data = await wait_for_changes(
+        channels,
+        lambda: get_sync_data(
+            group_id, validated_data["cursor"], validated_data["limit"]
+        ),
+        timeout,
+    )
+    return JsonResponse(data)
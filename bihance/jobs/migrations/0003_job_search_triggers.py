@@ -0,0 +1,85 @@
+from django.db import migrations
+
+# Job."searchVector" is recomputed by the database itself
+# So that every write path (save, update, bulk_create, raw SQL) keeps it current
+# Weights: name A, requirement names B, requirements C, description D
+CREATE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION job_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW."searchVector" :=
+        setweight(to_tsvector('english', coalesce(NEW."name", '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg("name", ' ')
+            FROM "Job_Requirement"
+            WHERE "jobId" = NEW."jobId"
+        ), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(NEW."requirements", '')), 'C') ||
+        setweight(to_tsvector('english', coalesce(NEW."description", '')), 'D');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+-- Writing "searchVector" (eg: resetting it to NULL) also triggers a recompute
+CREATE TRIGGER job_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF "name", "requirements", "description", "searchVector"
+    ON "Job"
+    FOR EACH ROW EXECUTE FUNCTION job_search_vector_update();
+
+-- Requirement changes touch their jobs once per statement, not once per row
+CREATE OR REPLACE FUNCTION job_requirement_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        UPDATE "Job" SET "searchVector" = NULL
+        WHERE "jobId" IN (SELECT "jobId" FROM new_rows);
+    ELSIF TG_OP = 'DELETE' THEN
+        UPDATE "Job" SET "searchVector" = NULL
+        WHERE "jobId" IN (SELECT "jobId" FROM old_rows);
+    ELSE
+        UPDATE "Job" SET "searchVector" = NULL
+        WHERE "jobId" IN (
+            SELECT "jobId" FROM new_rows UNION SELECT "jobId" FROM old_rows
+        );
+    END IF;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER job_requirement_insert_search_vector_trigger
+    AFTER INSERT ON "Job_Requirement"
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION job_requirement_search_vector_update();
+
+CREATE TRIGGER job_requirement_update_search_vector_trigger
+    AFTER UPDATE ON "Job_Requirement"
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION job_requirement_search_vector_update();
+
+CREATE TRIGGER job_requirement_delete_search_vector_trigger
+    AFTER DELETE ON "Job_Requirement"
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION job_requirement_search_vector_update();
+
+-- Backfill existing jobs
+UPDATE "Job" SET "searchVector" = NULL;
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS job_requirement_delete_search_vector_trigger ON "Job_Requirement";
+DROP TRIGGER IF EXISTS job_requirement_update_search_vector_trigger ON "Job_Requirement";
+DROP TRIGGER IF EXISTS job_requirement_insert_search_vector_trigger ON "Job_Requirement";
+DROP FUNCTION IF EXISTS job_requirement_search_vector_update();
+DROP TRIGGER IF EXISTS job_search_vector_trigger ON "Job";
+DROP FUNCTION IF EXISTS job_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0006_job_search_vector'),
+        ('jobs', '0002_alter_jobrequirement_job_id'),
+    ]
+
+    operations = [
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
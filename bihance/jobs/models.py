@@ -3,6 +3,13 @@ import uuid
 from applications.models import Job
 from django.db import models
 
+# Order of every jobs listing (and its pagination cursors)
+# Newest first, job_id breaks ties between jobs posted at the same time
+JOB_ORDERING = ["-posted_date", "-job_id"]
+
+# Search results are ordered by relevance first
+JOB_SEARCH_ORDERING = ["-rank", *JOB_ORDERING]
+
 
 class JobRequirement(models.Model):
     requirement_id = models.UUIDField(
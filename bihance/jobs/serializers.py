@@ -1,10 +1,39 @@
 from applications.models import DurationType, JobType, PayType
+from django.conf import settings
 from rest_framework import serializers
 from utils.utils import detect_extra_fields
 
 from .models import JobRequirement
 
 
+# Shared by every paginated jobs endpoint
+class JobPageInputSerializer(serializers.Serializer):
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.MAX_PAGE_SIZE,
+        default=settings.DEFAULT_PAGE_SIZE,
+    )
+
+    def validate(self, data):
+        detect_extra_fields(self.initial_data, self.fields)
+        return data
+
+
+class JobListInputSerializer(JobPageInputSerializer):
+    # Every job, streamed, instead of a single page
+    stream = serializers.BooleanField(required=False, default=False)
+
+    def validate(self, data):
+        data = super().validate(data)
+        if data["stream"] and "cursor" in data:
+            raise serializers.ValidationError(
+                "Can either stream all jobs, or get a page of jobs, but not both."
+            )
+        return data
+
+
 # location (whats the diff with location-name?)
 class JobCreateInputSerializer(serializers.Serializer):
     name = serializers.CharField()
@@ -109,7 +138,7 @@ class JobPartialUpdateInputSerializer(serializers.Serializer):
         return data
 
 
-class JobFilteredInputSerializer(serializers.Serializer):
+class JobFilteredInputSerializer(JobPageInputSerializer):
     jobType = serializers.ChoiceField(choices=JobType.choices, required=False)
     location = serializers.CharField(required=False)
     search = serializers.CharField(required=False)
@@ -117,12 +146,33 @@ class JobFilteredInputSerializer(serializers.Serializer):
     def validate(self, data):
         detect_extra_fields(self.initial_data, self.fields)
 
-        if not data:
+        filter_fields = ["jobType", "location", "search"]
+        if not any(field in data for field in filter_fields):
             raise serializers.ValidationError("At least one field must be modified.")
 
         return data
 
 
+# Job window defaults to the job's startDate to endDate
+class JobMatchedApplicantsInputSerializer(serializers.Serializer):
+    startDate = serializers.DateTimeField(required=False)
+    endDate = serializers.DateTimeField(required=False)
+    # Only applications in this status are ranked, pending (1) and accepted (2) by default
+    applicationStatus = serializers.IntegerField(
+        required=False, min_value=1, max_value=4
+    )
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.MAX_PAGE_SIZE,
+        default=settings.MAX_PAGE_SIZE,
+    )
+
+    def validate(self, data):
+        detect_extra_fields(self.initial_data, self.fields)
+        return data
+
+
 class JobRequirementSerializer(serializers.ModelSerializer):
     class Meta:
         model = JobRequirement
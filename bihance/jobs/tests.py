@@ -1,9 +1,21 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
-from applications.models import Job
-from django.test import TestCase
+import json
+from datetime import timedelta
+from unittest.mock import patch
+
+from applications.models import Application, Job, User
+from applications.serializers import ApplicationSerializer, JobSerializer
+from availabilities.models import Timing
+from bihance.authentication import JWTAuthenticationMiddleware
+from bihance.metrics import registry
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import TestCase, override_settings
 from django.utils import timezone
+from files.models import AssociatedType, File
+from files.serializers import FileSerializer
+from jobs.models import JobRequirement
 from rest_framework.test import APIClient
 from utils.tests.objects import get_application, get_employee, get_employer, get_job
 from utils.tests.utils import (
@@ -11,9 +23,13 @@ from utils.tests.utils import (
     verify_file_shape,
     verify_job_requirement_shape,
     verify_job_shape,
+    verify_user_shape,
 )
 from utils.utils import terminate_current_connections
 
+from .serializers import JobRequirementSerializer
+from .utils import to_json_objects
+
 terminate_current_connections()
 
 
@@ -161,6 +177,92 @@ class ApplicationsAPITest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(len(response.json()), 2)
 
+    # GET multiple, page by page
+    def test_pagination(self):
+        # Jobs 2 - 6, posted at the same time (ties are broken by job_id)
+        posted_date = timezone.now()
+        for i in range(5):
+            Job.objects.create(
+                name=f"Paginated Job {i}",
+                employer_id=self.employer,
+                start_date=posted_date,
+                description="Page me.",
+                posted_date=posted_date,
+            )
+
+        self.auth_employee()
+        job_ids = []
+        url = f"{self.base_url}?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.json()), 2)
+            job_ids.extend(job_info["job"]["job_id"] for job_info in response.json())
+            url = response.get("Link", "").split(">")[0].lstrip("<") or None
+
+        # Every job exactly once, newest first
+        self.assertEqual(len(job_ids), 6)
+        self.assertEqual(len(set(job_ids)), 6)
+        self.assertEqual(job_ids[-1], str(self.job.job_id))
+
+        # Tampered cursors are rejected
+        response = self.client.get(f"{self.base_url}?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, 400)
+
+    # GET filtered, full text search
+    def test_search(self):
+        now = timezone.now()
+        title_match = Job.objects.create(
+            name="Barista",
+            employer_id=self.employer,
+            start_date=now,
+            description="Pull shots.",
+            posted_date=now,
+        )
+        description_match = Job.objects.create(
+            name="Cashier",
+            employer_id=self.employer,
+            start_date=now,
+            description="Occasionally covers for the barista.",
+            posted_date=now,
+        )
+        requirement_match = Job.objects.create(
+            name="Waiter",
+            employer_id=self.employer,
+            start_date=now,
+            description="Serve tables.",
+            posted_date=now,
+        )
+        JobRequirement.objects.create(job_id=requirement_match, name="Barista training")
+
+        # Most relevant first, prefixes match too
+        self.auth_employee()
+        response = self.client.get(f"{self.base_url}filtered/?search=baris")
+        self.assertEqual(response.status_code, 200)
+        job_ids = [job_info["job"]["job_id"] for job_info in response.json()]
+        self.assertEqual(
+            job_ids,
+            [
+                str(title_match.job_id),
+                str(requirement_match.job_id),
+                str(description_match.job_id),
+            ],
+        )
+
+        # Ranked results page like the rest
+        response = self.client.get(f"{self.base_url}filtered/?search=barista&limit=1")
+        self.assertEqual(len(response.json()), 1)
+        response = self.client.get(response["Link"].split(">")[0].lstrip("<"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()[0]["job"]["job_id"], str(requirement_match.job_id)
+        )
+
+        # Requirement changes are picked up
+        JobRequirement.objects.filter(job_id=requirement_match).delete()
+        response = self.client.get(f"{self.base_url}filtered/?search=barista")
+        self.assertEqual(len(response.json()), 2)
+
     # DELETE
     def delete_job(self):
         # Delete Job 2
@@ -168,3 +270,210 @@ class ApplicationsAPITest(TestCase):
         response = self.client.delete(f"{self.base_url}{self.job2_id}/")
         self.assertEqual(response.status_code, 200)
         self.assertEqual(Job.objects.count(), 1)
+
+    # Batch serialization, same output as the DRF serializers
+    def test_batch_serialization(self):
+        for i in range(3):
+            job = Job.objects.create(
+                name=f"Batch Job {i}",
+                employer_id=self.employer,
+                start_date=timezone.now(),
+                description="Batch me.",
+                posted_date=timezone.now(),
+                location={"lat": 1.3, "lng": 103.8},
+            )
+            JobRequirement.objects.create(job_id=job, name=f"Requirement {i}")
+            for key in [f"b-{i}", f"a-{i}"]:
+                File.objects.create(
+                    file_key=key,
+                    file_url=f"https://files.example.com/{key}",
+                    file_name=key,
+                    file_type="pdf",
+                    file_size=100,
+                    associated_type=AssociatedType.JOB,
+                    associated_job=job,
+                )
+
+        # Reference output, one serializer per object
+        def serialize(job):
+            requirements = job.jobrequirement_set.all()
+            applications = job.application_set.all()
+            return {
+                "job": JobSerializer(job).data,
+                "applications": ApplicationSerializer(applications, many=True).data
+                if applications
+                else None,
+                "job_requirements": JobRequirementSerializer(
+                    requirements, many=True
+                ).data
+                if requirements
+                else None,
+                "file": FileSerializer(job.file_set.first()).data
+                if job.file_set.first()
+                else None,
+            }
+
+        def to_json(data):
+            return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+        jobs = Job.objects.order_by("job_id")
+        self.assertEqual(
+            to_json(to_json_objects(jobs)),
+            to_json([serialize(job) for job in jobs]),
+        )
+        # First file by file_key, of a job with files (the fixture job has none)
+        batch_job = jobs.get(name="Batch Job 0")
+        self.assertEqual(to_json_objects([batch_job])[0]["file"]["file_key"], "a-0")
+
+        # Queries do not grow with the number of jobs
+        self.auth_employee()
+        with self.assertNumQueries(4):
+            response = self.client.get(self.base_url)
+        self.assertEqual(len(response.json()), 4)
+
+    # GET, applicants ranked by availability
+    def test_matched_applicants(self):
+        url = f"{self.base_url}{self.job.job_id}/matched_applicants/"
+        self.auth_employer()
+
+        # The fixture job has no end date
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+
+        start_date = self.job.start_date
+        self.job.end_date = start_date + timedelta(days=10)
+        self.job.save()
+
+        def days(n):
+            return start_date + timedelta(days=n)
+
+        # Covered days (out of 10), by employee
+        employees = [self.employee]
+        for i in range(3):
+            employee = User.objects.create(
+                first_name="Applicant",
+                last_name=str(i),
+                email=f"applicant{i}@gmail.com",
+                employee=True,
+            )
+            Application.objects.create(
+                job_id=self.job,
+                accept=1,
+                employee_id=employee,
+                employer_id=self.employer,
+            )
+            employees.append(employee)
+
+        for index, start, end in [
+            (0, 0, 2),
+            (0, 5, 6),
+            (1, -1, 11),
+            (3, 8, 12),
+            (3, -5, -3),
+        ]:
+            Timing.objects.create(
+                employee_id=employees[index], start_time=days(start), end_time=days(end)
+            )
+
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        matches = response.json()
+        self.assertEqual(
+            [(match["employee"]["id"], match["coverage"]) for match in matches],
+            [
+                (str(employees[1].id), 1.0),
+                (str(employees[0].id), 0.3),
+                (str(employees[3].id), 0.2),
+                (str(employees[2].id), 0.0),
+            ],
+        )
+        for match in matches:
+            verify_application_shape(match["application"])
+            verify_user_shape(match["employee"])
+
+        # Custom window, and limit
+        response = self.client.get(
+            url,
+            {
+                "startDate": days(10).isoformat(),
+                "endDate": days(12).isoformat(),
+                "limit": 1,
+            },
+        )
+        matches = response.json()
+        self.assertEqual(len(matches), 1)
+        self.assertEqual(matches[0]["employee"]["id"], str(employees[3].id))
+        self.assertEqual(matches[0]["coverage"], 1.0)
+
+        # Rejected applicants are not ranked, unless asked for
+        Application.objects.filter(employee_id=employees[1]).update(accept=3)
+        response = self.client.get(url)
+        self.assertNotIn(
+            str(employees[1].id), [match["employee"]["id"] for match in response.json()]
+        )
+        response = self.client.get(url, {"applicationStatus": 3})
+        self.assertEqual(
+            [match["employee"]["id"] for match in response.json()],
+            [str(employees[1].id)],
+        )
+
+        # Only the employer of the job
+        self.auth_employee()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+
+    # GET multiple, streamed
+    @override_settings(STREAM_CHUNK_SIZE=2)
+    def test_stream(self):
+        for i in range(4):
+            Job.objects.create(
+                name=f"Streamed Job {i}",
+                employer_id=self.employer,
+                start_date=timezone.now(),
+                description="Stream me.",
+                posted_date=timezone.now(),
+            )
+
+        self.auth_employee()
+        response = self.client.get(f"{self.base_url}?stream=true")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+
+        # Every job, newest first, same shape as a page
+        # 1 cursor, then 3 queries per chunk (of 2 jobs)
+        with self.assertNumQueries(1 + 3 * 3):
+            jobs = json.loads(response.getvalue())
+        self.assertEqual(len(jobs), 5)
+        self.assertEqual(jobs[-1]["job"]["job_id"], str(self.job.job_id))
+        for job_info in jobs:
+            verify_job_shape(job_info["job"])
+
+        response = self.client.get(f"{self.base_url}?stream=true&cursor=abc")
+        self.assertEqual(response.status_code, 400)
+
+    # Under ASGI, chunks are still read one at a time (not the whole body at once)
+    @override_settings(STREAM_CHUNK_SIZE=1)
+    async def test_stream_async(self):
+        registry.clear()
+        with patch.object(
+            JWTAuthenticationMiddleware,
+            "authenticate_credentials",
+            return_value=(self.employee, None),
+        ):
+            response = await self.async_client.get(
+                f"{self.base_url}?stream=true", headers={"Authorization": "Bearer t"}
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+
+        parts = [part async for part in response.streaming_content]
+        self.assertEqual(parts[0], b"[")
+        jobs = json.loads(b"".join(parts))
+        self.assertEqual(jobs[0]["job"]["job_id"], str(self.job.job_id))
+
+        # Queries of the stream are counted, once it ends
+        route_stats = registry.routes[("GET", "jobs-list")]
+        self.assertEqual(route_stats.requests, 1)
+        self.assertGreater(route_stats.queries, 0)
@@ -1,6 +1,21 @@
-from applications.serializers import ApplicationSerializer, JobSerializer
+import re
+
+from applications.models import Application
+from applications.serializers import (
+    ApplicationSerializer,
+    JobSerializer,
+    UserSerializer,
+)
+from availabilities.utils import get_covered_seconds
+from bihance.metrics import serialization_timer
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from files.models import File
 from files.serializers import FileSerializer
+from utils.serialization import FieldExtractor
 
+from .models import JOB_ORDERING, JOB_SEARCH_ORDERING, JobRequirement
 from .serializers import JobRequirementSerializer
 
 
@@ -8,34 +23,133 @@ def is_employer_in_job(employer, job):
     return job.employer_id == employer
 
 
-# Parse Job model object into a JSON object
-def to_json_object(job):
-    job_serializer = JobSerializer(job)
+# Every search term is prefix matched, so "pyth" finds "Python"
+# Returns None if the search has no usable terms
+def to_prefix_query(search):
+    terms = re.findall(r"\w+", search)
+    if not terms:
+        return None
 
-    data = {
-        "job": job_serializer.data,
-    }
+    raw_query = " & ".join(f"{term}:*" for term in terms)
+    return SearchQuery(raw_query, search_type="raw", config="english")
+
+
+# Filter jobs by a search string, in a single (indexed) query
+# Returns a tuple of (queryset, ordering)
+def search_jobs(queryset, search):
+    query = to_prefix_query(search)
+    if query is None:
+        return queryset.none(), JOB_ORDERING
+
+    # Uses the GIN index on search_vector
+    # Rank is cast to double precision, so that it round trips exactly in cursors
+    queryset = queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F("search_vector"), query), FloatField())
+    )
+    return queryset, JOB_SEARCH_ORDERING
+
+
+job_extractor = FieldExtractor(JobSerializer)
+application_extractor = FieldExtractor(ApplicationSerializer)
+job_requirement_extractor = FieldExtractor(JobRequirementSerializer)
+file_extractor = FieldExtractor(FileSerializer)
+user_extractor = FieldExtractor(UserSerializer)
+
+
+# Group rows (from .values()) by their job, job_id_id being the FK column
+def group_by_job(rows, extractor):
+    result = {}
+    for row in rows:
+        result.setdefault(row["job_id_id"], []).append(extractor.from_values(row))
+    return result
 
-    if job.application_set.all():
-        application_serializer = ApplicationSerializer(
-            job.application_set.all(), many=True
-        )
-        data["applications"] = application_serializer.data
-    else:
-        data["applications"] = None
 
-    if job.jobrequirement_set.all():
-        job_requirement_serializer = JobRequirementSerializer(
-            job.jobrequirement_set.all(), many=True
+# Parse Job model objects into JSON objects, in a fixed number of queries
+# One query each for the applications, requirements and files of all jobs
+# Jobs can be a queryset or a list, and need no prefetching
+@serialization_timer
+def to_json_objects(jobs):
+    jobs = list(jobs)
+    job_ids = [job.job_id for job in jobs]
+    if not job_ids:
+        return []
+
+    applications = group_by_job(
+        Application.objects.filter(job_id__in=job_ids).values(
+            *application_extractor.attnames
+        ),
+        application_extractor,
+    )
+    job_requirements = group_by_job(
+        JobRequirement.objects.filter(job_id__in=job_ids).values(
+            *job_requirement_extractor.attnames
+        ),
+        job_requirement_extractor,
+    )
+
+    # Only the first file (by file_key) of every job
+    # Same one as job.file_set.first()
+    files = {}
+    for row in (
+        File.objects.filter(associated_job__in=job_ids)
+        .order_by("associated_job", "file_key")
+        .distinct("associated_job")
+        .values(*file_extractor.attnames, "associated_job_id")
+    ):
+        files[row["associated_job_id"]] = file_extractor.from_values(row)
+
+    result = []
+    for job in jobs:
+        result.append(
+            {
+                "job": job_extractor.from_instance(job),
+                "applications": applications.get(job.job_id),
+                "job_requirements": job_requirements.get(job.job_id),
+                "file": files.get(job.job_id),
+            }
         )
-        data["job_requirements"] = job_requirement_serializer.data
-    else:
-        data["job_requirements"] = None
+    return result
+
+
+# Parse Job model object into a JSON object
+def to_json_object(job):
+    return to_json_objects([job])[0]
+
 
-    if job.file_set.first():
-        file_serializer = FileSerializer(job.file_set.first())
-        data["file"] = file_serializer.data
-    else:
-        data["file"] = None
+# Applications to a job in one of application_statuses (eg: not rejected ones),
+# Ranked by how much of start_date to end_date the availabilities of their employee
+# Cover (coverage, from 0 to 1)
+# Only the top limit applications (and their employees) are fetched and serialized
+# In a fixed number of queries, however many applicants there are
+@serialization_timer
+def to_json_objects_matched(job, start_date, end_date, limit, application_statuses):
+    applicants = list(
+        Application.objects.filter(job_id=job, accept__in=application_statuses)
+        .order_by("application_id")
+        .values_list("application_id", "employee_id")
+    )
+    covered_seconds = get_covered_seconds(
+        [employee_id for _, employee_id in applicants], start_date, end_date
+    )
 
-    return data
+    # Stable, so that ties stay in application order
+    applicants.sort(key=lambda applicant: covered_seconds[applicant[1]], reverse=True)
+    application_ids = [application_id for application_id, _ in applicants[:limit]]
+    applications = Application.objects.select_related("employee_id").in_bulk(
+        application_ids
+    )
+    window_seconds = (end_date - start_date).total_seconds()
+
+    result = []
+    for application_id in application_ids:
+        application = applications[application_id]
+        seconds = covered_seconds[application.employee_id_id]
+        result.append(
+            {
+                "application": application_extractor.from_instance(application),
+                "employee": user_extractor.from_instance(application.employee_id),
+                "covered_seconds": seconds,
+                "coverage": seconds / window_seconds,
+            }
+        )
+    return result
@@ -1,19 +1,33 @@
 from applications.models import Job
-from django.db.models import Q
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse
 from django.utils import timezone
-from files.models import File
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
-from utils.utils import is_employer, remap_keys
+from utils.renderers import JsonResponse, StreamingJsonResponse, iter_chunks
+from utils.utils import (
+    add_next_page_headers,
+    is_asgi,
+    is_employer,
+    keyset_paginate,
+    remap_keys,
+)
 
-from .models import JobRequirement
+from .models import JOB_ORDERING, JobRequirement
 from .serializers import (
     JobCreateInputSerializer,
     JobFilteredInputSerializer,
+    JobListInputSerializer,
+    JobMatchedApplicantsInputSerializer,
+    JobPageInputSerializer,
     JobPartialUpdateInputSerializer,
 )
-from .utils import is_employer_in_job, to_json_object
+from .utils import (
+    is_employer_in_job,
+    search_jobs,
+    to_json_object,
+    to_json_objects,
+    to_json_objects_matched,
+)
 
 
 class JobsViewSet(viewsets.ModelViewSet):
@@ -38,29 +52,51 @@ class JobsViewSet(viewsets.ModelViewSet):
         "locationName": "location_name",
     }
 
+    # Serialize one page of jobs
+    # Cursor for the next page (if any) is returned in the response headers
+    def paginated_response(
+        self, request, queryset, validated_data, ordering=JOB_ORDERING
+    ):
+        try:
+            jobs, next_cursor = keyset_paginate(
+                queryset,
+                ordering,
+                validated_data.get("cursor"),
+                validated_data["limit"],
+            )
+        except ValueError as e:
+            return HttpResponse(f"Invalid cursor: {e}", status=400)
+
+        # Whole page in a fixed number of queries
+        result = to_json_objects(jobs)
+
+        response = JsonResponse(result, safe=False)
+        return add_next_page_headers(response, request, next_cursor)
+
     # GET multiple -> jobs/
     def list(self, request):
-        result = []
-        jobs = (
-            Job.objects.prefetch_related(
-                "application_set", "jobrequirement_set", "file_set"
-            )
-            .all()
-            .order_by("-posted_date")
-        )
+        # Input validation
+        input_serializer = JobListInputSerializer(data=request.query_params)
+        if not input_serializer.is_valid():
+            return HttpResponse(input_serializer.errors, status=400)
 
-        for job in jobs:
-            job_json = to_json_object(job)
-            result.append(job_json)
+        validated_data = input_serializer.validated_data
+        jobs = Job.objects.defer("search_vector")
 
-        return JsonResponse(result, safe=False)
+        if validated_data["stream"]:
+            # Chunk by chunk, each chunk in a fixed number of queries
+            chunks = (
+                to_json_objects(chunk)
+                for chunk in iter_chunks(jobs.order_by(*JOB_ORDERING))
+            )
+            return StreamingJsonResponse(chunks, asynchronous=is_asgi(request))
+
+        return self.paginated_response(request, jobs, validated_data)
 
     # GET single -> jobs/:job_id
     def retrieve(self, request, pk=None):
         try:
-            job = Job.objects.prefetch_related(
-                "application_set", "jobrequirement_set"
-            ).get(job_id=pk)
+            job = Job.objects.defer("search_vector").get(job_id=pk)
         except Job.DoesNotExist:
             return HttpResponse("No job found.", status=400)
 
@@ -155,7 +191,7 @@ class JobsViewSet(viewsets.ModelViewSet):
     def destroy(self, request, pk=None):
         # Try to get the job record
         try:
-            job = Job.objects.get(job_id=pk)
+            job = Job.objects.select_related("employer_id").get(job_id=pk)
         except Job.DoesNotExist:
             return HttpResponse("No job found.", status=400)
 
@@ -166,18 +202,8 @@ class JobsViewSet(viewsets.ModelViewSet):
         if not is_employer_in_job(request.user, job):
             return HttpResponse("Employer is not involved in this job.", status=400)
 
-        # Delete job requirements, if any
-        job_requirements = JobRequirement.objects.filter(job_id=job)
-        job_requirements.delete()
-
-        # Delete file, if any
-        try:
-            file = File.objects.get(associated_job=job)
-            file.delete()
-        except File.DoesNotExist:
-            pass
-
         # Delete job
+        # Cascades to its requirements, files, applications (and their messages) etc
         job.delete()
 
         return HttpResponse("Job successfully deleted.", status=200)
@@ -190,16 +216,12 @@ class JobsViewSet(viewsets.ModelViewSet):
         if not input_serializer.is_valid():
             return HttpResponse(input_serializer.errors, status=400)
 
-        validated_data = input_serializer.data
+        validated_data = input_serializer.validated_data
         job_type = validated_data.get("jobType")
         location = validated_data.get("location")
         search = validated_data.get("search")
 
-        queryset = (
-            Job.objects.prefetch_related("application_set", "jobrequirement_set")
-            .all()
-            .order_by("-posted_date")
-        )
+        queryset = Job.objects.defer("search_vector")
         filters = {}
 
         if job_type:
@@ -208,34 +230,13 @@ class JobsViewSet(viewsets.ModelViewSet):
             filters["location_name__icontains"] = location
 
         queryset = queryset.filter(**filters)
+        ordering = JOB_ORDERING
         if search:
-            # Stage 1 of filtering
-            filtered_jobs_1 = queryset.filter(
-                Q(name__icontains=search) | Q(description__icontains=search)
-            )
-
-            # Stage 2 of filtering
-            filtered_jobs_2 = []
-            for job in queryset:
-                has_matching_requirement = False
-                for requirement in job.jobrequirement_set.all():
-                    if requirement.name == search:
-                        has_matching_requirement = True
-                        break
-
-                if has_matching_requirement:
-                    filtered_jobs_2.append(job)
-
-            # OR the results from both stages together
-            queryset = set(list(filtered_jobs_1) + filtered_jobs_2)
+            # Full text search, most relevant jobs first
+            queryset, ordering = search_jobs(queryset, search)
 
         # Return the filtered result
-        result = []
-        for job in queryset:
-            job_json = to_json_object(job)
-            result.append(job_json)
-
-        return JsonResponse(result, safe=False)
+        return self.paginated_response(request, queryset, validated_data, ordering)
 
     # GET -> jobs/employer_jobs/
     @action(detail=False, methods=["get"])
@@ -244,15 +245,58 @@ class JobsViewSet(viewsets.ModelViewSet):
         if not is_employer(request.user):
             return HttpResponse("User is not an employer.", status=400)
 
-        result = []
-        jobs = (
-            Job.objects.prefetch_related("application_set", "jobrequirement_set")
-            .filter(employer_id=request.user)
-            .order_by("-posted_date")
+        # Input validation
+        input_serializer = JobPageInputSerializer(data=request.query_params)
+        if not input_serializer.is_valid():
+            return HttpResponse(input_serializer.errors, status=400)
+
+        jobs = Job.objects.defer("search_vector").filter(employer_id=request.user)
+        return self.paginated_response(request, jobs, input_serializer.validated_data)
+
+    # GET -> jobs/:job_id/matched_applicants/
+    # Pending and accepted applicants (or those in applicationStatus)
+    # Ranked by how much of the job their availabilities cover
+    @action(detail=True, methods=["get"])
+    def matched_applicants(self, request, pk=None):
+        # Input validation
+        input_serializer = JobMatchedApplicantsInputSerializer(
+            data=request.query_params
         )
+        if not input_serializer.is_valid():
+            return HttpResponse(input_serializer.errors, status=400)
+
+        # Try to get the job record
+        try:
+            job = (
+                Job.objects.defer("search_vector")
+                .select_related("employer_id")
+                .get(job_id=pk)
+            )
+        except Job.DoesNotExist:
+            return HttpResponse("No job found.", status=400)
+
+        # User verification
+        if not is_employer(request.user):
+            return HttpResponse("User is not an employer.", status=400)
 
-        for job in jobs:
-            job_json = to_json_object(job)
-            result.append(job_json)
+        if not is_employer_in_job(request.user, job):
+            return HttpResponse("Employer is not involved in this job.", status=400)
 
+        validated_data = input_serializer.validated_data
+        start_date = validated_data.get("startDate", job.start_date)
+        end_date = validated_data.get("endDate", job.end_date)
+        if end_date is None:
+            return HttpResponse("Job has no end date, provide an endDate.", status=400)
+        if end_date <= start_date:
+            return HttpResponse("End date must be after start date.", status=400)
+
+        if "applicationStatus" in validated_data:
+            application_statuses = [validated_data["applicationStatus"]]
+        else:
+            # 1 means pending, 2 means accepted
+            application_statuses = [1, 2]
+
+        result = to_json_objects_matched(
+            job, start_date, end_date, validated_data["limit"], application_statuses
+        )
         return JsonResponse(result, safe=False)
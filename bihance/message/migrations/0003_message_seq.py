@@ -0,0 +1,66 @@
+# Generated by Django 5.2 on 2026-10-18 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Message."seq" is assigned by the database itself, on every insert and update
+# The application row is locked first, so that writers of the same conversation
+# Take turns and commit their seqs in order (a client never skips a seq)
+CREATE_TRIGGERS_SQL = """
+CREATE OR REPLACE FUNCTION message_seq_update() RETURNS trigger AS $$
+BEGIN
+    PERFORM 1 FROM "Application"
+    WHERE "applicationId" = NEW."applicationId"
+    FOR NO KEY UPDATE;
+
+    SELECT coalesce(max("seq"), 0) + 1 INTO NEW."seq"
+    FROM "Message"
+    WHERE "applicationId" = NEW."applicationId";
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER message_seq_trigger
+    BEFORE INSERT OR UPDATE ON "Message"
+    FOR EACH ROW EXECUTE FUNCTION message_seq_update();
+"""
+
+DROP_TRIGGERS_SQL = """
+DROP TRIGGER IF EXISTS message_seq_trigger ON "Message";
+DROP FUNCTION IF EXISTS message_seq_update();
+"""
+
+# Existing messages, in the order they were sent
+BACKFILL_SQL = """
+UPDATE "Message" SET "seq" = numbered."seq"
+FROM (
+    SELECT "messageId", row_number() OVER (
+        PARTITION BY "applicationId" ORDER BY "date", "messageId"
+    ) AS "seq"
+    FROM "Message"
+) AS numbered
+WHERE "Message"."messageId" = numbered."messageId";
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0007_user_created_at_index'),
+        ('message', '0002_alter_message_application_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['application_id', 'seq'], name='Message_applica_4d1fd2_idx'),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.RunSQL(CREATE_TRIGGERS_SQL, DROP_TRIGGERS_SQL),
+    ]
@@ -27,9 +27,16 @@ class Message(models.Model):
         null=True,
         db_column="replyToId",
     )
+    # Position in the application's change log, bumped on every insert and update
+    # Assigned by a database trigger (see migrations), so every write path keeps it current
+    seq = models.BigIntegerField(default=0, editable=False)
 
     class Meta:
         db_table = "Message"
+        indexes = [
+            # Incremental sync, see utils.utils.get_changes
+            models.Index(fields=["application_id", "seq"]),
+        ]
 
     def __str__(self):
         return str(self.message_id)
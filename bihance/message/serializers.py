@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.utils import timezone
 from rest_framework import serializers
 from utils.utils import detect_extra_fields
@@ -11,6 +12,8 @@ class MessageListInputSerializer(serializers.Serializer):
     # DRF automatically parses
     applicationId = serializers.UUIDField()
     since = serializers.DateTimeField(required=False)
+    # Old response shape, a list of {message, application, reply_to_message, file}
+    legacy = serializers.BooleanField(required=False, default=False)
 
     def validate_since(self, value):
         if value > timezone.now():
@@ -24,6 +27,32 @@ class MessageListInputSerializer(serializers.Serializer):
         return data
 
 
+class MessageSyncInputSerializer(serializers.Serializer):
+    applicationId = serializers.UUIDField()
+    # Seq of the last change seen, 0 for a full sync
+    cursor = serializers.IntegerField(required=False, min_value=0, default=0)
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.MAX_PAGE_SIZE,
+        default=settings.MAX_PAGE_SIZE,
+    )
+
+    def validate(self, data):
+        detect_extra_fields(self.initial_data, self.fields)
+        return data
+
+
+class MessagePollInputSerializer(MessageSyncInputSerializer):
+    # Max seconds to wait for, when there are no changes yet
+    timeout = serializers.IntegerField(
+        required=False,
+        min_value=0,
+        max_value=settings.LONG_POLL_TIMEOUT,
+        default=settings.LONG_POLL_TIMEOUT,
+    )
+
+
 # Takes a model object
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
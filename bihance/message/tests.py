@@ -1,8 +1,18 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
+import asyncio
+import json
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from applications.serializers import ApplicationSerializer
+from bihance.authentication import JWTAuthenticationMiddleware
+from bihance.realtime import get_broker
+from django.core.serializers.json import DjangoJSONEncoder
 from django.test import TestCase
 from files.models import File
+from files.serializers import FileSerializer
 from rest_framework.test import APIClient
 from utils.tests.objects import (
     get_application,
@@ -19,6 +29,7 @@ from utils.tests.utils import (
 from utils.utils import terminate_current_connections
 
 from .models import Message
+from .serializers import MessageSerializer
 
 terminate_current_connections()
 
@@ -86,34 +97,51 @@ class ApplicationsAPITest(TestCase):
     def get_messages(self):
         self.auth_employer()
         data = {"applicationId": self.application.application_id}
-        response = self.client.get(self.base_url, data)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.base_url, data)
         self.assertEqual(response.status_code, 200)
 
-        messages = response.json()
-        self.assertIsInstance(messages, list)
-        self.assertEqual(len(messages), 2)
-
-        for message_info in messages:
-            # Top level fields
-            self.assertIsInstance(message_info, dict)
-            self.assertIn("message", message_info)
-            self.assertIn("application", message_info)
-            self.assertIn("reply_to_message", message_info)
-            self.assertIn("file", message_info)
+        # Application once, Msg 1 once (as a message, and as the message replied to)
+        page = response.json()
+        verify_application_shape(page["application"])
+        self.assertEqual(len(page["messages"]), 2)
+        for message_info in page["messages"]:
+            verify_message_shape(message_info["message"])
+            if message_info["file"]:
+                verify_file_shape(message_info["file"])
 
-            message = message_info["message"]
-            verify_message_shape(message)
+        reply_to_id = str(self.employee_message.message_id)
+        self.assertEqual(list(page["referenced_messages"]), [reply_to_id])
+        verify_message_shape(page["referenced_messages"][reply_to_id])
+        self.assertEqual(page["messages"][1]["message"]["reply_to_id"], reply_to_id)
+        self.assertIsNotNone(page["messages"][1]["file"])
 
-            application = message_info["application"]
-            verify_application_shape(application)
+        # Legacy shape, same content as the serializers
+        response = self.client.get(self.base_url, {**data, "legacy": True})
+        self.assertEqual(response.status_code, 200)
 
-            reply_to_message = message_info["reply_to_message"]
-            if reply_to_message:
-                verify_message_shape(reply_to_message)
+        # Reference output, one serializer per object
+        def serialize(message):
+            file = message.file_set.first()
+            return {
+                "message": MessageSerializer(message).data,
+                "application": ApplicationSerializer(message.application_id).data,
+                "reply_to_message": MessageSerializer(message.reply_to_id).data
+                if message.reply_to_id
+                else None,
+                "file": FileSerializer(file).data if file else None,
+            }
 
-            file = message_info["file"]
-            if file:
-                verify_file_shape(file)
+        messages = Message.objects.order_by("date")
+        self.assertEqual(
+            response.json(),
+            json.loads(
+                json.dumps(
+                    [serialize(message) for message in messages],
+                    cls=DjangoJSONEncoder,
+                )
+            ),
+        )
 
     # PATCH
     def patch_message(self):
@@ -138,3 +166,150 @@ class ApplicationsAPITest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(Message.objects.count(), 2)
         self.assertEqual(File.objects.count(), 0)
+
+    # GET changes
+    def test_sync(self):
+        self.auth_employee()
+        base_params = {"applicationId": self.application.application_id}
+        for content in ["One", "Two", "Three"]:
+            data = {**base_params, "content": content, "hasFile": False}
+            response = self.client.post(self.base_url, data, format="json")
+            self.assertEqual(response.status_code, 200)
+
+        # Full sync, in pages of 2
+        response = self.client.get(f"{self.base_url}sync/", {**base_params, "limit": 2})
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertTrue(result["has_more"])
+        self.assertEqual(len(result["changes"]), 2)
+
+        response = self.client.get(
+            f"{self.base_url}sync/",
+            {**base_params, "limit": 2, "cursor": result["cursor"]},
+        )
+        result = response.json()
+        self.assertFalse(result["has_more"])
+        self.assertEqual(len(result["changes"]), 2)
+        for change_info in result["changes"]:
+            self.assertEqual(change_info["change"], "insert")
+            verify_message_shape(change_info["message"])
+        cursor = result["cursor"]
+
+        # Nothing changed since
+        response = self.client.get(
+            f"{self.base_url}sync/", {**base_params, "cursor": cursor}
+        )
+        result = response.json()
+        self.assertEqual(result, {"changes": [], "cursor": cursor, "has_more": False})
+
+        # Only the edit, the delete and the file attachment are returned
+        first, second, third = Message.objects.filter(
+            content__in=["One", "Two", "Three"]
+        ).order_by("seq")
+        response = self.client.patch(
+            f"{self.base_url}{first.message_id}/",
+            {**base_params, "content": "One (edited)"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.delete(f"{self.base_url}{second.message_id}/")
+        self.assertEqual(response.status_code, 200)
+        File.objects.create(
+            file_key="sync-file",
+            file_url="https://example.com/sync-file",
+            file_name="sync-file",
+            file_type="image/jpeg",
+            file_size=1,
+            associated_type="Message",
+            associated_message=third,
+        )
+
+        # Participants are cached by the requests above, only changes and files are read
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                f"{self.base_url}sync/", {**base_params, "cursor": cursor}
+            )
+        result = response.json()
+        changes = [
+            (change_info["message"]["message_id"], change_info["change"])
+            for change_info in result["changes"]
+        ]
+        self.assertEqual(
+            changes,
+            [
+                (str(first.message_id), "edit"),
+                (str(second.message_id), "delete"),
+                (str(third.message_id), "insert"),
+            ],
+        )
+        self.assertEqual(result["changes"][2]["file"]["file_key"], "sync-file")
+        self.assertEqual(result["changes"][0]["message"]["content"], "One (edited)")
+
+        # Seqs are strictly increasing, within the application
+        seqs = [change_info["seq"] for change_info in result["changes"]]
+        self.assertEqual(seqs, sorted(set(seqs)))
+        self.assertEqual(result["cursor"], seqs[-1])
+
+        # Invalid cursor
+        response = self.client.get(
+            f"{self.base_url}sync/", {**base_params, "cursor": -1}
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def create_message(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Message.objects.create(
+                content="Polled",
+                application_id=self.application,
+                sender_id=self.employee,
+            )
+
+    # GET changes, long polling
+    async def test_poll(self):
+        url = f"{self.base_url}poll/"
+        params = {"applicationId": self.application.application_id}
+        headers = {"Authorization": "Bearer t"}
+
+        with patch.object(
+            JWTAuthenticationMiddleware,
+            "authenticate_credentials",
+            return_value=(self.employer, None),
+        ):
+            # Changes after the cursor are returned at once
+            response = await self.async_client.get(url, params, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            result = json.loads(response.content)
+            self.assertEqual(len(result["changes"]), 1)
+            cursor = result["cursor"]
+
+            # Held until timeout, when nothing changes
+            response = await self.async_client.get(
+                url, {**params, "cursor": cursor, "timeout": 1}, headers=headers
+            )
+            result = json.loads(response.content)
+            self.assertEqual(result["changes"], [])
+            self.assertEqual(result["cursor"], cursor)
+
+            # Woken up by a new message
+            poll = asyncio.create_task(
+                self.async_client.get(
+                    url, {**params, "cursor": cursor, "timeout": 10}, headers=headers
+                )
+            )
+            channel = f"application:{self.application.application_id}"
+            while not get_broker().has_subscribers(channel):
+                await asyncio.sleep(0.01)
+
+            message = await sync_to_async(self.create_message)()
+            response = await asyncio.wait_for(poll, 5)
+            result = json.loads(response.content)
+            self.assertEqual(
+                [
+                    change_info["message"]["message_id"]
+                    for change_info in result["changes"]
+                ],
+                [str(message.message_id)],
+            )
+
+        response = await self.async_client.get(url, params)
+        self.assertEqual(response.status_code, 401)
@@ -1,2 +1,112 @@
+from applications.serializers import ApplicationSerializer
+from bihance.metrics import serialization_timer
+from files.models import File
+from files.serializers import FileSerializer
+from utils.serialization import FieldExtractor
+from utils.utils import get_change_type, get_changes
+
+from .models import Message
+from .serializers import MessageSerializer
+
+
 def is_sender(user, message):
-    return message.sender_id == user
+    return message.sender_id_id == user.id
+
+
+message_extractor = FieldExtractor(MessageSerializer)
+application_extractor = FieldExtractor(ApplicationSerializer)
+file_extractor = FieldExtractor(FileSerializer)
+
+
+# First file (by file key) of every message, as JSON objects by message id
+# In one query
+def get_file_by_message(messages):
+    files = (
+        File.objects.filter(associated_message__in=[m.message_id for m in messages])
+        .order_by("associated_message", "file_key")
+        .distinct("associated_message")
+        .values(*file_extractor.attnames, "associated_message_id")
+    )
+    return {
+        row["associated_message_id"]: file_extractor.from_values(row) for row in files
+    }
+
+
+# Parse a page of Message model objects, of a single application, into a JSON object
+# The application is embedded once, and every replied to message once
+# Replied to messages must be select_related
+@serialization_timer
+def to_page_json_object(application, messages):
+    file_by_message = get_file_by_message(messages)
+
+    result = []
+    referenced_messages = {}
+    for message in messages:
+        reply_to_id = message.reply_to_id_id
+        if reply_to_id and str(reply_to_id) not in referenced_messages:
+            referenced_messages[str(reply_to_id)] = message_extractor.from_instance(
+                message.reply_to_id
+            )
+
+        result.append(
+            {
+                "message": message_extractor.from_instance(message),
+                "file": file_by_message.get(message.message_id),
+            }
+        )
+
+    return {
+        "application": application_extractor.from_instance(application),
+        "messages": result,
+        "referenced_messages": referenced_messages,
+    }
+
+
+# Same page, in the legacy shape: one object per message, each with its own copies
+@serialization_timer
+def to_legacy_json_objects(application, messages):
+    file_by_message = get_file_by_message(messages)
+    application_data = application_extractor.from_instance(application)
+
+    return [
+        {
+            "message": message_extractor.from_instance(message),
+            "application": application_data,
+            "reply_to_message": (
+                message_extractor.from_instance(message.reply_to_id)
+                if message.reply_to_id_id
+                else None
+            ),
+            "file": file_by_message.get(message.message_id),
+        }
+        for message in messages
+    ]
+
+
+# Parse changed Message model objects into JSON objects, for messages/sync
+# One query for the files of all messages
+@serialization_timer
+def to_change_json_objects(messages):
+    file_by_message = get_file_by_message(messages)
+
+    return [
+        {
+            "change": get_change_type(message),
+            "seq": message.seq,
+            "message": message_extractor.from_instance(message),
+            "file": file_by_message.get(message.message_id),
+        }
+        for message in messages
+    ]
+
+
+# Response body of messages/sync and messages/poll
+def get_sync_data(application_id, cursor, limit):
+    messages, cursor, has_more = get_changes(
+        Message.objects.filter(application_id=application_id), cursor, limit
+    )
+    return {
+        "changes": to_change_json_objects(messages),
+        "cursor": cursor,
+        "has_more": has_more,
+    }
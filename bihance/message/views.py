@@ -1,12 +1,18 @@
-from django.http import HttpResponse, JsonResponse
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
 from django.utils import timezone
+from django.views.decorators.http import require_GET
 from rest_framework import permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import AuthenticationFailed
 
 from applications.models import Application
-from applications.serializers import ApplicationSerializer
+from bihance.authorization import get_participants
+from bihance.realtime import authenticate, get_channels, wait_for_changes
 from files.models import File
-from files.serializers import FileSerializer
+from utils.renderers import JsonResponse
 from utils.utils import (
+    is_asgi,
     is_employee,
     is_employee_in_application,
     is_employer,
@@ -19,9 +25,15 @@ from .serializers import (
     MessageCreateInputSerializer,
     MessageListInputSerializer,
     MessagePartialUpdateInputSerializer,
-    MessageSerializer,
+    MessagePollInputSerializer,
+    MessageSyncInputSerializer,
+)
+from .utils import (
+    get_sync_data,
+    is_sender,
+    to_legacy_json_objects,
+    to_page_json_object,
 )
-from .utils import is_sender
 
 
 class MessageViewSet(viewsets.ModelViewSet):
@@ -41,6 +53,8 @@ class MessageViewSet(viewsets.ModelViewSet):
                 return MessageCreateInputSerializer
             case "partial_update":
                 return MessagePartialUpdateInputSerializer
+            case "sync":
+                return MessageSyncInputSerializer
             case _:
                 raise ValueError("Failed to get valid input serializer class.")
 
@@ -58,7 +72,10 @@ class MessageViewSet(viewsets.ModelViewSet):
 
         # Try to retrieve the application
         try:
-            application = Application.objects.get(application_id=application_id)
+            # Participants are joined, for the user verification below
+            application = Application.objects.select_related(
+                "employee_id", "employer_id"
+            ).get(application_id=application_id)
         except Application.DoesNotExist:
             return HttpResponse(
                 f"Application with {application_id} does not exist.", status=400
@@ -79,8 +96,7 @@ class MessageViewSet(viewsets.ModelViewSet):
 
         # Retrive messages
         messages = (
-            Message.objects.prefetch_related("file_set")
-            .select_related("application_id", "reply_to_id")
+            Message.objects.select_related("reply_to_id")
             .filter(application_id=application_id)
             .order_by("date")
         )
@@ -89,31 +105,52 @@ class MessageViewSet(viewsets.ModelViewSet):
             messages = messages.filter(date__gte=since)
 
         # Construct response
-        response = []
-        for message in messages:
-            message_serializer = MessageSerializer(message)
-            application_serializer = ApplicationSerializer(message.application_id)
+        messages = list(messages)
+        if validated_data["legacy"]:
+            return JsonResponse(
+                to_legacy_json_objects(application, messages), safe=False
+            )
 
-            data = {
-                "message": message_serializer.data,
-                "application": application_serializer.data,
-            }
+        # Application and replied to messages are embedded once
+        return JsonResponse(to_page_json_object(application, messages))
 
-            if message.reply_to_id:
-                reply_to_message_serializer = MessageSerializer(message.reply_to_id)
-                data["reply_to_message"] = reply_to_message_serializer.data
-            else:
-                data["reply_to_message"] = None
+    # Inserts, edits and deletes after a cursor, oldest first
+    # Clients upsert the messages by message_id, then sync again from the returned cursor
+    # GET -> messages/sync
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        # Input validation
+        input_serializer_class = self.get_input_serializer_class()
+        input_serializer = input_serializer_class(data=request.query_params)
+        if not input_serializer.is_valid():
+            return HttpResponse(input_serializer.errors, status=400)
 
-            if message.file_set.first():
-                file_serializer = FileSerializer(message.file_set.first())
-                data["file"] = file_serializer.data
-            else:
-                data["file"] = None
+        validated_data = input_serializer.validated_data
+        application_id = validated_data["applicationId"]
 
-            response.append(data)
+        # Try to retrieve the application's participants (cached)
+        participants = get_participants(application_id)
+        if participants is None:
+            return HttpResponse(
+                f"Application with {application_id} does not exist.", status=400
+            )
 
-        return JsonResponse(response, safe=False)
+        # User verification
+        employee_id, employer_id = participants
+        if is_employee(request.user) and request.user.id != employee_id:
+            return HttpResponse(
+                "Employee is not involved in this application.", status=400
+            )
+        if is_employer(request.user) and request.user.id != employer_id:
+            return HttpResponse(
+                "Employer is not involved in this application.", status=400
+            )
+
+        # Retrieve changes
+        data = get_sync_data(
+            application_id, validated_data["cursor"], validated_data["limit"]
+        )
+        return JsonResponse(data)
 
     # POST -> messages/
     def create(self, request):
@@ -128,27 +165,21 @@ class MessageViewSet(viewsets.ModelViewSet):
             validated_data, self.input_field_to_model_field_mapping
         )
 
-        # Try to retrieve the application
-        try:
-            application = Application.objects.get(
-                application_id=processed_data["application_id"]
-            )
-        except Application.DoesNotExist:
+        # Try to retrieve the application's participants (cached)
+        participants = get_participants(processed_data["application_id"])
+        if participants is None:
             return HttpResponse(
                 f"Application with {processed_data['application_id']} does not exist.",
                 status=400,
             )
 
         # User verification
-        if is_employee(request.user) and not is_employee_in_application(
-            request.user, application
-        ):
+        employee_id, employer_id = participants
+        if is_employee(request.user) and request.user.id != employee_id:
             return HttpResponse(
                 "Employee is not involved in this application.", status=400
             )
-        if is_employer(request.user) and not is_employer_in_application(
-            request.user, application
-        ):
+        if is_employer(request.user) and request.user.id != employer_id:
             return HttpResponse(
                 "Employer is not involved in this application.", status=400
             )
@@ -166,7 +197,8 @@ class MessageViewSet(viewsets.ModelViewSet):
                 )
 
         # Create the message record
-        processed_data["application_id"] = application
+        # By application id, the application itself was never fetched
+        processed_data["application_id_id"] = processed_data.pop("application_id")
         processed_data["sender_id"] = request.user
         message = Message.objects.create(**processed_data)
         message_id = message.message_id
@@ -188,12 +220,9 @@ class MessageViewSet(viewsets.ModelViewSet):
             validated_data, self.input_field_to_model_field_mapping
         )
 
-        # Try to retrieve the application
-        try:
-            application = Application.objects.get(
-                application_id=processed_data["application_id"]
-            )
-        except Application.DoesNotExist:
+        # Try to retrieve the application's participants (cached)
+        participants = get_participants(processed_data["application_id"])
+        if participants is None:
             return HttpResponse(
                 f"Application with {processed_data['application_id']} does not exist.",
                 status=400,
@@ -206,15 +235,12 @@ class MessageViewSet(viewsets.ModelViewSet):
             return HttpResponse("Message to be edited not found.", status=404)
 
         # User verification
-        if is_employee(request.user) and not is_employee_in_application(
-            request.user, application
-        ):
+        employee_id, employer_id = participants
+        if is_employee(request.user) and request.user.id != employee_id:
             return HttpResponse(
                 "Employee is not involved in this application.", status=400
             )
-        if is_employer(request.user) and not is_employer_in_application(
-            request.user, application
-        ):
+        if is_employer(request.user) and request.user.id != employer_id:
             return HttpResponse(
                 "Employer is not involved in this application.", status=400
             )
@@ -237,24 +263,18 @@ class MessageViewSet(viewsets.ModelViewSet):
         except Message.DoesNotExist:
             return HttpResponse("Message to be deleted not found.", status=404)
 
-        # Try to retrieve the application
-        try:
-            application = Application.objects.get(
-                application_id=message.application_id.application_id
-            )
-        except Application.DoesNotExist:
+        # Try to retrieve the application's participants (cached)
+        participants = get_participants(message.application_id_id)
+        if participants is None:
             return HttpResponse("Application does not exist.", status=400)
 
         # User verification
-        if is_employee(request.user) and not is_employee_in_application(
-            request.user, application
-        ):
+        employee_id, employer_id = participants
+        if is_employee(request.user) and request.user.id != employee_id:
             return HttpResponse(
                 "Employee is not involved in this application.", status=400
             )
-        if is_employer(request.user) and not is_employer_in_application(
-            request.user, application
-        ):
+        if is_employer(request.user) and request.user.id != employer_id:
             return HttpResponse("Employer is not involved in this application.")
         if not is_sender(request.user, message):
             return HttpResponse("User is not the message sender.", status=400)
@@ -269,3 +289,39 @@ class MessageViewSet(viewsets.ModelViewSet):
         associated_files.delete()
 
         return HttpResponse("Message successfully deleted.", status=200)
+
+
+# Long-poll variant of MessageViewSet.sync, for clients that cannot hold an event stream
+# Held by the event loop until a change after the cursor is committed, or timeout seconds
+# Needs ASGI, under WSGI it is answered at once (like sync) rather than holding a worker
+# GET -> messages/poll
+@require_GET
+async def poll_messages(request):
+    # Input validation
+    input_serializer = MessagePollInputSerializer(data=request.GET)
+    if not input_serializer.is_valid():
+        return HttpResponse(input_serializer.errors, status=400)
+
+    validated_data = input_serializer.validated_data
+    application_id = validated_data["applicationId"]
+
+    # User verification
+    try:
+        user = await sync_to_async(authenticate)(request)
+    except AuthenticationFailed as e:
+        return HttpResponse(e.detail, status=401)
+
+    channels = await sync_to_async(get_channels)(user, [application_id], [])
+    if channels is None:
+        return HttpResponse("User is not involved in this application.", status=400)
+
+    # Wait for changes
+    timeout = validated_data["timeout"] if is_asgi(request) else 0
+    data = await wait_for_changes(
+        channels,
+        lambda: get_sync_data(
+            application_id, validated_data["cursor"], validated_data["limit"]
+        ),
+        timeout,
+    )
+    return JsonResponse(data)
@@ -0,0 +1,42 @@
+# Generated by Django 5.2 on 2026-10-18 10:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+# Counts of the existing votes and comments
+BACKFILL_SQL = """
+UPDATE "Suggestion" SET
+    "voteCount" = (
+        SELECT count(*) FROM "Suggestion_Vote"
+        WHERE "Suggestion_Vote"."suggestionId" = "Suggestion"."suggestionId"
+    ),
+    "commentCount" = (
+        SELECT count(*) FROM "Suggestion_Comment"
+        WHERE "Suggestion_Comment"."suggestionId" = "Suggestion"."suggestionId"
+    );
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suggestions', '0002_alter_suggestion_author_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suggestion',
+            name='comment_count',
+            field=models.IntegerField(db_column='commentCount', default=0),
+        ),
+        migrations.AddField(
+            model_name='suggestion',
+            name='vote_count',
+            field=models.IntegerField(db_column='voteCount', default=0),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='suggestion',
+            index=models.Index(fields=['-vote_count', '-created_at'], name='Suggestion_voteCou_a2b7d0_idx'),
+        ),
+    ]
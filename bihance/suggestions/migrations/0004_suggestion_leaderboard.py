@@ -0,0 +1,44 @@
+# Generated by Django 5.2 on 2026-10-18 10:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Standings of the existing users
+BACKFILL_SQL = """
+INSERT INTO "Suggestion_Leaderboard" ("userId", "implementedCount", "voteCount")
+SELECT
+    "User"."userId",
+    (
+        SELECT count(*) FROM "Suggestion"
+        WHERE "Suggestion"."authorId" = "User"."userId" AND "Suggestion"."isUseful"
+    ),
+    (
+        SELECT count(*) FROM "Suggestion_Vote"
+        WHERE "Suggestion_Vote"."userId" = "User"."userId"
+    )
+FROM "User";
+"""
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0007_user_created_at_index'),
+        ('suggestions', '0003_suggestion_counts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SuggestionLeaderboard',
+            fields=[
+                ('user_id', models.OneToOneField(db_column='userId', on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('implemented_count', models.IntegerField(db_column='implementedCount', default=0)),
+                ('vote_count', models.IntegerField(db_column='voteCount', default=0)),
+            ],
+            options={
+                'db_table': 'Suggestion_Leaderboard',
+                'indexes': [models.Index(fields=['-implemented_count', 'user_id'], name='Suggestion__impleme_f7f461_idx'), models.Index(fields=['-vote_count', 'user_id'], name='Suggestion__voteCou_3293ab_idx')],
+            },
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 10:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('suggestions', '0004_suggestion_leaderboard'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='suggestion',
+            name='trending_score',
+            field=models.FloatField(db_column='trendingScore', default=0),
+        ),
+        migrations.AddIndex(
+            model_name='suggestion',
+            index=models.Index(fields=['-trending_score', '-created_at'], name='Suggestion_trendin_6d6bba_idx'),
+        ),
+    ]
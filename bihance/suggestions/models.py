@@ -2,6 +2,8 @@ import uuid
 
 from applications.models import User
 from django.db import models
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
 
@@ -16,8 +18,20 @@ class Suggestion(models.Model):
     author_id = models.ForeignKey(User, on_delete=models.CASCADE, db_column="authorId")
     is_useful = models.BooleanField(db_column="isUseful", default=False)
 
+    # Maintained by the vote and comment endpoints (see suggestions/utils.py)
+    vote_count = models.IntegerField(db_column="voteCount", default=0)
+    comment_count = models.IntegerField(db_column="commentCount", default=0)
+    # Recent votes and comments, decayed by age (see refresh_trending_scores)
+    trending_score = models.FloatField(db_column="trendingScore", default=0)
+
     class Meta:
         db_table = "Suggestion"
+        indexes = [
+            # Sorting by most-voted
+            models.Index(fields=["-vote_count", "-created_at"]),
+            # Sorting by trending
+            models.Index(fields=["-trending_score", "-created_at"]),
+        ]
 
     def __str__(self):
         return str(self.suggestion_id)
@@ -53,3 +67,33 @@ class SuggestionVote(models.Model):
 
     def __str__(self):
         return str(self.vote_id)
+
+
+# Leaderboard standing of every user, kept up to date by vote and mark_implemented
+# So that leaderboards are read off an index, instead of counting every user's rows
+class SuggestionLeaderboard(models.Model):
+    user_id = models.OneToOneField(
+        User, primary_key=True, on_delete=models.CASCADE, db_column="userId"
+    )
+    # Suggestions authored by the user, that were implemented
+    implemented_count = models.IntegerField(db_column="implementedCount", default=0)
+    # Votes cast by the user
+    vote_count = models.IntegerField(db_column="voteCount", default=0)
+
+    class Meta:
+        db_table = "Suggestion_Leaderboard"
+        indexes = [
+            models.Index(fields=["-implemented_count", "user_id"]),
+            models.Index(fields=["-vote_count", "user_id"]),
+        ]
+
+    def __str__(self):
+        return str(self.user_id_id)
+
+
+# Every user is on the leaderboard, from the start
+# Users created in bulk (eg: generate-dataset) are added by reconcile_leaderboard
+@receiver(post_save, sender=User)
+def create_leaderboard_entry(sender, instance, created, **kwargs):
+    if created:
+        SuggestionLeaderboard.objects.get_or_create(user_id=instance)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 from utils.utils import detect_extra_fields
 
@@ -42,7 +43,14 @@ class SuggestionVoteSerializer(serializers.ModelSerializer):
 
 class SuggestionListInputSerializer(serializers.Serializer):
     sortBy = serializers.ChoiceField(
-        choices=["newest", "oldest", "most-voted", "implemented", "pending"],
+        choices=[
+            "newest",
+            "oldest",
+            "most-voted",
+            "trending",
+            "implemented",
+            "pending",
+        ],
         default="newest",
     )
     searchQuery = serializers.CharField(required=False)
@@ -58,6 +66,14 @@ class SuggestionLeaderboardInputSerializer(serializers.Serializer):
         default="most-implemented",
     )
     searchQuery = serializers.CharField(required=False)
+    # Top-N paging, eg: limit=10&offset=10 for ranks 11 to 20
+    limit = serializers.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=settings.MAX_PAGE_SIZE,
+        default=settings.MAX_PAGE_SIZE,
+    )
+    offset = serializers.IntegerField(required=False, min_value=0, default=0)
 
     def validate(self, data):
         detect_extra_fields(self.initial_data, self.fields)
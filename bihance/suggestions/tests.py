@@ -1,7 +1,14 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
+import json
+from datetime import timedelta
+
+from applications.models import User
+from applications.serializers import UserSerializer
+from django.core.serializers.json import DjangoJSONEncoder
 from django.test import TestCase
+from django.utils import timezone
 from rest_framework.test import APIClient
 from utils.tests.objects import (
     create_employee_suggestion,
@@ -16,7 +23,8 @@ from utils.tests.utils import (
 )
 from utils.utils import terminate_current_connections
 
-from .models import Suggestion
+from .models import Suggestion, SuggestionLeaderboard, SuggestionVote
+from .utils import reconcile_counts, reconcile_leaderboard, refresh_trending_scores
 
 terminate_current_connections()
 
@@ -55,6 +63,150 @@ class SuggestionsAPITest(TestCase):
         self.get_suggestions()
         self.get_leaderboards()
 
+    # Counters follow votes and comments, and can be recounted
+    def test_counts(self):
+        suggestion = Suggestion.objects.get()
+        vote_url = f"{self.base_url}{suggestion.suggestion_id}/vote/"
+        comment_url = f"{self.base_url}{suggestion.suggestion_id}/comment/"
+
+        self.auth_employee()
+        self.client.post(vote_url)
+        self.client.post(comment_url, {"content": "One"}, format="json")
+        self.client.post(comment_url, {"content": "Two"}, format="json")
+        self.auth_employer()
+        self.client.post(vote_url)
+        suggestion.refresh_from_db()
+        self.assertEqual((suggestion.vote_count, suggestion.comment_count), (2, 2))
+
+        # Voting again takes the vote back
+        self.client.post(vote_url)
+        suggestion.refresh_from_db()
+        self.assertEqual((suggestion.vote_count, suggestion.comment_count), (1, 2))
+
+        # Drifted counters (eg: votes deleted with their user) are fixed
+        SuggestionVote.objects.all().delete()
+        self.assertEqual(reconcile_counts(), 1)
+        self.assertEqual(reconcile_counts(), 0)
+        suggestion.refresh_from_db()
+        self.assertEqual((suggestion.vote_count, suggestion.comment_count), (0, 2))
+
+    # Leaderboard entries follow votes and implemented suggestions
+    def test_leaderboard(self):
+        suggestion = Suggestion.objects.get()
+        self.auth_employer()
+        self.client.post(f"{self.base_url}{suggestion.suggestion_id}/vote/")
+        self.auth_employee()
+        self.client.post(f"{self.base_url}{suggestion.suggestion_id}/mark_implemented/")
+        # Marking again does not count twice
+        self.client.post(f"{self.base_url}{suggestion.suggestion_id}/mark_implemented/")
+
+        def get_leaderboard(**query_params):
+            with self.assertNumQueries(1):
+                response = self.client.get(
+                    f"{self.base_url}leaderboards/", query_params
+                )
+            self.assertEqual(response.status_code, 200)
+            return [
+                (user_info["id"], user_info.get("implemented_count"))
+                for user_info in response.json()
+            ]
+
+        employee_id, employer_id = str(self.employee.id), str(self.employer.id)
+        self.assertEqual(get_leaderboard(), [(employee_id, 1), (employer_id, 0)])
+        self.assertEqual(get_leaderboard(limit=1, offset=1), [(employer_id, 0)])
+
+        # Same user fields as the UserSerializer
+        response = self.client.get(
+            f"{self.base_url}leaderboards/", {"sortBy": "newest-member", "limit": 1}
+        )
+        newest_member = User.objects.order_by("-created_at").first()
+        self.assertEqual(
+            response.json()[0],
+            json.loads(
+                json.dumps(UserSerializer(newest_member).data, cls=DjangoJSONEncoder)
+            ),
+        )
+        response = self.client.get(
+            f"{self.base_url}leaderboards/", {"sortBy": "most-votes"}
+        )
+        self.assertEqual(
+            [
+                (user_info["id"], user_info["vote_count"])
+                for user_info in response.json()
+            ],
+            [(employer_id, 1), (employee_id, 0)],
+        )
+
+        # Already up to date, until it drifts
+        self.assertEqual(reconcile_leaderboard(), 0)
+        SuggestionLeaderboard.objects.filter(user_id=self.employer).delete()
+        self.assertEqual(reconcile_leaderboard(), 1)
+        self.assertEqual(
+            SuggestionLeaderboard.objects.get(user_id=self.employer).vote_count, 1
+        )
+
+    # Recent votes outrank older ones, once scores are refreshed
+    def test_trending(self):
+        old_suggestion = Suggestion.objects.get()
+        new_suggestion = Suggestion.objects.create(
+            title="Trending", content="Fresh", author_id=self.employer
+        )
+        now = timezone.now()
+        for user in [self.employee, self.employer]:
+            SuggestionVote.objects.create(
+                user_id=user,
+                suggestion_id=old_suggestion,
+                created_at=now - timedelta(days=3),
+            )
+        SuggestionVote.objects.create(
+            user_id=self.employee, suggestion_id=new_suggestion, created_at=now
+        )
+        reconcile_counts()
+
+        self.assertEqual(refresh_trending_scores(now), 2)
+        self.assertEqual(refresh_trending_scores(now), 0)
+        new_suggestion.refresh_from_db()
+        self.assertAlmostEqual(new_suggestion.trending_score, 1.0)
+
+        def get_suggestion_ids(sort_by):
+            response = self.client.get(self.base_url, {"sortBy": sort_by})
+            self.assertEqual(response.status_code, 200)
+            return [
+                suggestion_info["suggestion"]["suggestion_id"]
+                for suggestion_info in response.json()
+            ]
+
+        self.auth_employee()
+        old_id, new_id = (
+            str(old_suggestion.suggestion_id),
+            str(new_suggestion.suggestion_id),
+        )
+        self.assertEqual(get_suggestion_ids("most-voted"), [old_id, new_id])
+        self.assertEqual(get_suggestion_ids("trending"), [new_id, old_id])
+
+    # Votes and comments refresh the score of their suggestion at once
+    def test_trending_on_activity(self):
+        suggestion = Suggestion.objects.get()
+        self.auth_employer()
+        response = self.client.post(f"{self.base_url}{suggestion.suggestion_id}/vote/")
+        self.assertEqual(response.status_code, 200)
+        suggestion.refresh_from_db()
+        self.assertAlmostEqual(suggestion.trending_score, 1.0, places=3)
+
+        response = self.client.post(
+            f"{self.base_url}{suggestion.suggestion_id}/comment/",
+            {"content": "Agreed"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        suggestion.refresh_from_db()
+        self.assertAlmostEqual(suggestion.trending_score, 1.5, places=3)
+
+        # Withdrawn votes no longer count
+        self.client.post(f"{self.base_url}{suggestion.suggestion_id}/vote/")
+        suggestion.refresh_from_db()
+        self.assertAlmostEqual(suggestion.trending_score, 0.5, places=3)
+
     # POST
     def create_suggestion(self):
         # Create suggestion 2 (note: 1 & 2 are both made by the employee)
@@ -202,7 +354,7 @@ class SuggestionsAPITest(TestCase):
         )
         self.assertEqual(response.status_code, 200)
 
-        leaderboards_info = response.json()
+        leaderboards_info = json.loads(response.getvalue())
         self.assertIsInstance(leaderboards_info, list)
         self.assertEqual(len(leaderboards_info), 2)
 
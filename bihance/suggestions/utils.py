@@ -1,5 +1,31 @@
+from datetime import timedelta
+
+from applications.models import User
 from applications.serializers import UserSerializer
+from bihance.metrics import serialization_timer
+from django.conf import settings
+from django.db.models import (
+    Count,
+    DateTimeField,
+    DurationField,
+    ExpressionWrapper,
+    F,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce, Extract, Power
+from django.utils import timezone
+from utils.serialization import FieldExtractor
 
+from .models import (
+    Suggestion,
+    SuggestionComment,
+    SuggestionLeaderboard,
+    SuggestionVote,
+)
 from .serializers import (
     SuggestionCommentSerializer,
     SuggestionSerializer,
@@ -7,6 +33,165 @@ from .serializers import (
 )
 
 
+# Adds to the counters of a suggestion, eg: add_to_counts(suggestion_id, vote_count=1)
+# Done by the database (UPDATE ... SET "voteCount" = "voteCount" + 1)
+# So that concurrent votes and comments never overwrite each other
+# Returns the number of suggestions updated, 0 if it does not exist
+def add_to_counts(suggestion_id, **deltas):
+    return Suggestion.objects.filter(suggestion_id=suggestion_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+
+# Number of rows of queryset, whose field points to the outer row's outer_field
+def get_count_subquery(queryset, field, outer_field):
+    counts = (
+        queryset.filter(**{field: OuterRef(outer_field)})
+        .order_by()
+        .values(field)
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+# Recounts the votes and comments of every suggestion
+# Fixes counters that drifted, eg: after votes were deleted along with their user
+# Returns the number of suggestions that were fixed
+def reconcile_counts():
+    vote_count = get_count_subquery(
+        SuggestionVote.objects.all(), "suggestion_id", "suggestion_id"
+    )
+    comment_count = get_count_subquery(
+        SuggestionComment.objects.all(), "suggestion_id", "suggestion_id"
+    )
+    return (
+        Suggestion.objects.annotate(
+            actual_vote_count=vote_count, actual_comment_count=comment_count
+        )
+        .filter(
+            ~Q(vote_count=F("actual_vote_count"))
+            | ~Q(comment_count=F("actual_comment_count"))
+        )
+        .update(vote_count=vote_count, comment_count=comment_count)
+    )
+
+
+# Adds to the leaderboard entry of a user, eg: add_to_leaderboard(user_id, vote_count=1)
+# Call once the vote (or implemented suggestion) itself has been written
+def add_to_leaderboard(user_id, **deltas):
+    updated_count = SuggestionLeaderboard.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta for field, delta in deltas.items()}
+    )
+
+    # No entry yet, counted from scratch instead
+    if not updated_count:
+        reconcile_leaderboard([user_id])
+
+
+# Implemented suggestions and votes of the outer row's user
+def get_leaderboard_counts(outer_field):
+    return {
+        "implemented_count": get_count_subquery(
+            Suggestion.objects.filter(is_useful=True), "author_id", outer_field
+        ),
+        "vote_count": get_count_subquery(
+            SuggestionVote.objects.all(), "user_id", outer_field
+        ),
+    }
+
+
+# Recounts the leaderboard entries of the given users (or of every user)
+# Adds the users that have no entry yet, and fixes entries that drifted
+# Returns the number of entries that were added or fixed
+def reconcile_leaderboard(user_ids=None):
+    users = User.objects.all()
+    entries = SuggestionLeaderboard.objects.all()
+    if user_ids is not None:
+        users = users.filter(id__in=user_ids)
+        entries = entries.filter(user_id__in=user_ids)
+
+    # Entries that drifted
+    counts = get_leaderboard_counts("user_id")
+    fixed_count = (
+        entries.annotate(
+            actual_implemented_count=counts["implemented_count"],
+            actual_vote_count=counts["vote_count"],
+        )
+        .filter(
+            ~Q(implemented_count=F("actual_implemented_count"))
+            | ~Q(vote_count=F("actual_vote_count"))
+        )
+        .update(**counts)
+    )
+
+    # Users without an entry, already counted
+    missing_users = (
+        users.filter(suggestionleaderboard__isnull=True)
+        .annotate(**get_leaderboard_counts("id"))
+        .values_list("id", "implemented_count", "vote_count")
+    )
+    created = SuggestionLeaderboard.objects.bulk_create(
+        [
+            SuggestionLeaderboard(
+                user_id_id=user_id,
+                implemented_count=implemented_count,
+                vote_count=vote_count,
+            )
+            for user_id, implemented_count, vote_count in missing_users.iterator()
+        ],
+        batch_size=settings.STREAM_CHUNK_SIZE,
+        ignore_conflicts=True,
+    )
+    return fixed_count + len(created)
+
+
+# Sum of weight * 0.5 ^ (age / TRENDING_HALF_LIFE), over the rows of model
+# That point to the outer suggestion, and are at most TRENDING_WINDOW old
+def get_trending_subquery(model, weight, now):
+    age = Extract(
+        ExpressionWrapper(
+            Value(now, output_field=DateTimeField()) - F("created_at"),
+            output_field=DurationField(),
+        ),
+        "epoch",
+    )
+    decay = Power(Value(0.5), age / Value(float(settings.TRENDING_HALF_LIFE)))
+    scores = (
+        model.objects.filter(
+            suggestion_id=OuterRef("suggestion_id"),
+            created_at__gte=now - timedelta(seconds=settings.TRENDING_WINDOW),
+        )
+        .order_by()
+        .values("suggestion_id")
+        .annotate(score=Sum(decay))
+        .values("score")
+    )
+    return Coalesce(Subquery(scores), Value(0.0)) * Value(weight)
+
+
+# Recomputes the trending_score of the given suggestions (or of every suggestion)
+# Votes and comments refresh their own suggestion, the refresh-trending-scores worker
+# Decays every score periodically
+# Suggestions whose score did not change (eg: no recent activity) are left alone
+# Returns the number of suggestions updated
+def refresh_trending_scores(now=None, suggestion_ids=None):
+    now = now or timezone.now()
+    trending_score = get_trending_subquery(
+        SuggestionVote, settings.TRENDING_VOTE_WEIGHT, now
+    ) + get_trending_subquery(SuggestionComment, settings.TRENDING_COMMENT_WEIGHT, now)
+
+    suggestions = Suggestion.objects.all()
+    if suggestion_ids is not None:
+        suggestions = suggestions.filter(suggestion_id__in=suggestion_ids)
+    return (
+        suggestions.annotate(new_trending_score=trending_score)
+        .filter(~Q(trending_score=F("new_trending_score")))
+        .update(trending_score=trending_score)
+    )
+
+
+@serialization_timer
 def to_json_object_base(suggestion):
     suggestion_serializer = SuggestionSerializer(suggestion)
     suggestion_data = {
@@ -20,6 +205,7 @@ def to_json_object_base(suggestion):
     return data
 
 
+@serialization_timer
 def to_json_object_list(suggestion):
     data = to_json_object_base(suggestion)
     associated_votes = suggestion.suggestionvote_set.all()
@@ -32,6 +218,7 @@ def to_json_object_list(suggestion):
     return data
 
 
+@serialization_timer
 def to_json_object_retrieve(suggestion):
     data = to_json_object_list(suggestion)
     associated_comments = suggestion.suggestioncomment_set.all()
@@ -44,13 +231,10 @@ def to_json_object_retrieve(suggestion):
     return data
 
 
-def to_json_object_leaderboard(user):
-    user_serializer = UserSerializer(user)
-    data = {**user_serializer.data}
-    if hasattr(user, "implemented_count"):
-        data["implemented_count"] = user.implemented_count
+user_extractor = FieldExtractor(UserSerializer)
 
-    if hasattr(user, "vote_count"):
-        data["vote_count"] = user.vote_count
 
-    return data
+# Counts are the ones shown for the leaderboard, eg: implemented_count=3
+@serialization_timer
+def to_json_object_leaderboard(user, **counts):
+    return {**user_extractor.from_instance(user), **counts}
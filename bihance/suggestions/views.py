@@ -1,10 +1,16 @@
-from applications.models import User
-from django.db.models import Count, Q
-from django.http import HttpResponse, JsonResponse
+from django.db import transaction
+from django.db.models import Q
+from django.http import HttpResponse
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
+from utils.renderers import JsonResponse
 
-from .models import Suggestion, SuggestionComment, SuggestionVote
+from .models import (
+    Suggestion,
+    SuggestionComment,
+    SuggestionLeaderboard,
+    SuggestionVote,
+)
 from .serializers import (
     SuggestionCommentInputSerializer,
     SuggestionCreateInputSerializer,
@@ -12,6 +18,9 @@ from .serializers import (
     SuggestionListInputSerializer,
 )
 from .utils import (
+    add_to_counts,
+    add_to_leaderboard,
+    refresh_trending_scores,
     to_json_object_leaderboard,
     to_json_object_list,
     to_json_object_retrieve,
@@ -20,15 +29,9 @@ from .utils import (
 
 class SuggestionsViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
-    base_queryset = (
-        Suggestion.objects.select_related("author_id")
-        # Annotate each suggestion with vote_count
-        # Which is the number of votes, derived from "SuggestionVote" model
-        .annotate(vote_count=Count("suggestionvote", distinct=True))
-        # Annotate each suggestion with comment_count
-        # Which is the number of comments, derived from "SuggestionComment" model
-        .annotate(comment_count=Count("suggestioncomment", distinct=True))
-    )
+    # Suggestions hold their own vote_count and comment_count
+    # Kept up to date by vote and comment, no need to count the votes and comments
+    base_queryset = Suggestion.objects.select_related("author_id")
 
     # GET multiple -> suggestions/
     def list(self, request):
@@ -57,7 +60,11 @@ class SuggestionsViewSet(viewsets.ModelViewSet):
             case "oldest":
                 queryset = queryset.order_by("created_at")
             case "most-voted":
-                queryset = queryset.order_by("-vote_count")
+                queryset = queryset.order_by("-vote_count", "-created_at")
+
+            # Scores are precomputed (see refresh_trending_scores)
+            case "trending":
+                queryset = queryset.order_by("-trending_score", "-created_at")
 
             # An implemented suggestion has is_useful = True
             # Sorting by -is_useful shows the True ones first
@@ -109,41 +116,30 @@ class SuggestionsViewSet(viewsets.ModelViewSet):
     # POST -> suggestions/:suggestion_id/vote
     @action(detail=True, methods=["post"])
     def vote(self, request, pk=None):
-        # Try to retrieve the suggestion record
-        try:
-            suggestion = self.base_queryset.get(suggestion_id=pk)
-        except Suggestion.DoesNotExist:
-            return HttpResponse("Suggestion not found,", status=400)
-
-        # Check if vote already exists
-        has_voted = False
-        try:
-            current_vote = SuggestionVote.objects.get(
-                user_id=request.user, suggestion_id=suggestion
-            )
-            has_voted = True
-        except SuggestionVote.DoesNotExist:
-            pass
-
-        # Conditional processing
-        if has_voted:
-            current_vote.delete()
-            return HttpResponse("Vote successfully deleted.", status=200)
-        else:
-            SuggestionVote.objects.create(
-                user_id=request.user, suggestion_id=suggestion
-            )
+        # Votes toggle, the existing vote (if any) is deleted
+        # The vote and the vote_count change together, or not at all
+        with transaction.atomic():
+            deleted_count, _ = SuggestionVote.objects.filter(
+                user_id=request.user, suggestion_id=pk
+            ).delete()
+            if deleted_count:
+                add_to_counts(pk, vote_count=-1)
+                add_to_leaderboard(request.user.id, vote_count=-1)
+                refresh_trending_scores(suggestion_ids=[pk])
+                return HttpResponse("Vote successfully deleted.", status=200)
+
+            # No suggestion record to update, means that it does not exist
+            if not add_to_counts(pk, vote_count=1):
+                return HttpResponse("Suggestion not found,", status=400)
+
+            SuggestionVote.objects.create(user_id=request.user, suggestion_id_id=pk)
+            add_to_leaderboard(request.user.id, vote_count=1)
+            refresh_trending_scores(suggestion_ids=[pk])
             return HttpResponse("Vote successfully created", status=200)
 
     # POST -> suggestions/:suggestion_id/comment
     @action(detail=True, methods=["post"])
     def comment(self, request, pk=None):
-        # Try to retrieve the suggestion record
-        try:
-            suggestion = self.base_queryset.get(suggestion_id=pk)
-        except Suggestion.DoesNotExist:
-            return HttpResponse("Suggestion not found,", status=400)
-
         # Input validation
         input_serializer = SuggestionCommentInputSerializer(data=request.data)
         if not input_serializer.is_valid():
@@ -153,9 +149,15 @@ class SuggestionsViewSet(viewsets.ModelViewSet):
 
         # Create the comment
         content = validated_data["content"]
-        SuggestionComment.objects.create(
-            content=content, author_id=request.user, suggestion_id=suggestion
-        )
+        with transaction.atomic():
+            # No suggestion record to update, means that it does not exist
+            if not add_to_counts(pk, comment_count=1):
+                return HttpResponse("Suggestion not found,", status=400)
+
+            SuggestionComment.objects.create(
+                content=content, author_id=request.user, suggestion_id_id=pk
+            )
+            refresh_trending_scores(suggestion_ids=[pk])
         return HttpResponse("Comment successfully created.", status=200)
 
     # POST -> suggestions/:suggestion_id/mark_implemented
@@ -163,7 +165,7 @@ class SuggestionsViewSet(viewsets.ModelViewSet):
     def mark_implemented(self, request, pk=None):
         # Try to retrieve the suggestion record
         try:
-            suggestion = self.base_queryset.get(suggestion_id=pk)
+            suggestion = Suggestion.objects.get(suggestion_id=pk)
         except Suggestion.DoesNotExist:
             return HttpResponse("Suggestion not found.", status=400)
 
@@ -172,8 +174,13 @@ class SuggestionsViewSet(viewsets.ModelViewSet):
             return HttpResponse("User must be an admin.", status=400)
 
         # Mark suggestion
-        suggestion.is_useful = True
-        suggestion.save()
+        # Only counts towards the author's leaderboard entry the first time
+        with transaction.atomic():
+            marked_count = Suggestion.objects.filter(
+                suggestion_id=pk, is_useful=False
+            ).update(is_useful=True)
+            if marked_count:
+                add_to_leaderboard(suggestion.author_id_id, implemented_count=1)
 
         return HttpResponse(
             "Successfully marked suggestion as implemented.", status=200
@@ -192,34 +199,39 @@ class SuggestionsViewSet(viewsets.ModelViewSet):
         validated_data = input_serializer.data
 
         # Define base queryset
-        queryset = User.objects.all()
+        # Standings are precomputed (see SuggestionLeaderboard), and read off its indexes
+        queryset = SuggestionLeaderboard.objects.select_related("user_id")
 
         # Filter based on search
         search = validated_data.get("searchQuery")
         if search:
             queryset = queryset.filter(
-                Q(first_name__icontains=search) | Q(last_name__icontains=search)
+                Q(user_id__first_name__icontains=search)
+                | Q(user_id__last_name__icontains=search)
             )
 
         # Filter based on sortBy
+        # Only the count that users are ranked by is returned
         sort_by = validated_data["sortBy"]
+        count_field = None
         match sort_by:
             case "most-implemented":
-                queryset = queryset.annotate(
-                    implemented_count=Count(
-                        "suggestion", filter=Q(suggestion__is_useful=True)
-                    )
-                ).order_by("-implemented_count")
+                count_field = "implemented_count"
+                queryset = queryset.order_by("-implemented_count", "user_id")
             case "most-votes":
-                queryset = queryset.annotate(
-                    vote_count=Count("suggestionvote")
-                ).order_by("-vote_count")
+                count_field = "vote_count"
+                queryset = queryset.order_by("-vote_count", "user_id")
             case "newest-member":
-                queryset = queryset.order_by("-created_at")
+                queryset = queryset.order_by("-user_id__created_at", "-user_id")
 
+        # Top limit users, after the first offset ones
+        offset = validated_data["offset"]
+        queryset = queryset[offset : offset + validated_data["limit"]]
+
+        # Get JSON response
         result = []
-        for user in queryset:
-            user_json = to_json_object_leaderboard(user)
-            result.append(user_json)
+        for entry in queryset:
+            counts = {count_field: getattr(entry, count_field)} if count_field else {}
+            result.append(to_json_object_leaderboard(entry.user_id, **counts))
 
         return JsonResponse(result, safe=False)
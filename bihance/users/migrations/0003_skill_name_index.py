@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 09:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_alter_interest_user_id_alter_skill_user_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='skill',
+            index=models.Index(fields=['name', 'user_id'], name='Skill_name_3df165_idx'),
+        ),
+    ]
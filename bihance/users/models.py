@@ -3,6 +3,9 @@ import uuid
 from applications.models import User
 from django.db import models
 
+# Newest users first, ties broken by id
+USER_ORDERING = ["-created_at", "-id"]
+
 
 class Interest(models.Model):
     interest_id = models.UUIDField(
@@ -28,6 +31,10 @@ class Skill(models.Model):
 
     class Meta:
         db_table = "Skill"
+        indexes = [
+            # Skill filters in user search
+            models.Index(fields=["name", "user_id"]),
+        ]
 
     def __str__(self):
         return str(self.skill_id)
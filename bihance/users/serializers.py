@@ -1,3 +1,4 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from utils.utils import detect_extra_fields
@@ -87,10 +88,22 @@ class UserSearchInputSerializer(serializers.Serializer):
         allow_empty=False,
         child=serializers.CharField(),
     )
+    # Users with any of the skills, or with all of them
+    match = serializers.ChoiceField(
+        required=False, choices=["any", "all"], default="any"
+    )
     name = serializers.CharField(required=False)
+    # Either page (offset), or cursor (keyset) pagination
     page = serializers.IntegerField(required=False, min_value=1)
-    limit = serializers.IntegerField(required=False, min_value=1)
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(
+        required=False, min_value=1, max_value=settings.MAX_PAGE_SIZE, default=10
+    )
 
     def validate(self, data):
         detect_extra_fields(self.initial_data, self.fields)
+        if "page" in data and "cursor" in data:
+            raise serializers.ValidationError(
+                "Can either specify page or cursor, but not both."
+            )
         return data
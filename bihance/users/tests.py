@@ -1,6 +1,7 @@
 # Integration testing (models, serializers, utils, views)
 # Negative test cases?
 
+from applications.models import User
 from django.test import TestCase
 from rest_framework.test import APIClient
 from utils.tests.objects import (
@@ -169,3 +170,40 @@ class UsersAPITest(TestCase):
         for skill_group in skill_groups:
             self.assertIn("name", skill_group)
             self.assertIn("count", skill_group)
+
+    # GET multiple -> users/search/, skill matching and cursors
+    def test_search_skills(self):
+        # Employee has Python, C++ and Rust
+        for i, skills in enumerate([["Python"], ["Python", "Rust"], ["Go"]]):
+            user = User.objects.create(
+                first_name=f"User {i}", email=f"user{i}@gmail.com"
+            )
+            for skill in skills:
+                Skill.objects.create(user_id=user, name=skill)
+
+        url = f"{self.base_url}search/"
+        response = self.client.get(url, {"skills": ["Python", "Rust"]})
+        self.assertEqual(response.json()["totalUsers"], 3)
+
+        response = self.client.get(url, {"skills": ["Python", "Rust"], "match": "all"})
+        self.assertEqual(response.json()["totalUsers"], 2)
+
+        # Every user exactly once, page by page
+        # Queries per page do not grow with the number of users
+        user_ids = []
+        next_url = f"{url}?limit=1"
+        while next_url:
+            with self.assertNumQueries(4):
+                response = self.client.get(next_url)
+            self.assertEqual(response.status_code, 200)
+            user_ids.extend(
+                user_info["user"]["id"] for user_info in response.json()["users"]
+            )
+            next_url = response.get("Link", "").split(">")[0].lstrip("<") or None
+
+        self.assertEqual(len(user_ids), 4)
+        self.assertEqual(len(set(user_ids)), 4)
+
+        # Pagination styles cannot be mixed
+        response = self.client.get(url, {"page": 1, "cursor": "abc"})
+        self.assertEqual(response.status_code, 400)
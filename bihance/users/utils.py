@@ -1,11 +1,14 @@
 from applications.models import User
 from applications.serializers import UserSerializer
-from django.core.paginator import Paginator
-from django.db.models import Q
+from bihance.metrics import serialization_timer
+from django.db.models import Exists, OuterRef, Q
+from utils.utils import keyset_paginate
 
+from .models import USER_ORDERING, Skill
 from .serializers import InterestSerializer, SkillSerializer
 
 
+@serialization_timer
 def to_json_object(user):
     user_serializer = UserSerializer(user)
     data = {"user": user_serializer.data}
@@ -27,8 +30,22 @@ def to_json_object(user):
     return data
 
 
-def search_users_with_paginator(skills=[], name="", page=1, limit=10):
-    # Paginate backend model data, for faster (although more fragmented) responses
+# Users with any (or all) of the skills, as EXISTS subqueries on the Skill index
+def get_skills_filter(skills, match="any"):
+    if match == "all":
+        skills_filter = Q()
+        for skill in set(skills):
+            skills_filter &= Exists(
+                Skill.objects.filter(user_id=OuterRef("id"), name=skill)
+            )
+        return skills_filter
+
+    return Q(Exists(Skill.objects.filter(user_id=OuterRef("id"), name__in=skills)))
+
+
+# Returns a tuple of (search result, cursor for the next page or None)
+# Only the requested page is loaded, counting is done by the database
+def search_users(skills=None, match="any", name="", cursor=None, page=None, limit=10):
     try:
         # Build query filters
         filters = Q()
@@ -37,40 +54,23 @@ def search_users_with_paginator(skills=[], name="", page=1, limit=10):
             # Extend the current filter with AND
             filters &= Q(first_name__icontains=name) | Q(last_name__icontains=name)
 
-        # Get queryset
-        queryset = (
-            User.objects.filter(filters)
-            .prefetch_related("interest_set", "skill_set")
-            .order_by("-created_at")
-        )
-
         if skills:
-            # Only keep the users with matching skills
-            # Skills is an array of skill name strings
-            filtered_users = []
-            for user in queryset:
-                has_matching_skill = False
-                for skill in user.skill_set.all():
-                    if skill.name in skills:
-                        has_matching_skill = True
-                        break
-
-                if has_matching_skill:
-                    filtered_users.append(user)
-
-            # Manual pagination, since no longer a queryset :<
-            start = (page - 1) * limit
-            end = start + limit
-            page_users = filtered_users[start:end]
-            total_users = len(filtered_users)
-            total_pages = (total_users + limit - 1) // limit
+            filters &= get_skills_filter(skills, match)
+
+        queryset = User.objects.filter(filters)
+        total_users = queryset.count()
+        total_pages = (total_users + limit - 1) // limit
 
+        queryset = queryset.prefetch_related("interest_set", "skill_set")
+        if page:
+            # Offset pagination, kept for existing clients
+            start = (page - 1) * limit
+            page_users = queryset.order_by(*USER_ORDERING)[start : start + limit]
+            next_cursor = None
         else:
-            # Use Django's Paginator
-            paginator = Paginator(queryset, limit)
-            page_users = paginator.get_page(page)
-            total_users = paginator.count
-            total_pages = paginator.num_pages
+            page_users, next_cursor = keyset_paginate(
+                queryset, USER_ORDERING, cursor, limit
+            )
 
         # Convert page_users to expected format
         users_data = []
@@ -82,7 +82,7 @@ def search_users_with_paginator(skills=[], name="", page=1, limit=10):
             "users": users_data,
             "totalUsers": total_users,
             "totalPages": total_pages,
-        }
+        }, next_cursor
 
     except Exception as error:
         raise Exception(f"Error searching users: {error}")
@@ -1,13 +1,14 @@
 from applications.models import User
 from django.db.models import Count
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse
 from rest_framework import permissions, viewsets
 from rest_framework.decorators import action
-from utils.utils import remap_keys
+from utils.renderers import JsonResponse
+from utils.utils import add_next_page_headers, remap_keys
 
 from .models import Interest, Skill
 from .serializers import UserPartialUpdateInputSerializer, UserSearchInputSerializer
-from .utils import search_users_with_paginator, to_json_object
+from .utils import search_users, to_json_object
 
 
 class UsersViewSet(viewsets.ModelViewSet):
@@ -106,14 +107,17 @@ class UsersViewSet(viewsets.ModelViewSet):
 
         validated_data = input_serializer.validated_data
         skills = validated_data.get("skills")
+        match = validated_data["match"]
         name = validated_data.get("name")
+        cursor = validated_data.get("cursor")
         page = validated_data.get("page")
-        limit = validated_data.get("limit")
+        limit = validated_data["limit"]
 
         # Perform user search
+        # Cursor for the next page (if any) is returned in the response headers
         try:
-            result = search_users_with_paginator(skills, name, page, limit)
-            return JsonResponse(result)
+            result, next_cursor = search_users(skills, match, name, cursor, page, limit)
+            return add_next_page_headers(JsonResponse(result), request, next_cursor)
         except Exception as e:
             return HttpResponse(f"Error searching for users: {e}", status=400)
 
@@ -0,0 +1,598 @@
+# Benchmark harness, drives the /api/ endpoints through the test client
+# Reports p50/p95 latency, query count and peak (Python) memory of every endpoint
+# And the throughput of the JSON encoders (see renderers.py)
+# Meant to be run against a dataset from `python manage.py generate-dataset`
+# Covers every route with a query budget (see QUERY_BUDGETS), writes are rolled back
+# Event streams and long polls are left out, since they are held open on purpose
+
+import logging
+import time
+import tracemalloc
+from datetime import timedelta
+from urllib.parse import quote
+
+from applications.models import Application, Job, User, UserRole
+from availabilities.models import Timing
+from companies.models import EmployerProfile
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import override_settings
+from files.models import AssociatedType, File
+from groups.models import Group, GroupMessage
+from jobs.models import JOB_ORDERING
+from jobs.utils import to_json_objects
+from message.models import Message
+from rest_framework.test import APIClient
+from suggestions.models import Suggestion
+from users.models import Skill
+
+from .renderers import ENCODERS
+
+
+class BenchmarkCase:
+    def __init__(self, name, method, path, user, data=None):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.user = user
+        self.data = data
+
+
+# Nearest rank percentile, values must be sorted
+def get_percentile(values, percentile):
+    index = max(0, round(percentile / 100 * len(values) + 0.5) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+# Endpoints are called with rows picked from the dataset
+# Busiest rows are used, since those are the hot paths worth measuring
+def get_benchmark_cases():
+    application = (
+        Application.objects.select_related("employee_id", "employer_id", "job_id")
+        .annotate(message_count=Count("message"))
+        .order_by("-message_count", "application_id")
+        .first()
+    )
+    if application is None:
+        raise ValueError("No applications found, generate a dataset first.")
+
+    employee = application.employee_id
+    employer = application.employer_id
+    job = application.job_id
+    group = (
+        Group.objects.select_related("creator_id")
+        .annotate(message_count=Count("groupmessage"))
+        .order_by("-message_count", "group_id")
+        .first()
+    )
+    suggestion = Suggestion.objects.order_by("-vote_count", "suggestion_id").first()
+    company = (
+        EmployerProfile.objects.annotate(follower_count=Count("companyfollow"))
+        .order_by("-follower_count", "company_id")
+        .first()
+    )
+    skill = Skill.objects.values_list("name", flat=True).first()
+
+    # Rows for the write endpoints (if any), every request is rolled back
+    unapplied_job = Job.objects.exclude(application__employee_id=employee).first()
+    timing = Timing.objects.filter(employee_id=employee).first()
+    message = Message.objects.filter(
+        application_id=application, sender_id=employee
+    ).first()
+    file = File.objects.first()
+    admin = User.objects.filter(role=UserRole.ADMIN).first()
+
+    cases = [
+        BenchmarkCase("jobs-list", "get", "/api/jobs/", employee),
+        BenchmarkCase(
+            "jobs-filtered",
+            "get",
+            f"/api/jobs/filtered/?search={job.name.split()[0]}",
+            employee,
+        ),
+        BenchmarkCase("jobs-detail", "get", f"/api/jobs/{job.job_id}/", employee),
+        BenchmarkCase(
+            "jobs-employer-jobs", "get", "/api/jobs/employer_jobs/", employer
+        ),
+        BenchmarkCase(
+            "jobs-matched-applicants",
+            "get",
+            f"/api/jobs/{job.job_id}/matched_applicants/",
+            employer,
+            {
+                "startDate": job.start_date.isoformat(),
+                "endDate": (job.start_date + timedelta(days=30)).isoformat(),
+            },
+        ),
+        BenchmarkCase("applications-list", "get", "/api/applications/", employee),
+        BenchmarkCase("availabilities-list", "get", "/api/availabilities/", employee),
+        BenchmarkCase(
+            "availabilities-bulk",
+            "post",
+            "/api/availabilities/bulk/",
+            employee,
+            # A weekly schedule for a year, after any generated availability
+            {
+                "recurrence": {
+                    "startTime": "2100-01-04T09:00:00Z",
+                    "endTime": "2100-01-04T17:00:00Z",
+                    "frequency": "weekly",
+                    "byWeekday": ["MO", "TU", "WE", "TH", "FR"],
+                    "count": 260,
+                }
+            },
+        ),
+        BenchmarkCase("users-detail", "get", f"/api/users/{employee.id}/", employee),
+        BenchmarkCase(
+            "users-search", "get", f"/api/users/search/?skills={skill}", employer
+        ),
+        BenchmarkCase("users-skills", "get", "/api/users/skills/", employer),
+        BenchmarkCase(
+            "messages-list",
+            "get",
+            f"/api/messages/?applicationId={application.application_id}",
+            employee,
+        ),
+        BenchmarkCase(
+            "messages-sync",
+            "get",
+            f"/api/messages/sync/?applicationId={application.application_id}",
+            employee,
+        ),
+        BenchmarkCase(
+            "messages-create",
+            "post",
+            "/api/messages/",
+            employee,
+            {
+                "content": "Benchmark message.",
+                "applicationId": str(application.application_id),
+                "hasFile": False,
+            },
+        ),
+        BenchmarkCase("suggestions-list", "get", "/api/suggestions/", employee),
+        BenchmarkCase(
+            "suggestions-leaderboards",
+            "get",
+            "/api/suggestions/leaderboards/",
+            employee,
+        ),
+        BenchmarkCase(
+            "suggestions-create",
+            "post",
+            "/api/suggestions/",
+            employee,
+            {"title": "Benchmark suggestion", "content": "Benchmark content."},
+        ),
+        BenchmarkCase(
+            "jobs-create",
+            "post",
+            "/api/jobs/",
+            employer,
+            {
+                "name": "Benchmark Job",
+                "startDate": "2100-01-04T09:00:00Z",
+                "description": "Benchmark description.",
+                "jobRequirements": ["Benchmark requirement"],
+            },
+        ),
+        BenchmarkCase(
+            "jobs-update",
+            "patch",
+            f"/api/jobs/{job.job_id}/",
+            employer,
+            {"name": "Benchmark Job"},
+        ),
+        BenchmarkCase("jobs-delete", "delete", f"/api/jobs/{job.job_id}/", employer),
+        BenchmarkCase(
+            "applications-update",
+            "patch",
+            f"/api/applications/{application.application_id}/",
+            employee,
+            {"bio": "Benchmark bio."},
+        ),
+        BenchmarkCase(
+            "applications-delete",
+            "delete",
+            f"/api/applications/{application.application_id}/",
+            employee,
+        ),
+        BenchmarkCase(
+            "reviews-update",
+            "patch",
+            f"/api/reviews/{application.application_id}/",
+            employee,
+            {"content": "Benchmark review.", "rating": "5"},
+        ),
+        BenchmarkCase(
+            "availabilities-create",
+            "post",
+            "/api/availabilities/",
+            employee,
+            {"startTime": "2100-01-04T09:00:00Z", "endTime": "2100-01-04T17:00:00Z"},
+        ),
+        BenchmarkCase(
+            "users-update",
+            "patch",
+            f"/api/users/{employee.id}/",
+            employee,
+            {"bio": "Benchmark bio."},
+        ),
+        BenchmarkCase(
+            "employer-create",
+            "post",
+            "/api/employer/",
+            employer,
+            {
+                "companyName": "Benchmark Company",
+                "companyWebsite": "https://benchmark.example.com",
+            },
+        ),
+        BenchmarkCase(
+            "files-list",
+            "get",
+            f"/api/files/?associatedType={AssociatedType.JOB}"
+            f"&associatedObjectId={job.job_id}",
+            employer,
+        ),
+        BenchmarkCase(
+            "files-create",
+            "post",
+            "/api/files/",
+            employer,
+            {
+                "fileKey": "benchmark-file",
+                "fileUrl": "https://files.example.com/benchmark-file",
+                "fileName": "benchmark.pdf",
+                "fileType": "pdf",
+                "fileSize": 100,
+                "associatedType": AssociatedType.JOB,
+                "associatedObjectId": str(job.job_id),
+            },
+        ),
+    ]
+
+    if unapplied_job:
+        cases.append(
+            BenchmarkCase(
+                "applications-create",
+                "post",
+                "/api/applications/",
+                employee,
+                {
+                    "jobId": str(unapplied_job.job_id),
+                    "employerId": str(unapplied_job.employer_id_id),
+                },
+            )
+        )
+
+    if timing:
+        cases.append(
+            BenchmarkCase(
+                "availabilities-delete",
+                "delete",
+                f"/api/availabilities/{timing.time_id}/",
+                employee,
+            )
+        )
+
+    if message:
+        cases += [
+            BenchmarkCase(
+                "messages-update",
+                "patch",
+                f"/api/messages/{message.message_id}/",
+                employee,
+                {
+                    "content": "Benchmark edit.",
+                    "applicationId": str(application.application_id),
+                },
+            ),
+            BenchmarkCase(
+                "messages-delete",
+                "delete",
+                f"/api/messages/{message.message_id}/",
+                employee,
+            ),
+        ]
+
+    if file:
+        cases.append(
+            BenchmarkCase(
+                "files-delete", "delete", f"/api/files/{file.file_key}/", employer
+            )
+        )
+
+    if suggestion:
+        cases += [
+            BenchmarkCase(
+                "suggestions-detail",
+                "get",
+                f"/api/suggestions/{suggestion.suggestion_id}/",
+                employee,
+            ),
+            BenchmarkCase(
+                "suggestions-vote",
+                "post",
+                f"/api/suggestions/{suggestion.suggestion_id}/vote/",
+                employee,
+            ),
+            BenchmarkCase(
+                "suggestions-comment",
+                "post",
+                f"/api/suggestions/{suggestion.suggestion_id}/comment/",
+                employee,
+                {"content": "Benchmark comment."},
+            ),
+        ]
+
+    if suggestion and admin:
+        cases.append(
+            BenchmarkCase(
+                "suggestions-mark-implemented",
+                "post",
+                f"/api/suggestions/{suggestion.suggestion_id}/mark_implemented/",
+                admin,
+            )
+        )
+
+    if company:
+        cases += [
+            BenchmarkCase("companies-list", "get", "/api/companies/", employee),
+            BenchmarkCase(
+                "companies-detail",
+                "get",
+                f"/api/companies/{company.company_id}/",
+                employee,
+            ),
+            BenchmarkCase(
+                "companies-followers",
+                "get",
+                f"/api/companies/{company.company_id}/followers/",
+                employee,
+            ),
+            BenchmarkCase(
+                "companies-follow",
+                "post",
+                f"/api/companies/{company.company_id}/follow/",
+                employee,
+            ),
+            BenchmarkCase(
+                "companies-is-following",
+                "get",
+                f"/api/companies/{company.company_id}/is_following/",
+                employee,
+            ),
+            BenchmarkCase(
+                "employer-update",
+                "patch",
+                f"/api/employer/{company.company_id}/",
+                company.employer_id,
+                {"companyName": "Benchmark Company"},
+            ),
+        ]
+
+    if group:
+        cases += [
+            BenchmarkCase(
+                "group-messages-list",
+                "get",
+                f"/api/group-messages/?groupId={group.group_id}",
+                group.creator_id,
+            ),
+            BenchmarkCase(
+                "group-messages-sync",
+                "get",
+                f"/api/group-messages/sync/?groupId={group.group_id}",
+                group.creator_id,
+            ),
+            BenchmarkCase(
+                "group-messages-create",
+                "post",
+                "/api/group-messages/",
+                group.creator_id,
+                {
+                    "content": "Benchmark message.",
+                    "groupId": str(group.group_id),
+                    "hasFile": False,
+                },
+            ),
+            BenchmarkCase(
+                "groups-available-members",
+                "get",
+                f"/api/groups/{group.group_id}/available_members/",
+                group.creator_id,
+            ),
+            BenchmarkCase(
+                "groups-create",
+                "post",
+                "/api/groups/",
+                group.creator_id,
+                {
+                    "bio": "Benchmark group.",
+                    "jobId": str(group.job_id_id),
+                    "userIds": [str(group.creator_id.id)],
+                },
+            ),
+            BenchmarkCase(
+                "groups-update",
+                "patch",
+                f"/api/groups/{group.group_id}/",
+                group.creator_id,
+                {"bio": "Benchmark group."},
+            ),
+        ]
+
+        group_message = GroupMessage.objects.filter(
+            group_id=group, sender_id__user_id=group.creator_id
+        ).first()
+        if group_message:
+            cases += [
+                BenchmarkCase(
+                    "group-messages-update",
+                    "patch",
+                    f"/api/group-messages/{group_message.message_id}/",
+                    group.creator_id,
+                    {"content": "Benchmark edit.", "groupId": str(group.group_id)},
+                ),
+                BenchmarkCase(
+                    "group-messages-delete",
+                    "delete",
+                    # Keyed by "<message_id> || <group_id>"
+                    f"/api/group-messages/"
+                    f"{quote(f'{group_message.message_id} || {group.group_id}')}/",
+                    group.creator_id,
+                ),
+            ]
+
+    return cases
+
+
+# Every request is rolled back, so that runs are repeatable
+def send_request(client, case):
+    with transaction.atomic():
+        response = getattr(client, case.method)(case.path, case.data, format="json")
+        transaction.set_rollback(True)
+    return response
+
+
+# Returns a dict of results, for a single endpoint
+def run_case(case, iterations, warmup):
+    client = APIClient()
+    client.force_authenticate(user=case.user)
+
+    for _ in range(warmup):
+        send_request(client, case)
+
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        response = send_request(client, case)
+        durations.append(time.perf_counter() - start)
+    durations.sort()
+
+    # Not CaptureQueriesContext, since the query log is reset on every request
+    queries = []
+
+    def count_query(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count_query):
+        send_request(client, case)
+
+    # Separate request, since tracing slows everything down
+    tracemalloc.start()
+    try:
+        send_request(client, case)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "name": case.name,
+        "status": response.status_code,
+        "budget": settings.QUERY_BUDGETS.get(
+            f"{case.method.upper()} {response.resolver_match.view_name}"
+        ),
+        "p50_ms": get_percentile(durations, 50) * 1000,
+        "p95_ms": get_percentile(durations, 95) * 1000,
+        "queries": len(queries),
+        "peak_kib": peak_memory / 1024,
+    }
+
+
+def run_benchmarks(iterations=50, warmup=5, names=None):
+    results = []
+
+    # Budgets are reported next to the query counts, instead of logged per request
+    metrics_logger = logging.getLogger("bihance.metrics")
+    metrics_logger.disabled = True
+    try:
+        with override_settings(ENFORCE_QUERY_BUDGETS=False):
+            for case in get_benchmark_cases():
+                if names and case.name not in names:
+                    continue
+                results.append(run_case(case, iterations, warmup))
+    finally:
+        metrics_logger.disabled = False
+
+    return results
+
+
+# Realistic response payloads, from the current database
+# Serialized job pages hold strings, raw rows hold UUIDs, datetimes and JSON fields
+def get_encoding_payloads(size=100):
+    jobs = Job.objects.defer("search_vector").order_by(*JOB_ORDERING)[:size]
+    job_fields = [
+        field.attname
+        for field in Job._meta.concrete_fields
+        if field.name != "search_vector"
+    ]
+    return {
+        "jobs (serialized)": to_json_objects(jobs),
+        "jobs (rows)": list(Job.objects.values(*job_fields)[: size * 10]),
+        "messages (rows)": list(Message.objects.values()[: size * 10]),
+    }
+
+
+# Returns the encode time and throughput of every encoder, for every payload
+def run_encoding_benchmark(iterations=50):
+    results = []
+    for payload_name, payload in get_encoding_payloads().items():
+        for encoder_name, encode in ENCODERS.items():
+            durations = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                encoded = encode(payload)
+                durations.append(time.perf_counter() - start)
+            durations.sort()
+
+            p50 = get_percentile(durations, 50)
+            results.append(
+                {
+                    "payload": payload_name,
+                    "encoder": encoder_name,
+                    "rows": len(payload),
+                    "p50_ms": p50 * 1000,
+                    "mb_per_s": len(encoded) / p50 / 1e6 if p50 else 0.0,
+                }
+            )
+    return results
+
+
+def format_encoding_results(results):
+    lines = [f"{'payload':<22}{'encoder':<10}{'rows':>8}{'p50_ms':>12}{'MB/s':>12}"]
+    for result in results:
+        lines.append(
+            f"{result['payload']:<22}{result['encoder']:<10}{result['rows']:>8}"
+            f"{result['p50_ms']:>12.2f}{result['mb_per_s']:>12.1f}"
+        )
+    return "\n".join(lines)
+
+
+# Plain text table, with the change from a previous run (if any)
+def format_results(results, baseline=None):
+    baseline = {result["name"]: result for result in baseline or []}
+    columns = ["p50_ms", "p95_ms", "queries", "peak_kib"]
+
+    lines = [
+        f"{'endpoint':<28}{'status':>7}{'budget':>7}"
+        + "".join(f"{column:>18}" for column in columns)
+    ]
+    for result in results:
+        budget = result["budget"]
+        if budget is not None and result["queries"] > budget:
+            budget = f"{budget}!"
+        line = f"{result['name']:<28}{result['status']:>7}{budget or '-':>7}"
+        previous = baseline.get(result["name"])
+        for column in columns:
+            value = f"{result[column]:.1f}" if column != "queries" else result[column]
+            if previous and previous[column]:
+                change = (result[column] - previous[column]) / previous[column] * 100
+                value = f"{value} ({change:+.0f}%)"
+            line += f"{value:>18}"
+        lines.append(line)
+
+    return "\n".join(lines)
@@ -0,0 +1,321 @@
+# Synthetic dataset generator, for benchmarks and load testing
+# Every table is filled with bulk_create, so that large datasets take seconds, not hours
+# The same seed always generates the same dataset (apart from ids and timestamps)
+
+import random
+import uuid
+from datetime import timedelta
+
+from applications.models import Application, Job, JobType, PayType, User, UserRole
+from availabilities.models import Timing
+from companies.models import CompanyFollow, EmployerProfile
+from django.db import transaction
+from django.utils import timezone
+from groups.models import Group, GroupMember, GroupMessage, RoleType
+from jobs.models import JobRequirement
+from message.models import Message
+from suggestions.models import Suggestion, SuggestionComment, SuggestionVote
+from suggestions.utils import (
+    reconcile_counts,
+    reconcile_leaderboard,
+    refresh_trending_scores,
+)
+from users.models import Interest, Skill
+
+FIRST_NAMES = ["Alex", "Bea", "Chen", "Dana", "Eli", "Farah", "Gus", "Hana", "Ivan"]
+LAST_NAMES = ["Tan", "Lim", "Ng", "Lee", "Wong", "Goh", "Koh", "Ong", "Chua", "Teo"]
+SKILLS = ["Python", "React", "SQL", "Excel", "Cooking", "Driving", "Sales", "Design"]
+INTERESTS = ["Badminton", "Piano", "Hiking", "Chess", "Baking", "Photography"]
+JOB_TITLES = ["Barista", "Tutor", "Cashier", "Intern", "Designer", "Driver", "Chef"]
+LOCATIONS = ["Jurong East", "Tampines", "Orchard", "Woodlands", "Bishan", "Clementi"]
+WORDS = (
+    "flexible hours friendly team weekend shifts customer service training "
+    "provided fast paced environment good communication skills required"
+).split()
+
+# Default number of rows per table, multiplied by --scale
+DEFAULT_COUNTS = {
+    "users": 200,
+    "jobs": 100,
+    "applications": 400,
+    "messages": 2000,
+    "groups": 20,
+    "suggestions": 50,
+    "votes": 500,
+}
+
+# 1 in EMPLOYER_RATIO users is an employer
+EMPLOYER_RATIO = 5
+
+
+def get_sentence(rng, length):
+    return " ".join(rng.choice(WORDS) for _ in range(length)).capitalize() + "."
+
+
+# Picks up to count distinct (a, b) pairs, eg: for unique_together constraints
+def get_unique_pairs(rng, first_items, second_items, count):
+    count = min(count, len(first_items) * len(second_items))
+    pairs = set()
+    while len(pairs) < count:
+        pairs.add((rng.randrange(len(first_items)), rng.randrange(len(second_items))))
+    return [(first_items[i], second_items[j]) for i, j in sorted(pairs)]
+
+
+# Returns the number of rows created, by table
+@transaction.atomic
+def generate_dataset(counts, seed=0, batch_size=1000):
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    # Keeps the unique fields of repeated runs apart
+    run_id = uuid.uuid4().hex[:8]
+
+    def days_ago(max_days):
+        return now - timedelta(seconds=rng.randrange(max_days * 24 * 60 * 60))
+
+    def create(model, objects):
+        return model.objects.bulk_create(objects, batch_size=batch_size)
+
+    # Users, their skills, interests and availabilities
+    users = create(
+        User,
+        [
+            User(
+                first_name=rng.choice(FIRST_NAMES),
+                last_name=rng.choice(LAST_NAMES),
+                email=f"user-{run_id}-{i}@example.com",
+                employee=i % EMPLOYER_RATIO != 0,
+                # One site admin, eg: to mark suggestions as implemented
+                role=UserRole.ADMIN if i == 0 else UserRole.USER,
+                bio=get_sentence(rng, 8),
+                age=rng.randint(16, 60),
+                created_at=days_ago(365),
+            )
+            for i in range(max(counts["users"], 2))
+        ],
+    )
+    employers = [user for user in users if not user.employee]
+    employees = [user for user in users if user.employee]
+
+    skills = create(
+        Skill,
+        [
+            Skill(user_id=user, name=name)
+            for user in users
+            for name in rng.sample(SKILLS, rng.randint(1, 3))
+        ],
+    )
+    interests = create(
+        Interest,
+        [
+            Interest(user_id=user, name=name, description=get_sentence(rng, 5))
+            for user in users
+            for name in rng.sample(INTERESTS, rng.randint(0, 2))
+        ],
+    )
+
+    timings = []
+    for employee in employees:
+        # Non overlapping slots, one per day
+        for day in rng.sample(range(1, 31), rng.randint(0, 4)):
+            start_time = (now + timedelta(days=day)).replace(
+                hour=rng.randint(8, 16), minute=0, second=0, microsecond=0
+            )
+            timings.append(
+                Timing(
+                    employee_id=employee,
+                    start_time=start_time,
+                    end_time=start_time + timedelta(hours=rng.randint(1, 6)),
+                    title="Available",
+                )
+            )
+    timings = create(Timing, timings)
+
+    # Companies, and who follows them
+    companies = create(
+        EmployerProfile,
+        [
+            EmployerProfile(
+                employer_id=employer,
+                company_name=f"{rng.choice(LAST_NAMES)} & Co {i}",
+                company_website=f"https://company-{run_id}-{i}.example.com",
+                industry=rng.choice(["F&B", "Retail", "Education", "IT"]),
+            )
+            for i, employer in enumerate(employers)
+        ],
+    )
+    follows = create(
+        CompanyFollow,
+        [
+            CompanyFollow(follower_id=employee, company_id=company)
+            for employee, company in get_unique_pairs(
+                rng, employees, companies, len(employees)
+            )
+        ],
+    )
+
+    # Jobs, and their requirements
+    jobs = create(
+        Job,
+        [
+            Job(
+                name=f"{rng.choice(JOB_TITLES)} ({rng.choice(LOCATIONS)})",
+                employer_id=rng.choice(employers),
+                start_date=now + timedelta(days=rng.randint(1, 60)),
+                salary=rng.randint(10, 30) * 100,
+                description=get_sentence(rng, 20),
+                posted_date=days_ago(90),
+                job_type=rng.choice(JobType.values),
+                pay_type=rng.choice(PayType.values),
+                location_name=rng.choice(LOCATIONS),
+            )
+            for _ in range(max(counts["jobs"], 1))
+        ],
+    )
+    job_requirements = create(
+        JobRequirement,
+        [
+            JobRequirement(job_id=job, name=name)
+            for job in jobs
+            for name in rng.sample(SKILLS, rng.randint(0, 3))
+        ],
+    )
+
+    # Applications, and the messages sent within them
+    applications = create(
+        Application,
+        [
+            Application(
+                job_id=job,
+                employee_id=employee,
+                employer_id=job.employer_id,
+                accept=rng.randint(1, 4),
+                bio=get_sentence(rng, 10),
+            )
+            for job, employee in get_unique_pairs(
+                rng, jobs, employees, counts["applications"]
+            )
+        ],
+    )
+
+    messages = []
+    for _ in range(counts["messages"] if applications else 0):
+        application = rng.choice(applications)
+        messages.append(
+            Message(
+                content=get_sentence(rng, rng.randint(3, 15)),
+                date=days_ago(30),
+                application_id=application,
+                sender_id=rng.choice(
+                    [application.employee_id, application.employer_id]
+                ),
+            )
+        )
+    messages = create(Message, messages)
+
+    # Groups, made of a job's employer and its applicants
+    applications_by_job = {}
+    for application in applications:
+        applications_by_job.setdefault(application.job_id, []).append(application)
+
+    groups = []
+    members = []
+    jobs_with_applicants = list(applications_by_job)
+    for job in rng.sample(
+        jobs_with_applicants, min(counts["groups"], len(jobs_with_applicants))
+    ):
+        group = Group(bio=get_sentence(rng, 6), creator_id=job.employer_id, job_id=job)
+        groups.append(group)
+        members.append(
+            GroupMember(user_id=job.employer_id, group_id=group, role=RoleType.ADMIN)
+        )
+        for application in applications_by_job[job]:
+            members.append(
+                GroupMember(
+                    user_id=application.employee_id,
+                    group_id=group,
+                    role=RoleType.MEMBER,
+                )
+            )
+    groups = create(Group, groups)
+    members = create(GroupMember, members)
+
+    members_by_group = {}
+    for member in members:
+        members_by_group.setdefault(member.group_id, []).append(member)
+
+    group_messages = []
+    for group in groups:
+        for _ in range(counts["messages"] // max(len(groups), 1) // 4):
+            group_messages.append(
+                GroupMessage(
+                    content=get_sentence(rng, rng.randint(3, 15)),
+                    created_at=days_ago(30),
+                    group_id=group,
+                    sender_id=rng.choice(members_by_group[group]),
+                )
+            )
+    group_messages = create(GroupMessage, group_messages)
+
+    # Suggestions, their comments and votes
+    suggestions = create(
+        Suggestion,
+        [
+            Suggestion(
+                title=get_sentence(rng, 4),
+                content=get_sentence(rng, 20),
+                author_id=rng.choice(users),
+                created_at=days_ago(120),
+                is_useful=rng.random() < 0.1,
+            )
+            for _ in range(counts["suggestions"])
+        ],
+    )
+    comments = create(
+        SuggestionComment,
+        [
+            SuggestionComment(
+                content=get_sentence(rng, 8),
+                author_id=rng.choice(users),
+                suggestion_id=suggestion,
+                created_at=days_ago(30),
+            )
+            for suggestion in suggestions
+            for _ in range(rng.randint(0, 5))
+        ],
+    )
+    votes = create(
+        SuggestionVote,
+        [
+            SuggestionVote(
+                user_id=user, suggestion_id=suggestion, created_at=days_ago(30)
+            )
+            for user, suggestion in get_unique_pairs(
+                rng, users, suggestions, counts["votes"]
+            )
+        ],
+    )
+    # bulk_create skips the endpoints (and signals) that maintain the counters
+    # Trending scores are normally refreshed by a periodic job
+    reconcile_counts()
+    reconcile_leaderboard()
+    refresh_trending_scores()
+
+    return {
+        "users": len(users),
+        "skills": len(skills),
+        "interests": len(interests),
+        "timings": len(timings),
+        "companies": len(companies),
+        "company follows": len(follows),
+        "jobs": len(jobs),
+        "job requirements": len(job_requirements),
+        "applications": len(applications),
+        "messages": len(messages),
+        "groups": len(groups),
+        "group members": len(members),
+        "group messages": len(group_messages),
+        "suggestions": len(suggestions),
+        "suggestion comments": len(comments),
+        "suggestion votes": len(votes),
+    }
@@ -0,0 +1,127 @@
+# Pluggable JSON encoding for API responses
+# Encoders are picked by settings.JSON_ENCODER, "orjson" falls back to "stdlib" if not installed
+# Both handle UUID, datetime, Decimal and JSONField payloads
+
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+django_json_encoder = DjangoJSONEncoder()
+
+
+# Types that orjson does not support natively (eg: Decimal, timedelta, lazy strings)
+# Are encoded the same way as DjangoJSONEncoder does
+def encode_default(value):
+    return django_json_encoder.default(value)
+
+
+def stdlib_dumps(data):
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def orjson_dumps(data):
+    return orjson.dumps(
+        data,
+        default=encode_default,
+        # Same as DjangoJSONEncoder: "Z" for UTC, UUID/int dict keys as strings
+        option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+ENCODERS = {"stdlib": stdlib_dumps}
+if orjson is not None:
+    ENCODERS["orjson"] = orjson_dumps
+
+
+def get_encoder(name=None):
+    name = name or settings.JSON_ENCODER
+    return ENCODERS.get(name, stdlib_dumps)
+
+
+# Returns the JSON encoding of data, as bytes
+def dumps(data):
+    return get_encoder()(data)
+
+
+# Drop-in replacement for django.http.JsonResponse, using the configured encoder
+class JsonResponse(HttpResponse):
+    def __init__(self, data, safe=True, **kwargs):
+        if safe and not isinstance(data, dict):
+            raise TypeError(
+                "In order to allow non-dict objects to be serialized set the "
+                "safe parameter to False."
+            )
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(content=dumps(data), **kwargs)
+
+
+# Reads a queryset with a server-side cursor, in lists of up to chunk_size objects
+# Prefetches (if any) are done per chunk
+def iter_chunks(queryset, chunk_size=None):
+    chunk_size = chunk_size or settings.STREAM_CHUNK_SIZE
+    chunk = []
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        chunk.append(obj)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Streams a JSON array, from an iterable of chunks (lists of JSON objects)
+# Only one chunk is held in memory at a time, however many rows there are
+# Under ASGI, Django reads sync streams whole before sending them
+# So views pass asynchronous=is_asgi(request), to read chunks one at a time instead
+class StreamingJsonResponse(StreamingHttpResponse):
+    def __init__(self, chunks, asynchronous=False, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        if asynchronous:
+            streaming_content = self.aencode(chunks)
+        else:
+            streaming_content = self.encode(chunks)
+        super().__init__(streaming_content=streaming_content, **kwargs)
+
+    def encode(self, chunks):
+        yield b"["
+        is_first = True
+        for chunk in chunks:
+            if not chunk:
+                continue
+
+            # Array items, without the surrounding brackets
+            items = dumps(chunk)[1:-1]
+            yield items if is_first else b"," + items
+            is_first = False
+        yield b"]"
+
+    # Every part is encoded (and its queries run) in the request's thread
+    async def aencode(self, chunks):
+        parts = self.encode(chunks)
+        next_part = sync_to_async(next)
+        try:
+            while True:
+                part = await next_part(parts, None)
+                if part is None:
+                    break
+                yield part
+        finally:
+            # Releases the server-side cursor, when the client goes away early
+            await sync_to_async(parts.close)()
+
+
+# Same encoder, for views returning DRF Responses
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return dumps(data)
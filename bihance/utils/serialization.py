@@ -0,0 +1,65 @@
+# Precompiled field extractors, a fast path for read-only ModelSerializers
+# Produce the same JSON as the serializer, as plain dicts
+# Without building serializer and field objects for every row
+
+from django.db import models
+from django.utils import timezone
+
+
+# Same output as DRF's DateTimeField (ISO 8601, UTC as "Z")
+def to_iso_datetime(value):
+    if value is None:
+        return None
+    value = timezone.localtime(value).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+def to_iso_date(value):
+    return None if value is None else value.isoformat()
+
+
+def to_str(value):
+    return None if value is None else str(value)
+
+
+def get_converter(model_field):
+    if isinstance(model_field, models.ForeignKey):
+        model_field = model_field.target_field
+
+    if isinstance(model_field, models.DateTimeField):
+        return to_iso_datetime
+    if isinstance(model_field, models.DateField):
+        return to_iso_date
+    if isinstance(model_field, models.UUIDField):
+        return to_str
+    return None
+
+
+class FieldExtractor:
+    # Only Meta.fields (model fields) is supported, not declared serializer fields
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.fields = []
+        for name in serializer_class.Meta.fields:
+            model_field = model._meta.get_field(name)
+            self.fields.append((name, model_field.attname, get_converter(model_field)))
+
+        # Columns to select, eg: queryset.values(*extractor.attnames)
+        self.attnames = [attname for _, attname, _ in self.fields]
+
+    # Row is a dict from queryset.values(*self.attnames)
+    def from_values(self, row):
+        data = {}
+        for name, attname, convert in self.fields:
+            value = row[attname]
+            data[name] = convert(value) if convert else value
+        return data
+
+    def from_instance(self, instance):
+        data = {}
+        for name, attname, convert in self.fields:
+            value = getattr(instance, attname)
+            data[name] = convert(value) if convert else value
+        return data
@@ -1,6 +1,14 @@
 # Non-testing related utils
 
+import base64
+import json
+import uuid
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.handlers.asgi import ASGIRequest
 from django.db import connection
+from django.db.models import Q
 from rest_framework import serializers
 
 
@@ -20,6 +28,12 @@ def is_employer_in_application(employer, application):
     return application.employer_id == employer
 
 
+# Whether the request is served over ASGI, and can be held by the event loop
+# DRF requests wrap the Django one
+def is_asgi(request):
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
 def terminate_current_connections():
     cursor = connection.cursor()
     database_name = "test_development"
@@ -49,3 +63,117 @@ def remap_keys(input_dict, mapping):
             result[model_field] = value
 
     return result
+
+
+# Keyset (cursor) pagination
+# Pages continue after the last row seen, instead of OFFSET-ing past all earlier rows
+# Ordering is a list of model fields or annotations, eg: ["-posted_date", "-job_id"]
+# Its last field must be unique, so that rows never tie
+def encode_cursor(values):
+    parts = []
+    for value in values:
+        if isinstance(value, datetime):
+            # Keep full microsecond precision, unlike DjangoJSONEncoder
+            value = value.isoformat()
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        parts.append(value)
+
+    return base64.urlsafe_b64encode(json.dumps(parts).encode()).decode()
+
+
+# Raises ValueError for cursors that were not produced by encode_cursor
+def decode_cursor(cursor, model, ordering):
+    try:
+        parts = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor.")
+
+    if not isinstance(parts, list) or len(parts) != len(ordering):
+        raise ValueError("Malformed cursor.")
+
+    values = []
+    for field_name, part in zip(ordering, parts):
+        try:
+            field = model._meta.get_field(field_name.lstrip("-"))
+        except FieldDoesNotExist:
+            # Annotations (eg: a search rank) are kept as plain JSON values
+            values.append(part)
+            continue
+
+        try:
+            values.append(field.to_python(part))
+        except Exception:
+            raise ValueError("Malformed cursor.")
+
+    return values
+
+
+def get_keyset_filter(ordering, values):
+    # (a, b) after (x, y) means: a after x, OR a equal to x AND b after y
+    keyset_filter = Q()
+    for i, field_name in enumerate(ordering):
+        name = field_name.lstrip("-")
+        lookup = "lt" if field_name.startswith("-") else "gt"
+
+        condition = Q(**{f"{name}__{lookup}": values[i]})
+        for previous_field_name, previous_value in zip(ordering[:i], values[:i]):
+            condition &= Q(**{previous_field_name.lstrip("-"): previous_value})
+        keyset_filter |= condition
+
+    return keyset_filter
+
+
+# Returns a tuple of (page of objects, cursor for the next page or None)
+def keyset_paginate(queryset, ordering, cursor, limit):
+    queryset = queryset.order_by(*ordering)
+    if cursor:
+        values = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(get_keyset_filter(ordering, values))
+
+    # One extra row tells us whether there is a next page
+    page = list(queryset[: limit + 1])
+    if len(page) <= limit:
+        return page, None
+
+    page = page[:limit]
+    last = page[-1]
+    next_cursor = encode_cursor(
+        [getattr(last, field_name.lstrip("-")) for field_name in ordering]
+    )
+    return page, next_cursor
+
+
+# Next page is advertised in headers, so that list bodies keep their shape
+def add_next_page_headers(response, request, next_cursor):
+    if not next_cursor:
+        return response
+
+    query_params = request.GET.copy()
+    query_params["cursor"] = next_cursor
+    next_url = request.build_absolute_uri(f"{request.path}?{query_params.urlencode()}")
+
+    response["X-Next-Cursor"] = next_cursor
+    response["Link"] = f'<{next_url}>; rel="next"'
+    return response
+
+
+# Incremental sync of a conversation (application messages, group messages)
+# Every insert, edit and delete moves a message to the end of its conversation's change log
+# Returns a tuple of (messages changed after the cursor seq, oldest first, next cursor, has more)
+def get_changes(queryset, cursor, limit):
+    # Uses the (conversation, seq) index, so the cost is O(changes), not O(messages)
+    changes = list(queryset.filter(seq__gt=cursor).order_by("seq")[: limit + 1])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    next_cursor = changes[-1].seq if changes else cursor
+    return changes, next_cursor, has_more
+
+
+# Deletes are soft, so deleted messages stay in the change log
+def get_change_type(message):
+    if message.is_deleted:
+        return "delete"
+    if message.is_edited:
+        return "edit"
+    return "insert"